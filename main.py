@@ -2,15 +2,27 @@ import logging
 import os
 import asyncio
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import shutil
 import tempfile
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import json
 import hashlib
 import mimetypes
+import functools
+import signal
+import time
+import threading
+import itertools
+import multiprocessing
+import queue
+import sqlite3
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaDocument, InputMediaPhoto
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -20,9 +32,27 @@ from telegram.ext import (
     filters
 )
 from telegram.constants import ParseMode
+from telegram.error import RetryAfter
+import httpx
 import subprocess
 import sys
 import io
+import xml.etree.ElementTree as ET
+import codecs
+import zipfile
+import zlib
+import socket
+import errno
+import secrets
+import http
+import urllib.parse
+import ipaddress
+import contextlib
+import contextvars
+import math
+import heapq
+from fractions import Fraction
+import importlib.util
 import traceback
 
 # ==================== KONFIGURATSIYA ====================
@@ -32,10 +62,173 @@ class Config:
     UPLOAD_FOLDER = "uploads"
     OUTPUT_FOLDER = "converted"
     TEMP_FOLDER = "temp"
-    DATABASE_FILE = "users_data.json"
+    # Vazifa ish papkalari: tmpfs (RAM) bo'lsa va fayl sig'sa o'sha yerda, aks holda TEMP_FOLDER da
+    WORKSPACE_TMPFS = "/dev/shm"
+    WORKSPACE_TMPFS_MAX_SHARE = 0.5  # tmpfs bo'sh joyining ko'pi bilan shuncha ulushi
+    WORKSPACE_SIZE_FACTOR = 3  # Ish papkasiga kerak bo'ladigan joy ~ kirish hajmi * shu koeffitsient
+    CACHE_FOLDER = "cache"
+    CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+    SENT_FILES_FILE = "sent_files.json"
+    SENT_FILES_MAX_ENTRIES = 50000
+    SENT_FILES_SAVE_DELAY = 5
+    
+    # Holat ombori (SQLite): yozuvlarni guruhlash va xotiradagi kesh hajmi
+    STATE_FLUSH_INTERVAL = 0.5
+    STATE_BATCH_SIZE = 500
+    STATE_CACHE_SIZE = 2000
+    
+    # Vazifalar navbati: "local" - shu jarayonda, "queue" - umumiy navbat orqali ishchilarda
+    JOB_QUEUE_MODE = os.environ.get("JOB_QUEUE_MODE", "local")
+    JOB_QUEUE_FILE = "jobs.db"
+    LOCAL_WORKERS = int(os.environ.get("LOCAL_WORKERS", "0"))
+    WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "1"))
+    WORKER_HEARTBEAT_INTERVAL = 10
+    WORKER_STOP_TIMEOUT = 30
+    JOB_LEASE_SECONDS = 60
+    JOB_MAX_ATTEMPTS = 3
+    JOB_POLL_INTERVAL = 0.5
+    JOB_PROGRESS_INTERVAL = 1.0
+    JOB_NO_WORKER_TIMEOUT = 120
+    
+    # Webhook rejimi (WEBHOOK_URL berilsa run_polling o'rniga ishlatiladi)
+    WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.environ.get("PORT", "8443"))
+    WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = 40
+    
+    # Bot API server (masalan, o'z telegram-bot-api serveringiz: http://localhost:8081/bot)
+    BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "")
+    BOT_API_BASE_FILE_URL = os.environ.get("BOT_API_BASE_FILE_URL", "")
+    BOT_API_LOCAL_MODE = os.environ.get("BOT_API_LOCAL_MODE", "0") == "1"
+    CLOUD_DOWNLOAD_LIMIT = 20 * 1024 * 1024  # Bulutli Bot API: 20MB
+    CLOUD_UPLOAD_LIMIT = 50 * 1024 * 1024  # Bulutli Bot API: 50MB
+    LOCAL_UPLOAD_LIMIT = 2000 * 1024 * 1024  # Mahalliy Bot API: 2000MB
+    PHOTO_UPLOAD_LIMIT = 10 * 1024 * 1024  # Rasm sifatida yuborish chegarasi
+    UPLOAD_TIMEOUT = 600
+    STREAM_CHUNK_SIZE = 1024 * 1024
+    
+    # Katta fayllarni yuklab olish uchun HTTP server (0 - o'chirilgan)
+    HTTP_SERVER_LISTEN = os.environ.get("HTTP_SERVER_LISTEN", "0.0.0.0")
+    HTTP_SERVER_PORT = int(os.environ.get("HTTP_SERVER_PORT", "0"))
+    PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "")
+    DOWNLOAD_FOLDER = "downloads"
+    
+    # To'xtashda bajarilayotgan vazifalarni kutish (soniya)
+    SHUTDOWN_DRAIN_TIMEOUT = 60
+    DATABASE_FILE = "users_data.db"
     LOG_FILE = "bot.log"
     CLEANUP_HOURS = 24
+    
+    # Disk to'lishidan himoya: band ulush yuqori chegaradan oshsa eng eski fayllar muddatidan oldin
+    # pastki chegaragacha o'chiriladi
+    DISK_HIGH_WATERMARK = 0.90
+    DISK_LOW_WATERMARK = 0.80
+    DISK_CHECK_INTERVAL = 60
+    
+    # Metrikalar (HTTP serverdagi /metrics, Prometheus matn formati)
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_LOCAL_ONLY = os.environ.get("METRICS_LOCAL_ONLY", "1") == "1"  # Faqat localhost dan so'rovlar
+    # HTTP_SERVER_PORT o'rnatilmagan bo'lsa /metrics shu portda faqat 127.0.0.1 da ochiladi (0 - o'chirilgan)
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+    METRICS_LOOP_LAG_INTERVAL = 1.0
+    METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
     MAX_CONCURRENT_JOBS = 3
+    MAX_JOBS_PER_USER = 1
+    MAX_QUEUED_PER_USER = 10
+    
+    # Konvertatsiya pullari (CPU ishlari uchun jarayonlar, I/O uchun oqimlar)
+    PROCESS_POOL_SIZE = max(1, (os.cpu_count() or 2) - 1)
+    IO_POOL_SIZE = 4
+    COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+    
+    # Rasm o'lchamini kamaytirish: draft()/reduce() dan keyin LANCZOS uchun zaxira (Pillow thumbnail() kabi)
+    IMAGE_REDUCING_GAP = 2.0
+    
+    # Rasm xotira byudjeti (bitta vazifa uchun) va dekompressiya-bombasi chegarasi
+    IMAGE_MEMORY_BUDGET = int(os.getenv("IMAGE_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+    IMAGE_MAX_PIXELS = 500_000_000
+    MEMORY_SAMPLE_INTERVAL = 0.05
+    
+    # Maqsadli hajmga siqish (sifat bo'yicha ikkilik qidiruv, kerak bo'lsa o'lcham kamaytiriladi)
+    COMPRESS_MIN_QUALITY = 30
+    COMPRESS_MAX_QUALITY = 90
+    COMPRESS_TARGET_TOLERANCE = 0.9  # natija maqsadning shu ulushidan katta bo'lsa qidiruv to'xtaydi
+    COMPRESS_MAX_ROUNDS = 6  # o'lchamni kamaytirish bosqichlari
+    COMPRESS_MIN_SIDE = 64
+    
+    # FFmpeg (audio/video)
+    FFMPEG_THREADS = 2
+    FFMPEG_TIMEOUT = 30 * 60
+    FFPROBE_TIMEOUT = 30
+    FFMPEG_STDERR_LINES = 20
+    VIDEO_PRESET = "veryfast"
+    VIDEO_CRF = 23
+    GIF_FPS = 10
+    GIF_MAX_WIDTH = 480
+    GIF_MAX_SECONDS = 30
+    
+    # Animatsiyalar (GIF/WebP kadrlari ImageSequence orqali birma-bir o'qiladi)
+    ANIMATION_MAX_FRAMES = 10000
+    ANIMATION_MAX_FPS = 50
+    ANIMATION_MIN_DELAY = 20  # ms; bundan qisqa kechikishlarni brauzerlar 100 ms deb ko'rsatadi
+    ANIMATION_DEFAULT_DELAY = 100
+    ANIMATION_STILL_DURATION = 3000  # bitta kadrli rasmdan yasalgan video uzunligi (ms)
+    
+    # Arxivlar (zip-bomba himoyasi va oqimli o'tkazish)
+    ARCHIVE_MAX_ENTRIES = 10000
+    ARCHIVE_MAX_TOTAL_SIZE = 2 * 1024 * 1024 * 1024  # 2GB ochilgan hajm
+    ARCHIVE_MAX_RATIO = 100  # ochilgan hajm / arxiv hajmi
+    ARCHIVE_RATIO_MIN_BYTES = 16 * 1024 * 1024  # bundan kichik hajmda nisbat tekshirilmaydi
+    ARCHIVE_QUEUE_CHUNKS = 16  # o'quvchi va yozuvchi oqimlar orasidagi bufer
+    ARCHIVE_COMPRESS_LEVEL = 6
+    ARCHIVE_COMPRESS_THREADS = min(4, os.cpu_count() or 1)  # yozuvlarni parallel siqish (zlib GIL ni bo'shatadi)
+    ARCHIVE_SPOOL_SIZE = 8 * 1024 * 1024  # siqilgan yozuv shundan katta bo'lsa vaqtinchalik faylga tushadi
+    
+    # PDF → rasm (sahifalarni rastrlash)
+    PDF_DPI = 150
+    PDF_MAX_DPI = 300
+    PDF_MAX_PAGES = 500
+    PDF_ALBUM_MAX_PAGES = 50  # bundan ko'p sahifalar faqat ZIP da yuboriladi
+    ALBUM_SIZE = 10  # Telegram media guruhidagi maksimal elementlar
+    
+    # Matn → PDF (Unicode TTF shrift, birinchi topilgani ishlatiladi)
+    PDF_FONT_PATHS = [
+        os.getenv("PDF_FONT_PATH", ""),
+        "fonts/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/DejaVuSans.ttf",
+        "/usr/share/fonts/TTF/DejaVuSans.ttf",
+        "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    ]
+    PDF_FONT_SIZE = 11
+    PDF_MARGIN = 50
+    TEXT_FALLBACK_ENCODING = "cp1251"  # Kirill matnlar uchun eng ko'p uchraydigan eski kodlash
+    TEXT_SAMPLE_SIZE = 64 * 1024
+    TEXT_MAX_LINE_CHUNK = 64 * 1024  # juda uzun qatorlar shu bo'laklarda o'qiladi
+    
+    # Ofis hujjatlari (unoserver orqali doimiy ishlaydigan headless LibreOffice nusxalari)
+    OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", "2"))
+    OFFICE_MAX_JOBS = 50  # shuncha konvertatsiyadan keyin nusxa qayta ishga tushiriladi
+    OFFICE_JOB_TIMEOUT = 120
+    OFFICE_START_TIMEOUT = 60
+    # 'uno' moduli bor Python (bo'sh bo'lsa joriy, tizimdagi python3-uno va LibreOffice Pythoni qidiriladi)
+    UNO_PYTHON = os.getenv("UNO_PYTHON", "")
+    
+    # Konvertatsiya yo'llari (CONVERSION_MATRIX grafi bo'yicha ko'p bosqichli yo'llar)
+    PLANNER_MAX_HOPS = 2
+    PLANNER_EWMA_ALPHA = 0.3
+    # O'lchovlar yig'ilguncha 1 MB uchun taxminiy soniyalar (fayl turi bo'yicha)
+    PLANNER_DEFAULT_COSTS = {'image': 0.5, 'document': 2.0, 'audio': 3.0, 'video': 8.0, 'archive': 0.5}
+    PLANNER_LOSSY_PENALTY = 0.5  # oraliq JPG/MP3 kabi formatlar uchun qo'shimcha "narx" (vaqtga qo'shilmaydi)
+    
+    # Albomlar: bitta media_group_id xabarlari oxirgi fayl yuklangandan keyin shuncha kutiladi (soniya)
+    MEDIA_GROUP_WINDOW = 1.5
+    
+    # Progress xabarlari (ishchidan yuborish va xabarni tahrirlash oralig'i, soniya)
+    PROGRESS_REPORT_INTERVAL = 0.25
+    PROGRESS_EDIT_INTERVAL = 3.0
     
     # Adminlar ro'yxati (o'z ID'ingizni qo'shing)
     ADMIN_IDS = [123456789]  # O'zingizning Telegram ID'ingiz
@@ -44,8 +237,16 @@ class Config:
     HAS_PIL = False
     HAS_REPORTLAB = False
     HAS_FFMPEG = False
+    HAS_FFPROBE = False
     HAS_LIBREOFFICE = False
     HAS_PANDOC = False
+    HAS_UNOSERVER = False
+    UNOSERVER_COMMAND: List[str] = []
+    HAS_PYVIPS = False
+    HAS_LIBARCHIVE = False
+    HAS_PYMUPDF = False
+    HAS_PY7ZR = False
+    HAS_RAR = False
 
 # ==================== LOGGING ====================
 logging.basicConfig(
@@ -57,6 +258,7 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+logging.getLogger('pyvips').setLevel(logging.WARNING)
 
 # ==================== FAZL TURLARI ====================
 class FileTypes:
@@ -74,7 +276,7 @@ CONVERSION_MATRIX = {
     'jpg': ['png', 'webp', 'pdf'],
     'jpeg': ['png', 'webp', 'pdf'],
     'png': ['jpg', 'webp', 'pdf'],
-    'webp': ['jpg', 'png', 'pdf'],
+    'webp': ['jpg', 'png', 'pdf', 'mp4'],
     'bmp': ['jpg', 'png', 'pdf'],
     'gif': ['mp4', 'webp'],
     'tiff': ['jpg', 'png', 'pdf'],
@@ -106,26 +308,136 @@ CONVERSION_MATRIX = {
 }
 
 # ==================== YORDAMCHI FUNKSIYALAR ====================
-def setup_environment():
-    """Muhitni sozlash va zarur kutubxonalarni tekshirish"""
+def check_libraries(verbose: bool = True):
+    """Kutubxonalar mavjudligini tekshirish"""
     try:
         from PIL import Image
         Config.HAS_PIL = True
-        logger.info("✅ PIL/Pillow kutubxonasi mavjud")
+        # Bundan katta rasmlar Image.open da DecompressionBombError beradi
+        Image.MAX_IMAGE_PIXELS = Config.IMAGE_MAX_PIXELS
+        if verbose:
+            logger.info("✅ PIL/Pillow kutubxonasi mavjud")
     except ImportError:
-        logger.warning("❌ PIL/Pillow kutubxonasi topilmadi. Rasm konvertatsiyasi cheklangan")
+        if verbose:
+            logger.warning("❌ PIL/Pillow kutubxonasi topilmadi. Rasm konvertatsiyasi cheklangan")
+    
+    # pyvips bu yerda import qilinmaydi: libvips ni asosiy jarayonda ishga tushirib, keyin fork qilish xavfli
+    Config.HAS_PYVIPS = importlib.util.find_spec('pyvips') is not None
+    if verbose and Config.HAS_PYVIPS:
+        logger.info("✅ pyvips mavjud (juda katta rasmlar bo'lakma-bo'lak qayta ishlanadi)")
     
     try:
         import reportlab
         Config.HAS_REPORTLAB = True
-        logger.info("✅ ReportLab kutubxonasi mavjud")
+        if verbose:
+            logger.info("✅ ReportLab kutubxonasi mavjud")
+    except ImportError:
+        if verbose:
+            logger.warning("❌ ReportLab kutubxonasi topilmadi. PDF yaratish cheklangan")
+    
+    try:
+        import_pymupdf()
+        Config.HAS_PYMUPDF = True
+        if verbose:
+            logger.info("✅ PyMuPDF kutubxonasi mavjud")
+    except ImportError:
+        if verbose:
+            logger.warning("❌ PyMuPDF kutubxonasi topilmadi. PDF → rasm konvertatsiyasi mavjud emas")
+    
+    Config.HAS_LIBREOFFICE = office_binary() is not None
+    if verbose:
+        # Pul jarayonlari ofis pulini ishlatmaydi - qidiruv faqat asosiy/ishchi jarayonda
+        Config.UNOSERVER_COMMAND = unoserver_command() if Config.HAS_LIBREOFFICE else []
+    Config.HAS_UNOSERVER = bool(Config.UNOSERVER_COMMAND) and shutil.which('unoconvert') is not None
+    Config.HAS_PANDOC = shutil.which('pandoc') is not None
+    if verbose:
+        if Config.HAS_LIBREOFFICE:
+            mode = "unoserver puli" if Config.HAS_UNOSERVER else "har safar alohida soffice"
+            logger.info(f"✅ LibreOffice mavjud ({mode})")
+        else:
+            logger.warning("❌ LibreOffice topilmadi. DOC/DOCX/RTF → PDF konvertatsiyasi mavjud emas")
+        if Config.HAS_PANDOC:
+            logger.info("✅ Pandoc mavjud")
+    
+    Config.HAS_FFMPEG = shutil.which('ffmpeg') is not None
+    Config.HAS_FFPROBE = shutil.which('ffprobe') is not None
+    if verbose:
+        if Config.HAS_FFMPEG:
+            logger.info("✅ FFmpeg mavjud")
+        else:
+            logger.warning("❌ FFmpeg topilmadi. Audio/video konvertatsiyasi mavjud emas")
+    
+    try:
+        import libarchive
+        Config.HAS_LIBARCHIVE = True
+    except (ImportError, OSError):
+        pass
+    try:
+        import py7zr
+        Config.HAS_PY7ZR = True
+    except ImportError:
+        pass
+    Config.HAS_RAR = shutil.which('rar') is not None
+    if verbose:
+        if Config.HAS_LIBARCHIVE:
+            logger.info("✅ libarchive mavjud (RAR/7Z o'qish)")
+        elif Config.HAS_PY7ZR:
+            logger.info("✅ py7zr mavjud (7Z o'qish)")
+        else:
+            logger.warning("❌ libarchive/py7zr topilmadi. RAR/7Z arxivlarini o'qib bo'lmaydi")
+
+def import_pymupdf():
+    """PyMuPDF ni yuklash (yangi versiyalarda `fitz` nomi eskirgan deb ogohlantiradi)"""
+    try:
+        import pymupdf
+        return pymupdf
     except ImportError:
-        logger.warning("❌ ReportLab kutubxonasi topilmadi. PDF yaratish cheklangan")
+        import fitz
+        return fitz
+
+def office_binary() -> Optional[str]:
+    """LibreOffice bajariladigan faylini topish"""
+    return shutil.which('soffice') or shutil.which('libreoffice')
+
+def unoserver_command() -> List[str]:
+    """unoserver serverini ishga tushirish buyrug'i.
+    
+    pip dagi unoserver 'uno' modulini talab qiladi, u esa faqat tizim (python3-uno) yoki LibreOffice
+    Pythonida bor. Shunday Python topilsa, server o'sha Python bilan pip paketi yo'lidan ishga tushiriladi.
+    """
+    spec = importlib.util.find_spec('unoserver')
+    if spec is None or not spec.submodule_search_locations:
+        return ['unoserver'] if shutil.which('unoserver') else []
+    
+    package_root = os.path.dirname(list(spec.submodule_search_locations)[0])
+    office = office_binary()
+    candidates = [Config.UNO_PYTHON, sys.executable, '/usr/bin/python3']
+    if office:
+        candidates.append(os.path.join(os.path.dirname(os.path.realpath(office)), 'python'))
+    for python in candidates:
+        if not python or not os.path.exists(python):
+            continue
+        try:
+            found = subprocess.run([python, '-c', 'import uno'], stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, timeout=30).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            found = False
+        if found:
+            # pip paketi yo'li oxiriga qo'shiladi - tizim paketlarini to'sib qo'ymaydi
+            return [python, '-c', f"import sys; sys.path.append({package_root!r}); "
+                                  f"from unoserver.server import main; sys.exit(main())"]
+    return []
+
+def setup_environment():
+    """Muhitni sozlash va zarur kutubxonalarni tekshirish"""
+    check_libraries()
     
     # Papkalarni yaratish
     os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(Config.OUTPUT_FOLDER, exist_ok=True)
     os.makedirs(Config.TEMP_FOLDER, exist_ok=True)
+    os.makedirs(Config.CACHE_FOLDER, exist_ok=True)
+    os.makedirs(Config.DOWNLOAD_FOLDER, exist_ok=True)
     
     logger.info("✅ Papkalar yaratildi")
 
@@ -161,6 +473,16 @@ def human_readable_size(size_bytes: int) -> str:
     
     return f"{size_bytes:.2f} {units[i]}"
 
+def get_download_limit() -> int:
+    """Bot API orqali yuklab olish mumkin bo'lgan maksimal hajm"""
+    if Config.BOT_API_LOCAL_MODE:
+        return Config.MAX_FILE_SIZE
+    return min(Config.MAX_FILE_SIZE, Config.CLOUD_DOWNLOAD_LIMIT)
+
+def get_upload_limit() -> int:
+    """Bot API orqali yuborish mumkin bo'lgan maksimal hajm"""
+    return Config.LOCAL_UPLOAD_LIMIT if Config.BOT_API_LOCAL_MODE else Config.CLOUD_UPLOAD_LIMIT
+
 def get_file_info(file_path: str) -> Dict:
     """Fayl haqida ma'lumot olish"""
     try:
@@ -178,8 +500,11 @@ def get_file_info(file_path: str) -> Dict:
         if info['type'] == 'image' and Config.HAS_PIL:
             try:
                 from PIL import Image
+                # Faqat sarlavha o'qiladi (piksellar dekodlanmaydi)
                 with Image.open(file_path) as img:
                     info['dimensions'] = f"{img.width}×{img.height}"
+                    # Format tanlash tugmalari (animatsiyaga oid yo'llar) uchun
+                    info['animated'] = bool(getattr(img, 'is_animated', False))
             except:
                 pass
         
@@ -188,14 +513,25 @@ def get_file_info(file_path: str) -> Dict:
         logger.error(f"Fayl ma'lumotlarini olishda xato: {e}")
         return {}
 
-def create_format_keyboard(original_ext: str, file_id: str, settings: Dict = None) -> Optional[InlineKeyboardMarkup]:
-    """Format tanlash uchun tugmachalar yaratish"""
-    if original_ext not in CONVERSION_MATRIX:
+def format_eta(seconds: float) -> str:
+    """Taxminiy vaqt tugma uchun qisqa ko'rinishda"""
+    if seconds < 1:
+        return "<1 s"
+    if seconds < 60:
+        return f"~{seconds:.0f} s"
+    return f"~{seconds / 60:.0f} daq"
+
+def create_format_keyboard(original_ext: str, file_id: str, settings: Dict = None,
+                           size: int = 0, animated: bool = False) -> Optional[InlineKeyboardMarkup]:
+    """Format tanlash uchun tugmachalar (to'g'ridan-to'g'ri va ko'p bosqichli, taxminiy vaqt bilan)"""
+    routes = conversion_planner.routes(original_ext, animated)
+    if not routes:
         return None
     
-    target_formats = CONVERSION_MATRIX.get(original_ext, [])
-    if not target_formats:
-        return None
+    # Avval to'g'ridan-to'g'ri formatlar (matritsa tartibida), keyin qolganlari arzonidan boshlab
+    direct = [ConversionPlanner.canonical(fmt) for fmt in CONVERSION_MATRIX.get(original_ext, [])]
+    target_formats = [fmt for fmt in direct if fmt in routes]
+    target_formats += sorted((fmt for fmt in routes if fmt not in direct), key=lambda fmt: routes[fmt][0])
     
     # Tugmalarni guruhlash (har qatorda 3 ta)
     buttons = []
@@ -211,8 +547,9 @@ def create_format_keyboard(original_ext: str, file_id: str, settings: Dict = Non
             'archive': '📦'
         }.get(get_file_type(fmt), '📎')
         
+        eta = conversion_planner.estimate(routes[fmt][0], size)
         row.append(InlineKeyboardButton(
-            f"{emoji} {fmt.upper()}",
+            f"{emoji} {fmt.upper()} {format_eta(eta)}",
             callback_data=f"conv:{file_id}:{fmt}"
         ))
         
@@ -223,6 +560,10 @@ def create_format_keyboard(original_ext: str, file_id: str, settings: Dict = Non
     if row:
         buttons.append(row)
     
+    # Rasmni hajmini kamaytirish (maqsadli hajm sozlamalarda)
+    if get_file_type(original_ext) == 'image':
+        buttons.append([InlineKeyboardButton("🗜️ Siqish", callback_data=f"comp:{file_id}")])
+    
     # Qo'shimcha funksiyalar
     buttons.append([
         InlineKeyboardButton("⚙️ Sozlamalar", callback_data=f"set:{file_id}"),
@@ -231,194 +572,3971 @@ def create_format_keyboard(original_ext: str, file_id: str, settings: Dict = Non
     
     return InlineKeyboardMarkup(buttons)
 
-# ==================== KONVERTATSIYA FUNKSIYALARI ====================
-class Converter:
-    """Barcha konvertatsiya operatsiyalari"""
+# Albom (bir nechta fayl) uchun bitta natija beradigan formatlar
+BATCH_TARGET_LABELS = {
+    'pdf': "📄 Bitta PDF",
+    'webp': "🖼️ WebP (ZIP)",
+    'zip': "📦 ZIP arxiv",
+}
+
+def batch_targets(extensions: List[str]) -> List[str]:
+    """To'plam formatlari: rasmlar uchun PDF va WebP, istalgan fayllar uchun ZIP"""
+    if all(get_file_type(ext) == 'image' for ext in extensions):
+        return ['pdf', 'webp', 'zip']
+    return ['zip']
+
+def create_batch_keyboard(batch_id: str, extensions: List[str]) -> InlineKeyboardMarkup:
+    """Albom uchun tugmalar: barcha fayllar bitta natijaga yoki har biri alohida"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(BATCH_TARGET_LABELS[target], callback_data=f"batch:{batch_id}:{target}")
+            for target in batch_targets(extensions)
+        ],
+        [InlineKeyboardButton("📎 Har birini alohida", callback_data=f"split:{batch_id}")],
+    ])
+
+# ==================== JARAYON HISOBOTI ====================
+_progress_local = threading.local()
+_PROGRESS_QUEUE = None  # Ishchi jarayonlarda asosiy jarayonga yo'l
+
+def report_progress(done: float, total: Optional[float] = None, unit: str = ''):
+    """Joriy vazifa jarayonini xabar qilish (ishchi jarayon yoki oqim ichidan)"""
+    sink = getattr(_progress_local, 'sink', None)
+    if sink is None:
+        return
+    
+    # Juda tez-tez xabar yubormaslik
+    now = time.monotonic()
+    finished = total is not None and done >= total
+    if not finished and now - _progress_local.last < Config.PROGRESS_REPORT_INTERVAL:
+        return
+    _progress_local.last = now
+    
+    try:
+        sink(done, total, unit)
+    except Exception as e:
+        logger.debug(f"Progress xabarini yuborib bo'lmadi: {e}")
+
+def _run_with_progress(sink, func, args, kwargs):
+    """Funksiyani progress qabul qiluvchi bilan bajarish"""
+    _progress_local.sink = sink
+    _progress_local.last = 0.0
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _progress_local.sink = None
+
+class _QueueProgressSink:
+    """Ishchi jarayondan progressni navbat orqali yuborish"""
+    
+    def __init__(self, key: int):
+        self.key = key
+    
+    def __call__(self, done, total, unit):
+        if _PROGRESS_QUEUE is not None:
+            _PROGRESS_QUEUE.put((self.key, done, total, unit))
+
+def copy_file_with_progress(src: str, dst: str):
+    """Faylni bo'laklab nusxalash va jarayonni xabar qilish"""
+    total = os.path.getsize(src)
+    done = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            chunk = fin.read(Config.COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            fout.write(chunk)
+            done += len(chunk)
+            report_progress(done, total, 'bytes')
+    shutil.copymode(src, dst)
+
+# ==================== XOTIRA ====================
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Joriy konvertatsiyaning xotira cho'qqisi (Converter.convert o'rnatadi, run_cpu/run_ffmpeg yangilaydi)
+_job_memory: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar('job_memory', default=None)
+
+def read_rss(pid='self') -> int:
+    """Jarayonning joriy RSS hajmi (/proc/<pid>/statm, baytlarda)"""
+    with open(f'/proc/{pid}/statm') as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+class MemorySampler:
+    """Fon oqimida RSS ni muntazam o'qib, cho'qqisini eslab qolish"""
+    
+    def __init__(self, pid='self', interval: float = None):
+        self.pid = pid
+        self.interval = interval or Config.MEMORY_SAMPLE_INTERVAL
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def sample(self) -> bool:
+        try:
+            self.peak = max(self.peak, read_rss(self.pid))
+            return True
+        except (OSError, ValueError, IndexError):
+            # /proc yo'q (Linux emas) yoki jarayon tugagan
+            return False
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.sample():
+                break
+    
+    def __enter__(self):
+        if self.sample():
+            self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+        return False
+
+def record_memory_peak(peak: int):
+    holder = _job_memory.get()
+    if holder is not None and peak > holder[0]:
+        holder[0] = peak
+
+def _run_measured(call):
+    """Pul jarayonida vazifani bajarish va uning xotira cho'qqisini qaytarish"""
+    with MemorySampler() as sampler:
+        result = call()
+    return result, sampler.peak
+
+# ==================== METRIKALAR ====================
+class MetricFamily:
+    """Bir xil nomli, turli yorliqli metrikalar (counter, gauge yoki histogram)"""
+    
+    def __init__(self, kind: str, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = None, callback: Optional[Callable[[], float]] = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets or ()) + (float('inf'),)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [har bir chegara uchun soni..., yig'indi, jami soni]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
     
     @staticmethod
-    async def convert_image(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
-        """Rasmni konvertatsiya qilish"""
+    def _format_labels(pairs) -> str:
+        if not pairs:
+            return ''
+        parts = []
+        for name, value in pairs:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{name}="{value}"')
+        return '{' + ','.join(parts) + '}'
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.callback is not None:
+            lines.append(f"{self.name} {float(self.callback())}")
+            return lines
+        
+        with self._lock:
+            items = [(key, list(value) if isinstance(value, list) else value) for key, value in self._values.items()]
+        for key, value in sorted(items):
+            pairs = list(zip(self.labels, key))
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{self._format_labels(pairs)} {value}")
+                continue
+            for bound, count in zip(self.buckets, value):
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f"{self.name}_bucket{self._format_labels(pairs + [('le', le)])} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(pairs)} {value[-2]}")
+            lines.append(f"{self.name}_count{self._format_labels(pairs)} {value[-1]}")
+        return lines
+
+class Metrics:
+    """Bot metrikalari: bosqichlar davomiyligi, baytlar, kesh, navbat va hodisalar sikli kechikishi"""
+    
+    STAGE_LABELS = ('stage', 'source', 'target', 'engine')
+    
+    def __init__(self):
+        self._families: List[MetricFamily] = []
+        self.stage_seconds = self.histogram(
+            'converter_stage_duration_seconds',
+            "Bosqich davomiyligi (download, queue, convert, upload)",
+            self.STAGE_LABELS, Config.METRICS_LATENCY_BUCKETS
+        )
+        self.stage_total = self.counter(
+            'converter_stage_total', "Tugagan bosqichlar soni natija bo'yicha", self.STAGE_LABELS + ('status',)
+        )
+        self.bytes_total = self.counter(
+            'converter_bytes_total', "Qabul qilingan (in) va yuborilgan (out) baytlar", ('direction', 'format')
+        )
+        self.cache_requests = self.counter(
+            'converter_cache_requests_total', "Kesh so'rovlari (result - natijalar keshi, sent - file_id indeksi)",
+            ('cache', 'result')
+        )
+        self.memory_peak = self.histogram(
+            'converter_job_memory_peak_bytes',
+            "Konvertatsiya xotira cho'qqisi (faqat shu jarayonda bajarilganlar - navbat rejimida ishchilarda yoziladi)",
+            ('engine',),
+            tuple(2 ** power * 1024 * 1024 for power in range(4, 14))
+        )
+        self.loop_lag = self.gauge('converter_event_loop_lag_seconds', "Hodisalar sikli kechikishi (oxirgi o'lchov)")
+        self.loop_lag_seconds = self.histogram(
+            'converter_event_loop_lag_observed_seconds', "Hodisalar sikli kechikishi",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5)
+        )
+        self.start_time = time.time()
+        self.gauge('process_start_time_seconds', "Jarayon ishga tushgan vaqt (unix)", callback=lambda: self.start_time)
+        self.gauge('converter_uptime_seconds', "Ishlash vaqti", callback=lambda: time.time() - self.start_time)
+    
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> MetricFamily:
+        return self._register(MetricFamily('counter', name, documentation, labels))
+    
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+              callback: Optional[Callable[[], float]] = None) -> MetricFamily:
+        return self._register(MetricFamily('gauge', name, documentation, labels, callback=callback))
+    
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = None) -> MetricFamily:
+        return self._register(MetricFamily('histogram', name, documentation, labels,
+                                           buckets or Config.METRICS_LATENCY_BUCKETS))
+    
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        self._families.append(family)
+        return family
+    
+    def observe_stage(self, stage: str, seconds: float, source: str = '', target: str = '',
+                      engine: str = '', success: bool = True):
+        labels = {'stage': stage, 'source': source, 'target': target, 'engine': engine}
+        self.stage_seconds.observe(seconds, **labels)
+        self.stage_total.inc(status='ok' if success else 'error', **labels)
+    
+    def cache_lookup(self, cache: str, hit: bool):
+        self.cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+    
+    def render(self) -> str:
+        lines = []
+        for family in self._families:
+            try:
+                lines.extend(family.render())
+            except Exception as e:
+                logger.debug(f"Metrikani hisoblab bo'lmadi ({family.name}): {e}")
+        return "\n".join(lines) + "\n"
+    
+    async def monitor_loop_lag(self, interval: float = None):
+        """Hodisalar siklining kechikishi: uyqudan kutilganidan qancha kech uyg'onilgani"""
+        interval = interval or Config.METRICS_LOOP_LAG_INTERVAL
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - started - interval)
+            self.loop_lag.set(lag)
+            self.loop_lag_seconds.observe(lag)
+    
+    async def handle(self, request: 'HttpRequest', writer: asyncio.StreamWriter):
+        """GET /metrics"""
+        if Config.METRICS_LOCAL_ONLY:
+            peer = writer.get_extra_info('peername')
+            try:
+                allowed = bool(peer) and ipaddress.ip_address(peer[0]).is_loopback
+            except ValueError:
+                allowed = False
+            if not allowed:
+                await HttpServer.send_response(writer, 403, b"Forbidden")
+                return
+        if request.method not in ('GET', 'HEAD'):
+            await HttpServer.send_response(writer, 405, b"Method Not Allowed")
+            return
+        await HttpServer.send_response(
+            writer, 200, self.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+            head_only=request.method == 'HEAD'
+        )
+
+metrics = Metrics()
+
+def timed_conversion(convert):
+    """Backend.convert ni 'convert' bosqichi sifatida o'lchash"""
+    @functools.wraps(convert)
+    async def wrapper(self, file_type: str, input_path: str, output_path: str, target_format: str,
+                      settings: Dict, progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        started = time.monotonic()
+        success = False
         try:
-            if not Config.HAS_PIL:
-                return False, "PIL/Pillow kutubxonasi topilmadi"
+            success, message = await convert(self, file_type, input_path, output_path, target_format,
+                                              settings, progress)
+            return success, message
+        finally:
+            metrics.observe_stage('convert', time.monotonic() - started, get_file_extension(input_path),
+                                  target_format, file_type, success)
+    return wrapper
+
+# ==================== KONVERTATSIYA EXECUTORI ====================
+def _init_worker_process(progress_queue=None):
+    """Pul jarayonini tayyorlash"""
+    global _PROGRESS_QUEUE
+    # CTRL+C faqat asosiy jarayonga tegishli
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _PROGRESS_QUEUE = progress_queue
+    check_libraries(verbose=False)
+
+class ConversionExecutor:
+    """CPU ishlari uchun jarayonlar puli va I/O uchun oqimlar puli"""
+    
+    def __init__(self, process_workers: int = None, io_workers: int = None):
+        self.process_workers = process_workers or Config.PROCESS_POOL_SIZE
+        self.io_workers = io_workers or Config.IO_POOL_SIZE
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_slots: Optional[asyncio.Semaphore] = None
+        self._progress_queue = None
+        self._progress_thread: Optional[threading.Thread] = None
+        self._progress_callbacks: Dict[int, Tuple[asyncio.AbstractEventLoop, Callable]] = {}
+        self._progress_keys = itertools.count(1)
+    
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            mp_context = multiprocessing.get_context()
+            if self._progress_queue is None:
+                self._progress_queue = mp_context.Queue()
+                self._progress_thread = threading.Thread(
+                    target=self._listen_progress, name="progress", daemon=True
+                )
+                self._progress_thread.start()
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=mp_context,
+                initializer=_init_worker_process,
+                initargs=(self._progress_queue,)
+            )
+            logger.info(f"⚙️ Jarayonlar puli ishga tushdi: {self.process_workers} ta")
+        return self._process_pool
+    
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.io_workers,
+                thread_name_prefix="io"
+            )
+        return self._thread_pool
+    
+    def _listen_progress(self):
+        """Ishchi jarayonlardan kelgan progressni tegishli callbackga uzatish"""
+        while True:
+            item = self._progress_queue.get()
+            if item is None:
+                break
+            key, done, total, unit = item
+            entry = self._progress_callbacks.get(key)
+            if entry is None:
+                continue
+            loop, callback = entry
+            loop.call_soon_threadsafe(callback, done, total, unit)
+    
+    async def run_cpu(self, func, *args, progress: Optional[Callable] = None, **kwargs):
+        """CPU ishini jarayonlar pulida bajarish"""
+        # Navbatga qo'yilgan vazifalar sonini cheklash (xotira uchun)
+        if self._cpu_slots is None:
+            self._cpu_slots = asyncio.Semaphore(self.process_workers * 2)
+        
+        loop = asyncio.get_running_loop()
+        async with self._cpu_slots:
+            pool = self.process_pool
+            key = None
+            if progress is not None:
+                key = next(self._progress_keys)
+                self._progress_callbacks[key] = (loop, progress)
+                call = functools.partial(_run_with_progress, _QueueProgressSink(key), func, args, kwargs)
+            else:
+                call = functools.partial(func, *args, **kwargs)
+            
+            try:
+                result, peak = await loop.run_in_executor(pool, functools.partial(_run_measured, call))
+                record_memory_peak(peak)
+                return result
+            except BrokenProcessPool:
+                # Ishchi jarayon o'ldirilgan (masalan, OOM) - pulni qayta yaratish
+                logger.error("❌ Jarayonlar puli buzildi, qayta yaratilmoqda")
+                self._process_pool = None
+                raise
+            finally:
+                if key is not None:
+                    self._progress_callbacks.pop(key, None)
+    
+    async def run_io(self, func, *args, progress: Optional[Callable] = None, **kwargs):
+        """I/O ishini oqimlar pulida bajarish"""
+        loop = asyncio.get_running_loop()
+        if progress is not None:
+            def sink(done, total, unit):
+                loop.call_soon_threadsafe(progress, done, total, unit)
+            call = functools.partial(_run_with_progress, sink, func, args, kwargs)
+        else:
+            call = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(self.thread_pool, call)
+    
+    def shutdown(self, wait: bool = True):
+        """Pullarni to'xtatish"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=True)
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait, cancel_futures=True)
+            self._thread_pool = None
+        if self._progress_queue is not None:
+            self._progress_queue.put(None)
+            self._progress_thread.join(timeout=5)
+            self._progress_queue = None
+            self._progress_thread = None
+
+executor = ConversionExecutor()
+
+# ==================== SINXRON KONVERTATSIYA (JARAYONLAR PULIDA) ====================
+# Kengaytma → Pillow format nomi (Pillow 'JPG' ni tanimaydi)
+PIL_SAVE_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'tif': 'TIFF'}
+
+def pil_format(extension: str) -> str:
+    return PIL_SAVE_FORMATS.get(extension.lower(), extension.upper())
+
+def scaled_size(size: Tuple[int, int], percent: float) -> Tuple[int, int]:
+    return max(1, round(size[0] * percent / 100)), max(1, round(size[1] * percent / 100))
+
+def load_scaled(img, size: Tuple[int, int]):
+    """Rasmni kerakli o'lchamga eng arzon yo'l bilan dekodlash.
+    
+    JPEG uchun draft() DCT bosqichida 1/2, 1/4 yoki 1/8 masshtabda dekodlaydi, so'ng
+    reduce() (reducing_gap) katta kichraytirishni bajaradi va oxirida LANCZOS sifatli o'tish qiladi.
+    """
+    from PIL import Image
+    
+    if size == img.size:
+        img.load()
+        return img
+    gap = Config.IMAGE_REDUCING_GAP
+    if size[0] < img.width and size[1] < img.height:
+        # Faqat load() dan oldin ishlaydi; JPEG bo'lmagan formatlar uchun hech narsa qilmaydi
+        img.draft(None, (int(size[0] * gap), int(size[1] * gap)))
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=gap)
+
+class ImageTooLargeError(Exception):
+    """Rasmni xotira byudjeti doirasida dekodlab bo'lmaydi"""
+
+# libvips oqimda yoza oladigan formatlar
+VIPS_SAVE_FORMATS = {'JPEG', 'PNG', 'WEBP', 'TIFF'}
+
+def image_bytes_per_pixel(mode: str) -> int:
+    """Pillow ichki xotirasidagi piksel hajmi (RGB ham 4 bayt - RGBX ko'rinishida saqlanadi)"""
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+def estimate_decode_bytes(img, size: Tuple[int, int]) -> int:
+    """Dekodlashdan oldin xotirani baholash: piksellar × kanal baytlari.
+    
+    Manba (JPEG draft masshtabi hisobga olingan) + natija o'lchamidagi ikki nusxa (resize va alfa fonga joylash).
+    """
+    width, height = img.size
+    if img.format == 'JPEG' and size[0] < width and size[1] < height:
+        gap = Config.IMAGE_REDUCING_GAP
+        scale = min(width // max(1, int(size[0] * gap)), height // max(1, int(size[1] * gap)))
+        factor = next(f for f in (8, 4, 2, 1) if scale >= f)
+        width, height = -(-width // factor), -(-height // factor)
+    return width * height * image_bytes_per_pixel(img.mode) + 2 * size[0] * size[1] * 4
+
+def plan_image_decode(img, size: Tuple[int, int], save_format: str) -> Tuple[Tuple[int, int], bool]:
+    """Natija o'lchami va usulini tanlash: (o'lcham, libvips_oqimida).
+    
+    Byudjetga sig'sa - oddiy Pillow. Sig'masa: pyvips bo'lsa rasm bo'lakma-bo'lak qayta ishlanadi,
+    JPEG bo'lsa draft() sig'adigan darajada kichraytirib dekodlanadi, aks holda rad etiladi.
+    """
+    width, height = img.size
+    if width * height > Config.IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(f"Rasm juda katta: {width}×{height} (chegara {Config.IMAGE_MAX_PIXELS:,} piksel)")
+    
+    budget = Config.IMAGE_MEMORY_BUDGET
+    needed = estimate_decode_bytes(img, size)
+    if needed <= budget:
+        return size, False
+    
+    if Config.HAS_PYVIPS and save_format in VIPS_SAVE_FORMATS:
+        return size, True
+    
+    if img.format == 'JPEG':
+        candidate = size
+        while candidate[0] > 1 and candidate[1] > 1:
+            candidate = (max(1, candidate[0] // 2), max(1, candidate[1] // 2))
+            if estimate_decode_bytes(img, candidate) <= budget:
+                logger.warning(f"Rasm xotira uchun kichraytirildi: {size} → {candidate}")
+                return candidate, False
+    
+    raise ImageTooLargeError(
+        f"Rasm {width}×{height} dekodlash uchun ~{human_readable_size(needed)} xotira talab qiladi "
+        f"(chegara {human_readable_size(budget)})"
+    )
+
+def _save_image_streamed(input_path: str, output_path: str, size: Tuple[int, int], save_format: str,
+                         quality: int, strip: bool = False):
+    """libvips: rasm ketma-ket (sequential) bo'laklarda o'qiladi, kichraytiriladi va yoziladi"""
+    import pyvips
+    
+    # Kesh va qo'shimcha oqimlar xotira byudjetini buzmasligi uchun
+    pyvips.cache_set_max(0)
+    pyvips.concurrency_set(1)
+    image = pyvips.Image.new_from_file(input_path, access='sequential')
+    if (image.width, image.height) != size:
+        # thumbnail() JPEG/WebP uchun kichraytirib yuklashni (shrink-on-load) o'zi ishlatadi
+        image = pyvips.Image.thumbnail(input_path, size[0], height=size[1], size='force')
+    if save_format == 'JPEG' and image.hasalpha():
+        image = image.flatten(background=[255] * (image.bands - 1))
+    options = {'Q': quality} if save_format in ('JPEG', 'WEBP') else {}
+    if strip:
+        options['strip'] = True
+    image.write_to_file(output_path, **options)
+
+def flatten_for_format(img, save_format: str):
+    """JPEG/PDF alfa kanal va palitrani qo'llab-quvvatlamaydi - oq fonga joylash"""
+    from PIL import Image
+    
+    if save_format in ('JPEG', 'PDF') and img.mode in ('RGBA', 'LA', 'PA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode == 'P':
+        return img.convert('RGBA' if 'transparency' in img.info and save_format not in ('JPEG', 'PDF') else 'RGB')
+    if save_format in ('JPEG', 'PDF') and img.mode not in ('RGB', 'L', 'CMYK'):
+        return img.convert('RGB')
+    return img
+
+# Kadrlarni birma-bir kodlay oladigan animatsiya formatlari (Pillow GIF yozuvchisi barcha kadrlarni
+# xotirada ushlab turadi, shuning uchun GIF natijalar FFmpeg orqali yasaladi)
+ANIMATED_SAVE_FORMATS = {'WEBP'}
+
+def check_animation_budget(img):
+    """Kadrlar dekodlanishidan oldin: bitta kadr uchun xotira byudjetga sig'adimi.
+    
+    Bir vaqtda xotirada: dekodlangan kadr va oldingisi (GIF disposal, Pillow keyingi kadrlarni RGB/RGBA da
+    saqlaydi), RGBA nusxa, RGB nusxa va uning baytlari.
+    """
+    width, height = img.size
+    if width * height > Config.IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(f"Rasm juda katta: {width}×{height} (chegara {Config.IMAGE_MAX_PIXELS:,} piksel)")
+    needed = width * height * (4 + 4 + 4 + 3 + 3)
+    if needed > Config.IMAGE_MEMORY_BUDGET:
+        raise ImageTooLargeError(
+            f"Animatsiya kadri {width}×{height} dekodlash uchun ~{human_readable_size(needed)} xotira talab qiladi "
+            f"(chegara {human_readable_size(Config.IMAGE_MEMORY_BUDGET)})"
+        )
+
+def animation_durations(img) -> List[int]:
+    """Har bir kadr davomiyligi (ms) - kodlashdan oldingi alohida o'tish, kadrlar xotirada saqlanmaydi"""
+    frames = getattr(img, 'n_frames', 1)
+    if frames > Config.ANIMATION_MAX_FRAMES:
+        raise ImageTooLargeError(f"Animatsiyada kadrlar juda ko'p: {frames} (chegara {Config.ANIMATION_MAX_FRAMES})")
+    if frames == 1:
+        return [Config.ANIMATION_STILL_DURATION]
+    
+    durations = []
+    for index in range(frames):
+        img.seek(index)
+        # WebP kadr davomiyligini faqat dekodlashda o'qiydi
+        img.load()
+        delay = int(img.info.get('duration') or 0)
+        durations.append(delay if delay >= Config.ANIMATION_MIN_DELAY else Config.ANIMATION_DEFAULT_DELAY)
+    img.seek(0)
+    return durations
+
+def animation_frame_rate(durations: List[int]) -> Fraction:
+    """Doimiy FPS: barcha kechikishlarning EKUBi (kadrlar kerakli marta takrorlanadi), Config.ANIMATION_MAX_FPS gacha"""
+    step = functools.reduce(math.gcd, durations)
+    return min(Fraction(1000, step), Fraction(Config.ANIMATION_MAX_FPS))
+
+def iter_animation_frames(img, durations: List[int], fps: Fraction):
+    """Kadrlarni (ImageSequence) birma-bir oq fondagi RGB baytlarga o'girish.
+    
+    Har kadr vaqt o'qidagi oxirigacha yetadigan marta takrorlanadi - kechikishlar FPS ga
+    karrali bo'lmasa ham xatolik to'planib qolmaydi.
+    """
+    from PIL import ImageSequence
+    
+    elapsed = 0
+    emitted = 0
+    for frame, delay in zip(ImageSequence.Iterator(img), durations):
+        elapsed += delay
+        repeat = round(elapsed * fps / 1000) - emitted
+        if repeat <= 0:
+            continue
+        data = flatten_for_format(frame.convert('RGBA'), 'JPEG').tobytes()
+        emitted += repeat
+        for _ in range(repeat):
+            yield data
+
+def _convert_animation_sync(source, output_path: str, save_format: str, quality: int) -> Tuple[bool, str]:
+    """Animatsiyali GIF/WebP ni WebP ga: kodlovchi kadrlarni o'zi birma-bir seek() qiladi"""
+    check_animation_budget(source)
+    durations = animation_durations(source)
+    report_progress(1, 2, 'steps')
+    source.save(
+        output_path, save_format, save_all=True, duration=durations,
+        loop=source.info.get('loop', 0), quality=quality
+    )
+    report_progress(2, 2, 'steps')
+    return True, f"Muvaffaqiyatli ({len(durations)} kadr, {sum(durations) / 1000:.1f} s)"
+
+def _convert_image_sync(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
+    """Rasmni konvertatsiya qilish (ishchi jarayonda)"""
+    try:
+        if not Config.HAS_PIL:
+            return False, "PIL/Pillow kutubxonasi topilmadi"
+        
+        from PIL import Image
+        
+        save_format = pil_format(target_format)
+        # Sifat sozlamalari
+        quality = int(settings.get('image_quality', 85))
+        resize_percent = int(settings.get('resize_percent', 100))
+        
+        with Image.open(input_path) as source:
+            if getattr(source, 'is_animated', False) and save_format in ANIMATED_SAVE_FORMATS:
+                return _convert_animation_sync(source, output_path, save_format, quality)
             
-            from PIL import Image
+            # O'lcham sarlavhadan ma'lum - xotira byudjeti piksellar dekodlanishidan oldin tekshiriladi
+            requested = scaled_size(source.size, resize_percent)
+            size, streamed = plan_image_decode(source, requested, save_format)
             
-            with Image.open(input_path) as img:
-                # RGBA dan RGB ga o'tkazish (agar kerak bo'lsa)
-                if target_format.upper() in ['JPG', 'JPEG', 'PDF'] and img.mode in ['RGBA', 'LA']:
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'RGBA':
-                        background.paste(img, mask=img.split()[3])
-                    else:
-                        background.paste(img, mask=img.split()[1])
-                    img = background
-                elif img.mode == 'P':
-                    img = img.convert('RGB')
-                
-                # Sifat sozlamalari
-                quality = int(settings.get('image_quality', 85))
+            if not streamed:
+                img = load_scaled(source, size)
+                report_progress(1, 3, 'steps')
                 
-                # O'lchamni o'zgartirish
-                resize_percent = int(settings.get('resize_percent', 100))
-                if resize_percent != 100:
-                    new_width = int(img.width * resize_percent / 100)
-                    new_height = int(img.height * resize_percent / 100)
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                # RGBA dan RGB ga o'tkazish (agar kerak bo'lsa)
+                img = flatten_for_format(img, save_format)
+                report_progress(2, 3, 'steps')
                 
                 # PDF ga konvertatsiya
-                if target_format.lower() == 'pdf':
+                if save_format == 'PDF':
                     img.save(output_path, 'PDF', quality=quality)
-                # GIF ga konvertatsiya
-                elif target_format.lower() == 'gif':
-                    img.save(output_path, 'GIF', save_all=True, optimize=True)
+                # GIF ga konvertatsiya (bitta kadr - animatsiyalar _convert_animation_sync da)
+                elif save_format == 'GIF':
+                    img.save(output_path, 'GIF', optimize=True)
                 # Boshqa formatlar
                 else:
-                    img.save(output_path, target_format.upper(), quality=quality)
-            
-            return True, "Muvaffaqiyatli"
+                    img.save(output_path, save_format, quality=quality)
+        
+        if streamed:
+            _save_image_streamed(input_path, output_path, size, save_format, quality)
+        report_progress(3, 3, 'steps')
+        
+        if size != requested:
+            return True, f"Muvaffaqiyatli (xotira chegarasi sababli {size[0]}×{size[1]} ga kichraytirildi)"
+        return True, "Muvaffaqiyatli"
+        
+    except Exception as e:
+        logger.error(f"Rasm konvertatsiya xatosi: {e}")
+        return False, str(e)
+
+def _convert_document_sync(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
+    """Hujjatni konvertatsiya qilish (ishchi jarayonda)"""
+    try:
+        input_ext = get_file_extension(input_path)
+        
+        # PDF ga konvertatsiya
+        if target_format.lower() == 'pdf':
+            # ReportLab orqali (faqat text uchun)
+            if input_ext == 'txt':
+                if not Config.HAS_REPORTLAB:
+                    return False, "ReportLab kutubxonasi kerak"
+                return _text_to_pdf_sync(input_path, output_path)
             
-        except Exception as e:
-            logger.error(f"Rasm konvertatsiya xatosi: {e}")
-            return False, str(e)
+            # Pillow orqali (rasm PDF)
+            if Config.HAS_PIL and input_ext in FileTypes.IMAGES:
+                return _convert_image_sync(input_path, output_path, 'pdf', settings)
+        
+        return False, "Ushbu konvertatsiya hozircha qo'llab-quvvatlanmaydi"
+        
+    except Exception as e:
+        logger.error(f"Hujjat konvertatsiya xatosi: {e}")
+        return False, str(e)
+
+def detect_text_encoding(input_path: str) -> str:
+    """Matn fayli kodlashini aniqlash: BOM, UTF-8, charset_normalizer, so'ng Config.TEXT_FALLBACK_ENCODING"""
+    with open(input_path, 'rb') as f:
+        sample = f.read(Config.TEXT_SAMPLE_SIZE)
     
-    @staticmethod
-    async def convert_document(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
-        """Hujjatni konvertatsiya qilish"""
-        try:
-            input_ext = get_file_extension(input_path)
-            
-            # PDF ga konvertatsiya
-            if target_format.lower() == 'pdf':
-                # ReportLab orqali (faqat text uchun)
-                if Config.HAS_REPORTLAB and input_ext == 'txt':
-                    try:
-                        from reportlab.lib.pagesizes import letter
-                        from reportlab.pdfgen import canvas
-                        
-                        with open(input_path, 'r', encoding='utf-8') as f:
-                            text = f.read()
-                        
-                        c = canvas.Canvas(output_path, pagesize=letter)
-                        width, height = letter
-                        
-                        c.setFont("Helvetica", 12)
-                        text_object = c.beginText(40, height - 40)
-                        
-                        lines = text.split('\n')
-                        for line in lines:
-                            text_object.textLine(line[:100])
-                        
-                        c.drawText(text_object)
-                        c.save()
-                        return True, "Muvaffaqiyatli"
-                    except Exception as e:
-                        logger.error(f"ReportLab xatosi: {e}")
-                        # Oddiy nusxa olish
-                        shutil.copy(input_path, output_path)
-                        return True, "Fayl nusxalandi (PDF konvertatsiyasi muvaffaqiyatsiz)"
-                
-                # Pillow orqali (rasm PDF)
-                if Config.HAS_PIL and input_ext in FileTypes.IMAGES:
-                    return await Converter.convert_image(input_path, output_path, 'pdf', settings)
-            
-            # PDF dan boshqa formatga
-            elif input_ext == 'pdf' and target_format in ['jpg', 'png']:
-                if Config.HAS_PIL:
-                    try:
-                        from PIL import Image
-                        import fitz  # PyMuPDF
-                        
-                        # PDF ni rasmga aylantirish
-                        doc = fitz.open(input_path)
-                        page = doc.load_page(0)
-                        pix = page.get_pixmap()
-                        
-                        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                        img.save(output_path, target_format.upper())
-                        return True, "Muvaffaqiyatli"
-                    except:
-                        return False, "PyMuPDF kutubxonasi kerak"
-            
-            return False, "Ushbu konvertatsiya hozircha qo'llab-quvvatlanmaydi"
-            
-        except Exception as e:
-            logger.error(f"Hujjat konvertatsiya xatosi: {e}")
-            return False, str(e)
+    # UTF-32 BOM UTF-16 BOM bilan boshlanadi, shuning uchun avval tekshiriladi
+    boms = (
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'),
+    )
+    for bom, encoding in boms:
+        if sample.startswith(bom):
+            return encoding
     
-    @staticmethod
-    async def convert_audio(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
-        """Audioni konvertatsiya qilish"""
-        try:
-            # Oddiy fayl nusxalash (audio uchun)
-            shutil.copy(input_path, output_path)
-            return True, "Fayl nusxalandi (Audio konvertatsiyasi mavjud emas)"
-            
-        except Exception as e:
-            logger.error(f"Audio konvertatsiya xatosi: {e}")
-            return False, str(e)
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Namuna oxirida kesilib qolgan ko'p baytli belgi xato emas
+        if len(sample) == Config.TEXT_SAMPLE_SIZE and e.start >= len(sample) - 3:
+            return 'utf-8'
     
-    @staticmethod
-    async def convert_video(input_path: str, output_path: str, target_format: str, settings: Dict) -> Tuple[bool, str]:
-        """Videoni konvertatsiya qilish"""
-        try:
-            # Oddiy fayl nusxalash (video uchun)
-            shutil.copy(input_path, output_path)
-            return True, "Fayl nusxalandi (Video konvertatsiyasi mavjud emas)"
-            
-        except Exception as e:
-            logger.error(f"Video konvertatsiya xatosi: {e}")
-            return False, str(e)
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(sample).best()
+        if best is not None:
+            return best.encoding
+    except ImportError:
+        pass
+    return Config.TEXT_FALLBACK_ENCODING
+
+def find_pdf_font() -> Optional[str]:
+    """Unicode (kirill, lotin) belgilarni chiza oladigan TTF shriftni topish"""
+    for path in Config.PDF_FONT_PATHS:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+class TextPdfRenderer:
+    """Matnni PDF ga oqim ko'rinishida joylash: so'z bo'yicha ko'chirish va avtomatik yangi sahifa"""
     
-    @staticmethod
-    async def convert_archive(input_path: str, output_path: str, target_format: str) -> Tuple[bool, str]:
-        """Arxivni konvertatsiya qilish"""
-        try:
-            # Oddiy fayl nusxalash (arxiv uchun)
-            shutil.copy(input_path, output_path)
-            return True, "Fayl nusxalandi (Arxiv konvertatsiyasi mavjud emas)"
-            
-        except Exception as e:
-            logger.error(f"Arxiv konvertatsiya xatosi: {e}")
-            return False, str(e)
+    FONT_NAME = 'DocumentSans'
     
-    @staticmethod
-    async def compress_file(input_path: str, output_path: str, settings: Dict) -> Tuple[bool, str]:
-        """Faylni siqish"""
-        try:
-            file_type = get_file_type(get_file_extension(input_path))
-            
-            # Rasmni siqish
-            if file_type == 'image' and Config.HAS_PIL:
-                from PIL import Image
-                
-                with Image.open(input_path) as img:
-                    quality = int(settings.get('compress_quality', 60))
-                    
-                    # O'lchamni kamaytirish
-                    new_width = img.width // 2
-                    new_height = img.height // 2
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    img.save(output_path, optimize=True, quality=quality)
-                
-                return True, f"Siqildi: {human_readable_size(os.path.getsize(input_path))} → {human_readable_size(os.path.getsize(output_path))}"
+    def __init__(self, output_path: str, font_path: Optional[str]):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+        
+        if font_path:
+            if self.FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(self.FONT_NAME, font_path))
+            self.font_name = self.FONT_NAME
+        else:
+            self.font_name = 'Helvetica'
+        self.unicode_font = font_path is not None
+        self.string_width = pdfmetrics.stringWidth
+        self._widths: Dict[str, float] = {}
+        
+        self.font_size = Config.PDF_FONT_SIZE
+        self.leading = self.font_size * 1.3
+        self.page_width, self.page_height = A4
+        self.max_width = self.page_width - 2 * Config.PDF_MARGIN
+        self.lines_per_page = max(1, int((self.page_height - 2 * Config.PDF_MARGIN) // self.leading))
+        self.space_width = self.width(' ')
+        
+        # Har bir sahifa showPage() da siqiladi - xotirada faqat siqilgan oqimlar qoladi
+        self.canvas = canvas.Canvas(output_path, pagesize=A4, pageCompression=1)
+        self.text = None
+        self.lines_on_page = 0
+        self.pages = 0
+    
+    def width(self, text: str) -> float:
+        # Matnda so'zlar ko'p takrorlanadi - kengliklar keshlanadi (hajmi cheklangan)
+        width = self._widths.get(text)
+        if width is None:
+            if len(self._widths) >= 50000:
+                self._widths.clear()
+            width = self._widths[text] = self.string_width(text, self.font_name, self.font_size)
+        return width
+    
+    def _emit(self, line: str):
+        if self.text is None:
+            self.text = self.canvas.beginText(Config.PDF_MARGIN, self.page_height - Config.PDF_MARGIN - self.font_size)
+            self.text.setFont(self.font_name, self.font_size, self.leading)
+            self.lines_on_page = 0
+        self.text.textLine(line)
+        self.lines_on_page += 1
+        if self.lines_on_page >= self.lines_per_page:
+            self.page_break()
+    
+    def page_break(self):
+        if self.text is not None:
+            self.canvas.drawText(self.text)
+            self.text = None
+        self.canvas.showPage()
+        self.pages += 1
+    
+    def wrap(self, paragraph: str):
+        """Qatorni sahifa kengligiga sig'adigan bo'laklarga ajratish (uzun so'zlar belgilab bo'linadi)"""
+        line, line_width = '', 0.0
+        for word in paragraph.split(' '):
+            word_width = self.width(word)
+            if line and line_width + self.space_width + word_width <= self.max_width:
+                line += ' ' + word
+                line_width += self.space_width + word_width
+                continue
+            if line:
+                yield line
+            if word_width <= self.max_width:
+                line, line_width = word, word_width
+                continue
+            line, line_width = '', 0.0
+            for char in word:
+                char_width = self.width(char)
+                if line and line_width + char_width > self.max_width:
+                    yield line
+                    line, line_width = '', 0.0
+                line += char
+                line_width += char_width
+        yield line
+    
+    def add_paragraph(self, paragraph: str):
+        if not self.unicode_font:
+            try:
+                paragraph.encode('cp1252')
+            except UnicodeEncodeError:
+                raise ValueError("Matnda lotin bo'lmagan belgilar bor, lekin Unicode shrift (DejaVuSans.ttf) topilmadi")
+        for line in self.wrap(paragraph):
+            self._emit(line)
+    
+    def close(self):
+        # Bo'sh fayl uchun ham bitta sahifa yaratiladi
+        if self.text is not None or self.pages == 0:
+            self.page_break()
+        self.canvas.save()
+
+# Tab dan boshqa boshqaruv belgilari shriftda yo'q, ular olib tashlanadi
+_CONTROL_CHARS = dict.fromkeys(i for i in range(32) if i not in (9, 12))
+
+def _text_to_pdf_sync(input_path: str, output_path: str) -> Tuple[bool, str]:
+    """TXT → PDF, fayl qatorma-qator o'qiladi (butun matn xotiraga yuklanmaydi)"""
+    encoding = detect_text_encoding(input_path)
+    total = os.path.getsize(input_path)
+    try:
+        renderer = TextPdfRenderer(output_path, find_pdf_font())
+        with open(input_path, 'rb') as raw:
+            reader = io.TextIOWrapper(raw, encoding=encoding, errors='replace', newline=None)
+            while True:
+                line = reader.readline(Config.TEXT_MAX_LINE_CHUNK)
+                if not line:
+                    break
+                line = line.rstrip('\n').expandtabs(4).translate(_CONTROL_CHARS)
+                # \f (form feed) - majburiy yangi sahifa
+                parts = line.split('\f')
+                for position, paragraph in enumerate(parts):
+                    if position:
+                        renderer.page_break()
+                    if paragraph or len(parts) == 1:
+                        renderer.add_paragraph(paragraph)
+                report_progress(raw.tell(), total, 'bytes')
+        renderer.close()
+    except Exception as e:
+        logger.error(f"Matn → PDF xatosi: {e}")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(output_path)
+        return False, str(e)
+    
+    report_progress(total, total, 'bytes')
+    return True, f"{renderer.pages} sahifa ({encoding})"
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def _docx_to_text_sync(input_path: str, output_path: str) -> Tuple[bool, str]:
+    """DOCX → TXT LibreOffice siz: document.xml iterparse bilan oqim ko'rinishida o'qiladi"""
+    paragraphs = 0
+    try:
+        with zipfile.ZipFile(input_path) as docx, \
+                docx.open('word/document.xml') as source, \
+                open(output_path, 'w', encoding='utf-8') as out:
+            parts: List[str] = []
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    continue
+                tag = elem.tag
+                if tag == _W + 't':
+                    parts.append(elem.text or '')
+                elif tag == _W + 'tab':
+                    parts.append('\t')
+                elif tag in (_W + 'br', _W + 'cr'):
+                    parts.append('\n')
+                elif tag == _W + 'p':
+                    out.write(''.join(parts) + '\n')
+                    parts.clear()
+                    # Qayta ishlangan paragraf xotirada qolmasligi uchun
+                    elem.clear()
+                    paragraphs += 1
+                    report_progress(paragraphs, None, 'lines')
+    except (KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(output_path)
+        return False, f"DOCX faylini o'qib bo'lmadi: {e}"
+    return True, f"{paragraphs} ta paragraf"
+
+def parse_page_range(spec: str, page_count: int) -> List[int]:
+    """'1-3,7,10-' ko'rinishidagi oraliqni 0 dan boshlanuvchi sahifa indekslariga aylantirish"""
+    spec = (spec or '').replace(' ', '').lower()
+    if spec in ('', 'all'):
+        return list(range(page_count))
+    
+    pages, seen = [], set()
+    for part in spec.split(','):
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        if not (start or end) or not (start or '1').isdigit() or not (end or '1').isdigit():
+            raise ValueError(f"Noto'g'ri sahifa oralig'i: {part}")
+        first = int(start) if start else 1
+        last = (int(end) if end else page_count) if sep else first
+        if first < 1 or (end and last < first):
+            raise ValueError(f"Noto'g'ri sahifa oralig'i: {part}")
+        for index in range(first - 1, min(last, page_count)):
+            if index not in seen:
+                seen.add(index)
+                pages.append(index)
+    if not pages:
+        raise ValueError(f"Tanlangan sahifalar hujjatda yo'q (jami {page_count} sahifa)")
+    return pages
+
+def _pdf_page_count(input_path: str) -> int:
+    fitz = import_pymupdf()
+    with fitz.open(input_path) as doc:
+        return doc.page_count
+
+def _render_pdf_pages(input_path: str, pages: List[int], dpi: int, target_format: str,
+                      output_dir: str, quality: int) -> List[str]:
+    """Berilgan sahifalarni rasmga chizish (har bir ishchi hujjatni o'zi ochadi)"""
+    from PIL import Image
+    fitz = import_pymupdf()
+    
+    paths = []
+    with fitz.open(input_path) as doc:
+        for done, index in enumerate(pages, 1):
+            pix = doc.load_page(index).get_pixmap(dpi=dpi, alpha=False)
+            page_path = os.path.join(output_dir, f"page_{index + 1:04d}.{target_format}")
+            if target_format == 'png':
+                pix.save(page_path)
+            else:
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                img.save(page_path, 'JPEG', quality=quality, optimize=True)
+                img.close()
+            pix = None
+            paths.append(page_path)
+            report_progress(done, len(pages), 'pages')
+    return paths
+
+def write_page_bundle(paths: List[str], output_path: str):
+    """Sahifa rasmlarini ZIP ga yozish (JPG/PNG allaqachon siqilgan, shuning uchun ZIP_STORED)"""
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as bundle:
+        for path in paths:
+            bundle.write(path, os.path.basename(path))
+
+def is_page_bundle(path: str, target_format: str) -> bool:
+    """Rasm formatidagi natija aslida ko'p sahifali ZIP to'plamimi"""
+    return target_format.lower() in FileTypes.IMAGES and zipfile.is_zipfile(path)
+
+def is_animated_image(path: str) -> bool:
+    """Natija bir nechta kadrli rasmmi (GIF/WebP animatsiya)"""
+    if not Config.HAS_PIL:
+        return False
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            return bool(getattr(img, 'is_animated', False))
+    except Exception:
+        return False
+
+# Allaqachon siqilgan formatlar ZIP ga qayta siqilmasdan (ZIP_STORED) yoziladi
+COMPRESSED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'webp', 'gif', 'mp3', 'ogg', 'm4a', 'mp4', 'avi', 'mov', 'mkv',
+    'zip', 'rar', '7z', 'docx', 'pdf',
+}
+
+def unique_entry_name(name: str, used: set) -> str:
+    """Arxiv ichida nomlar takrorlanmasligi uchun: 'rasm.jpg', 'rasm (2).jpg', ..."""
+    base, dot, ext = name.rpartition('.')
+    if not dot:
+        base, ext = name, ''
+    candidate = name
+    number = 2
+    while candidate.lower() in used:
+        candidate = f"{base} ({number}){dot}{ext}"
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+def write_batch_zip(entries: List[Tuple[str, str]], output_path: str) -> Tuple[bool, str]:
+    """(yo'l, nom) juftlarini bitta ZIP ga yozish (fayllar bo'laklab o'qiladi)"""
+    used = set()
+    with zipfile.ZipFile(output_path, 'w', allowZip64=True) as archive:
+        for index, (path, name) in enumerate(entries, 1):
+            arcname = unique_entry_name(archive_entry_name(name) or os.path.basename(path), used)
+            if get_file_extension(name) in COMPRESSED_EXTENSIONS:
+                archive.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                archive.write(path, arcname, compress_type=zipfile.ZIP_DEFLATED,
+                              compresslevel=Config.ARCHIVE_COMPRESS_LEVEL)
+            report_progress(index, len(entries), 'entries')
+    return True, f"{len(entries)} ta fayl"
+
+def _images_to_pdf_sync(image_paths: List[str], output_path: str) -> Tuple[bool, str]:
+    """Tayyor rasmlarni bitta ko'p sahifali PDF ga yig'ish (har rasm o'z o'lchamidagi sahifada).
+    
+    PyMuPDF JPEG va PNG ni (alfa kanali bilan) qayta kodlamasdan joylaydi va rasmlarni birma-bir o'qiydi.
+    """
+    from PIL import Image
+    
+    if Config.HAS_PYMUPDF:
+        pymupdf = import_pymupdf()
+        with pymupdf.open() as doc:
+            for index, path in enumerate(image_paths, 1):
+                with Image.open(path) as img:
+                    width, height = img.size
+                page = doc.new_page(width=width, height=height)
+                page.insert_image(page.rect, filename=path)
+                report_progress(index, len(image_paths), 'pages')
+            doc.save(output_path)
+    else:
+        with contextlib.ExitStack() as stack:
+            images = [flatten_for_format(stack.enter_context(Image.open(path)), 'PDF') for path in image_paths]
+            images[0].save(output_path, 'PDF', save_all=True, append_images=images[1:])
+    return True, f"{len(image_paths)} sahifali PDF"
+
+# Maqsadli hajmga faqat sifati sozlanadigan formatlarda erishish mumkin
+COMPRESS_LOSSY_FORMATS = {'JPEG', 'WEBP'}
+EXIF_ORIENTATION = 0x0112
+
+def compress_target_format(extension: str) -> str:
+    """Siqish natijasi formati: JPEG/WebP o'zgarmaydi, qolganlari JPEG ga o'tkaziladi"""
+    return extension if extension in ('jpg', 'jpeg', 'webp') else 'jpg'
+
+def metadata_options(source, save_format: str, strip: bool) -> Dict:
+    """Saqlash parametrlari: EXIF va ICC profil saqlanadi yoki butunlay olib tashlanadi"""
+    if strip or save_format not in ('JPEG', 'WEBP', 'PNG', 'TIFF'):
+        return {}
+    options = {}
+    for key in ('exif', 'icc_profile'):
+        if source.info.get(key):
+            options[key] = source.info[key]
+    return options
+
+def apply_orientation(img, orientation: int):
+    """EXIF yo'nalishini piksellarga qo'llash (metama'lumot olib tashlanganda rasm ag'darilib qolmasligi uchun)"""
+    from PIL import Image
+    
+    method = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+def _load_image_streamed(input_path: str, size: Tuple[int, int]):
+    """libvips orqali bo'lakma-bo'lak kichraytirib dekodlash va natijani Pillow rasmiga o'tkazish"""
+    import pyvips
+    from PIL import Image
+    
+    pyvips.cache_set_max(0)
+    pyvips.concurrency_set(1)
+    # Yo'nalish Pillow yo'li bilan bir xil - EXIF bo'yicha keyinroq qo'llanadi
+    image = pyvips.Image.thumbnail(input_path, size[0], height=size[1], size='force', no_rotate=True)
+    # CMYK (uchar bo'lsa ham), 16-bit va boshqa fazolar sRGB/kulrangga o'tkaziladi
+    if image.interpretation not in ('srgb', 'b-w'):
+        grey = image.bands < 3 or image.interpretation == 'grey16'
+        image = image.colourspace('b-w' if grey else 'srgb')
+    if image.format != 'uchar':
+        image = image.cast('uchar')
+    mode = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}[image.bands]
+    return Image.frombytes(mode, (image.width, image.height), image.write_to_memory())
+
+def fit_in_memory_budget(size: Tuple[int, int]) -> Tuple[int, int]:
+    """Bir necha marta kodlanadigan rasm o'lchamini byudjetga sig'dirish (asl nusxa + natija + bufer)"""
+    while size[0] * size[1] * 4 * 3 > Config.IMAGE_MEMORY_BUDGET and min(size) > Config.COMPRESS_MIN_SIDE:
+        size = (max(1, size[0] // 2), max(1, size[1] // 2))
+    return size
+
+def encode_image(img, save_format: str, quality: int, options: Dict) -> bytes:
+    """Rasmni xotiradagi buferga kodlash"""
+    buffer = io.BytesIO()
+    img.save(buffer, save_format, quality=quality, optimize=True, **options)
+    return buffer.getvalue()
+
+def compress_to_target(img, save_format: str, target_bytes: int, options: Dict):
+    """Maqsadli hajmga sig'adigan eng yuqori sifatni topish: (natija, sifat, rasm, urinishlar).
+    
+    Sifat bo'yicha ikkilik qidiruv eng yuqori sifatdan boshlanadi va natija maqsadga yetarlicha yaqin
+    bo'lishi bilan to'xtaydi. Eng past sifat ham sig'masa o'lcham hajmlar nisbatiga qarab kichraytiriladi.
+    """
+    from PIL import Image
+    
+    passes = 0
+    for _ in range(Config.COMPRESS_MAX_ROUNDS):
+        low, high = Config.COMPRESS_MIN_QUALITY, Config.COMPRESS_MAX_QUALITY
+        quality = high
+        best = None
+        smallest = None
+        while low <= high:
+            data = encode_image(img, save_format, quality, options)
+            passes += 1
+            report_progress(passes, None, 'passes')
+            if len(data) <= target_bytes:
+                best = (data, quality)
+                if len(data) >= target_bytes * Config.COMPRESS_TARGET_TOLERANCE:
+                    break
+                low = quality + 1
+            else:
+                smallest = len(data)
+                high = quality - 1
+            quality = (low + high) // 2
+        
+        if best is not None:
+            return best[0], best[1], img, passes
+        
+        # Hajm taxminan piksellar soniga proporsional
+        factor = min(0.9, (target_bytes * Config.COMPRESS_TARGET_TOLERANCE / smallest) ** 0.5)
+        size = (int(img.width * factor), int(img.height * factor))
+        if min(size) < Config.COMPRESS_MIN_SIDE:
+            break
+        img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=Config.IMAGE_REDUCING_GAP)
+    
+    raise ValueError(f"Rasmni {human_readable_size(target_bytes)} ga sig'dirib bo'lmadi")
+
+def _compress_image_sync(input_path: str, output_path: str, settings: Dict) -> Tuple[bool, str]:
+    """Rasmni siqish (ishchi jarayonda)
+    
+    compress_target (MB) berilsa natija shu hajmga sig'diriladi, aks holda compress_quality bilan bir marta saqlanadi.
+    """
+    try:
+        from PIL import Image
+        
+        save_format = pil_format(get_file_extension(output_path))
+        quality = int(settings.get('compress_quality', 60))
+        strip = str(settings.get('strip_metadata', '1')) == '1'
+        target_bytes = 0
+        if save_format in COMPRESS_LOSSY_FORMATS:
+            target_bytes = int(float(settings.get('compress_target', 0)) * 1024 * 1024)
+        input_size = os.path.getsize(input_path)
+        
+        with Image.open(input_path) as source:
+            # O'lchamni kamaytirish (sozlamadagi foiz bo'yicha)
+            resize_percent = int(settings.get('resize_percent', 100))
+            requested = scaled_size(source.size, resize_percent)
+            
+            # Asl fayl allaqachon sig'sa qayta kodlash faqat sifatni yo'qotadi
+            if (target_bytes and input_size <= target_bytes and not strip and requested == source.size
+                    and source.format == save_format):
+                shutil.copyfile(input_path, output_path)
+                return True, f"Fayl allaqachon {human_readable_size(target_bytes)} dan kichik - o'zgartirilmadi"
+            
+            options = metadata_options(source, save_format, strip)
+            orientation = source.getexif().get(EXIF_ORIENTATION, 1) if strip else 1
+            size, streamed = plan_image_decode(source, requested, save_format)
+            
+            if streamed and target_bytes:
+                # Bir necha marta kodlash uchun rasm xotirada bo'lishi kerak
+                size = fit_in_memory_budget(size)
+                img = _load_image_streamed(input_path, size)
+                streamed = False
+            elif not streamed:
+                img = load_scaled(source, size)
+            
+            if not streamed:
+                img = apply_orientation(flatten_for_format(img, save_format), orientation)
+                if target_bytes:
+                    data, quality, img, passes = compress_to_target(img, save_format, target_bytes, options)
+                    with open(output_path, 'wb') as f:
+                        f.write(data)
+                else:
+                    report_progress(1, 2, 'steps')
+                    img.save(output_path, save_format, optimize=True, quality=quality, **options)
+        
+        if streamed:
+            _save_image_streamed(input_path, output_path, size, save_format, quality, strip=strip)
+        
+        message = f"Siqildi: {human_readable_size(input_size)} → {human_readable_size(os.path.getsize(output_path))}"
+        if target_bytes:
+            message += f" (sifat {quality}%, {img.width}×{img.height}, {passes} ta urinish)"
+        else:
+            report_progress(2, 2, 'steps')
+        return True, message
+        
+    except Exception as e:
+        logger.error(f"Siqish xatosi: {e}")
+        return False, str(e)
+
+# ==================== FFMPEG ====================
+async def probe_media(input_path: str) -> Dict:
+    """ffprobe orqali fayl oqimlari va davomiyligini aniqlash"""
+    if not Config.HAS_FFPROBE:
+        return {}
+    process = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', input_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL, stdin=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), Config.FFPROBE_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        process.kill()
+        await process.wait()
+        raise
+    try:
+        return json.loads(stdout or b'{}')
+    except ValueError:
+        return {}
+
+def media_duration(probe: Dict) -> Optional[float]:
+    """ffprobe natijasidan davomiylikni (soniya) olish"""
+    try:
+        return float(probe.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        return None
+
+async def run_ffmpeg(args: List[str], duration: Optional[float] = None,
+                     progress: Optional[Callable] = None, timeout: float = None,
+                     stdin_feeder: Optional[Callable[[asyncio.StreamWriter], Awaitable]] = None) -> Tuple[bool, str]:
+    """FFmpeg ni asinxron ishga tushirish, -progress chiqishini o'qib jarayonni xabar qilish"""
+    command = ['ffmpeg', '-hide_banner', '-nostats', '-y', '-progress', 'pipe:1']
+    if stdin_feeder is None:
+        command.append('-nostdin')
+    command += args
+    
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE if stdin_feeder else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr_tail = deque(maxlen=Config.FFMPEG_STDERR_LINES)
+    
+    async def read_progress():
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            # out_time_us va out_time_ms ikkalasi ham mikrosoniyada
+            if key in ('out_time_us', 'out_time_ms') and progress and value.isdigit():
+                seconds = int(value) / 1_000_000
+                progress(min(seconds, duration) if duration else seconds, duration, 'seconds')
+    
+    async def read_stderr():
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                break
+            stderr_tail.append(line.decode(errors='replace').rstrip())
+    
+    async def feed_stdin():
+        try:
+            await stdin_feeder(process.stdin)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+    
+    tasks = [read_progress(), read_stderr()]
+    if stdin_feeder:
+        tasks.append(feed_stdin())
+    
+    gathered = asyncio.gather(*tasks, process.wait())
+    # Bekor qilingan gather xatosi "never retrieved" deb log qilinmasin
+    gathered.add_done_callback(lambda f: f.cancelled() or f.exception())
+    sampler = MemorySampler(process.pid)
+    try:
+        with sampler:
+            await asyncio.wait_for(gathered, timeout or Config.FFMPEG_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return False, "FFmpeg vaqt chegarasidan oshdi"
+    except BaseException:
+        # Bekor qilinganda (yoki boshqa xatoda) jarayon osilib qolmasligi kerak
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    
+    record_memory_peak(sampler.peak)
+    if process.returncode != 0:
+        error = stderr_tail[-1] if stderr_tail else f"kod {process.returncode}"
+        logger.error(f"FFmpeg xatosi: {' | '.join(stderr_tail)}")
+        return False, f"FFmpeg xatosi: {error}"
+    return True, "Muvaffaqiyatli"
+
+class AudioEngine:
+    """FFmpeg asosidagi audio konvertatsiya"""
+    
+    CODECS = {
+        'mp3': ['-c:a', 'libmp3lame'],
+        'wav': ['-c:a', 'pcm_s16le'],
+        'ogg': ['-c:a', 'libvorbis'],
+        'm4a': ['-c:a', 'aac', '-movflags', '+faststart'],
+    }
+    # Bitreyt qo'llanmaydigan (siqilmagan) formatlar
+    LOSSLESS = {'wav'}
+    
+    @staticmethod
+    def vorbis_quality(bitrate: str) -> int:
+        """Bitreytni (masalan '192k') libvorbis -q:a shkalasiga (0-10) taxminiy o'girish"""
+        try:
+            kbps = int(bitrate.lower().rstrip('k'))
+        except ValueError:
+            return 5
+        return max(0, min(10, round(kbps / 32)))
+    
+    @classmethod
+    async def convert(cls, input_path: str, output_path: str, target_format: str, settings: Dict,
+                      progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        if not Config.HAS_FFMPEG:
+            return False, "FFmpeg topilmadi"
+        
+        target_format = target_format.lower()
+        if target_format not in cls.CODECS:
+            return False, f"{target_format.upper()} audio formati qo'llab-quvvatlanmaydi"
+        
+        duration = media_duration(await probe_media(input_path))
+        bitrate = str(settings.get('audio_bitrate', '192k'))
+        sample_rate = str(settings.get('audio_sample_rate', '44100'))
+        
+        args = ['-i', input_path, '-vn', '-threads', str(Config.FFMPEG_THREADS)]
+        args += cls.CODECS[target_format]
+        if target_format == 'ogg':
+            # libvorbis past namuna chastotalarida qat'iy bitreytni rad etadi, VBR sifatiga o'giramiz
+            args += ['-q:a', str(cls.vorbis_quality(bitrate))]
+        elif target_format not in cls.LOSSLESS:
+            args += ['-b:a', bitrate]
+        args += ['-ar', sample_rate, '-f', 'ipod' if target_format == 'm4a' else target_format, output_path]
+        
+        return await run_ffmpeg(args, duration=duration, progress=progress)
+
+class VideoEngine:
+    """FFmpeg asosidagi video konvertatsiya: remux, x264 kodlash va GIF"""
+    
+    # MP4 ichiga qayta kodlashsiz (-c copy) joylash mumkin bo'lgan kodeklar
+    REMUX_VIDEO_CODECS = {'h264'}
+    REMUX_AUDIO_CODECS = {'aac'}
+    REMUX_CONTAINERS = {'mkv', 'mov', 'mp4'}
+    
+    @staticmethod
+    def streams(probe: Dict, codec_type: str) -> List[Dict]:
+        return [s for s in probe.get('streams', []) if s.get('codec_type') == codec_type]
+    
+    @classmethod
+    def can_remux(cls, probe: Dict, source_format: str, target_format: str) -> bool:
+        """Faqat konteyner o'zgaradimi (H.264/AAC -> MP4)"""
+        if target_format != 'mp4' or source_format not in cls.REMUX_CONTAINERS:
+            return False
+        video = cls.streams(probe, 'video')
+        audio = cls.streams(probe, 'audio')
+        if not video or video[0].get('codec_name') not in cls.REMUX_VIDEO_CODECS:
+            return False
+        return not audio or audio[0].get('codec_name') in cls.REMUX_AUDIO_CODECS
+    
+    @classmethod
+    async def convert(cls, input_path: str, output_path: str, target_format: str, settings: Dict,
+                      progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        if not Config.HAS_FFMPEG:
+            return False, "FFmpeg topilmadi"
+        
+        target_format = target_format.lower()
+        probe = await probe_media(input_path)
+        duration = media_duration(probe)
+        
+        if target_format == 'gif':
+            return await cls.to_gif(input_path, output_path, duration, progress)
+        if target_format != 'mp4':
+            return False, f"{target_format.upper()} video formati qo'llab-quvvatlanmaydi"
+        
+        if cls.can_remux(probe, get_file_extension(input_path), target_format):
+            success, message = await run_ffmpeg(
+                ['-i', input_path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                 '-movflags', '+faststart', '-f', 'mp4', output_path],
+                duration=duration, progress=progress
+            )
+            if success:
+                return True, "Qayta kodlashsiz o'tkazildi (remux)"
+            logger.warning(f"Remux muvaffaqiyatsiz, qayta kodlanadi: {message}")
+        
+        return await cls.encode_mp4(input_path, output_path, settings, duration, progress)
+    
+    @staticmethod
+    async def encode_mp4(input_path: str, output_path: str, settings: Dict, duration: Optional[float],
+                         progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """libx264 + AAC, ishlatiladigan oqimlar soni Config.FFMPEG_THREADS bilan cheklangan"""
+        args = [
+            '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?',
+            '-c:v', 'libx264', '-preset', Config.VIDEO_PRESET, '-crf', str(Config.VIDEO_CRF),
+            # yuv420p va juft o'lchamlar - ko'pchilik pleyerlar faqat shuni o'ynaydi
+            '-pix_fmt', 'yuv420p', '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+            '-c:a', 'aac', '-b:a', str(settings.get('audio_bitrate', '192k')),
+            '-threads', str(Config.FFMPEG_THREADS), '-filter_threads', str(Config.FFMPEG_THREADS),
+            '-movflags', '+faststart', '-f', 'mp4', output_path
+        ]
+        return await run_ffmpeg(args, duration=duration, progress=progress)
+    
+    @staticmethod
+    async def to_gif(input_path: str, output_path: str, duration: Optional[float],
+                     progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Ikki bosqichli GIF: avval palitra (palettegen), keyin shu palitra bilan kodlash (paletteuse)"""
+        if duration:
+            duration = min(duration, Config.GIF_MAX_SECONDS)
+        filters = f"fps={Config.GIF_FPS},scale='min({Config.GIF_MAX_WIDTH},iw)':-2:flags=lanczos"
+        limit = ['-t', str(Config.GIF_MAX_SECONDS)]
+        palette_path = f"{output_path}.palette.png"
+        
+        def stage(offset: float):
+            # Ikkala bosqich bitta umumiy shkalada ko'rsatiladi
+            if not progress:
+                return None
+            total = duration * 2 if duration else None
+            return lambda done, _total, unit: progress(offset + done, total, unit)
+        
+        try:
+            success, message = await run_ffmpeg(
+                limit + ['-i', input_path, '-vf', f"{filters},palettegen=stats_mode=diff",
+                         '-threads', str(Config.FFMPEG_THREADS), palette_path],
+                duration=duration, progress=stage(0)
+            )
+            if not success:
+                return False, message
+            
+            return await run_ffmpeg(
+                limit + ['-i', input_path, '-i', palette_path,
+                         '-lavfi', f"{filters}[v];[v][1:v]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle",
+                         '-threads', str(Config.FFMPEG_THREADS), '-f', 'gif', output_path],
+                duration=duration, progress=stage(duration or 0)
+            )
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(palette_path)
+
+def _animation_stream_info(input_path: str) -> Tuple[Tuple[int, int], List[int]]:
+    """Ishchi jarayonda: xotira byudjeti tekshiruvi va kadr vaqtlari (kadrlar saqlanmaydi)"""
+    from PIL import Image
+    
+    with Image.open(input_path) as img:
+        check_animation_budget(img)
+        return img.size, animation_durations(img)
+
+def open_fifo_writer(path: str):
+    """FIFO ni yozish uchun ochish: FFmpeg o'qishni boshlaguncha kutadi, FIFO o'chirilsa None"""
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            # ENXIO - o'quvchi hali ochmagan
+            if e.errno != errno.ENXIO:
+                raise
+            time.sleep(0.05)
+            continue
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, 'wb')
+
+def _write_animation_frames(input_path: str, fifo_path: str, durations: List[int], fps: Fraction) -> int:
+    """Ishchi jarayonda: kadrlarni birma-bir dekodlab FFmpeg o'qiyotgan FIFO ga yozish.
+    
+    FFmpeg to'xtatilsa (bekor qilish, vaqt chegarasi, xato) yozish BrokenPipe bilan darhol tugaydi.
+    """
+    from PIL import Image
+    
+    written = 0
+    try:
+        with Image.open(input_path) as img:
+            pipe = open_fifo_writer(fifo_path)
+            if pipe is None:
+                return written
+            with pipe:
+                for data in iter_animation_frames(img, durations, fps):
+                    pipe.write(data)
+                    written += 1
+    except BrokenPipeError:
+        # FFmpeg chiqib ketdi - natija va sababi FFmpeg tomonida
+        pass
+    return written
+
+class AnimationEngine:
+    """Animatsiyali rasm → MP4: kadrlar ishchi jarayonda Pillow da birma-bir dekodlanib FIFO orqali FFmpeg ga uzatiladi.
+    
+    FFmpeg animatsiyali WebP ni o'qiy olmaydi, GIF uchun ham kadr vaqtlari shu yo'l bilan aniq saqlanadi.
+    FFmpeg boshqa dvigatellardagi kabi hodisalar siklida ishlaydi, shuning uchun vazifa bekor qilinsa u o'ldiriladi.
+    """
+    
+    @staticmethod
+    async def to_mp4(input_path: str, output_path: str, progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        if not Config.HAS_FFMPEG:
+            return False, "FFmpeg topilmadi"
+        # Byudjet kadrlar dekodlanishidan oldin, ishchi jarayonda tekshiriladi
+        (width, height), durations = await executor.run_cpu(_animation_stream_info, input_path)
+        fps = animation_frame_rate(durations)
+        
+        fifo_dir = tempfile.mkdtemp(prefix='anim_', dir=Config.TEMP_FOLDER)
+        fifo_path = os.path.join(fifo_dir, 'frames.rgb')
+        os.mkfifo(fifo_path)
+        args = [
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}",
+            '-framerate', f"{fps.numerator}/{fps.denominator}", '-i', fifo_path,
+            '-c:v', 'libx264', '-preset', Config.VIDEO_PRESET, '-crf', str(Config.VIDEO_CRF),
+            '-pix_fmt', 'yuv420p', '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+            '-threads', str(Config.FFMPEG_THREADS), '-filter_threads', str(Config.FFMPEG_THREADS),
+            '-an', '-movflags', '+faststart', '-f', 'mp4', output_path
+        ]
+        encoder = asyncio.ensure_future(run_ffmpeg(args, sum(durations) / 1000, progress))
+        # FFmpeg FIFO ni ochmasdan chiqsa, kutayotgan yozuvchi FIFO yo'qolganini ko'rib to'xtaydi
+        encoder.add_done_callback(lambda _: remove_path(fifo_dir))
+        try:
+            await executor.run_cpu(_write_animation_frames, input_path, fifo_path, durations, fps)
+            success, message = await encoder
+        finally:
+            if not encoder.done():
+                encoder.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await encoder
+            remove_path(fifo_dir)
+        if not success:
+            return False, message
+        return True, f"Muvaffaqiyatli ({len(durations)} kadr, {sum(durations) / 1000:.1f} s)"
+
+# ==================== ARXIVLAR ====================
+class ArchiveLimitError(Exception):
+    """Arxiv xavfsizlik chegaralaridan oshdi (zip-bomba himoyasi)"""
+
+class _ReaderStopped(Exception):
+    """Yozuvchi to'xtagani uchun o'quvchi oqim ham to'xtatiladi"""
+
+def archive_entry_name(name: str) -> str:
+    """Yozuv nomini tozalash: absolyut yo'l va '..' qismlarisiz"""
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    return '/'.join(parts)
+
+def zip_date_time(mtime: Optional[float]) -> Tuple[int, ...]:
+    """ZIP 1980-yildan oldingi sanalarni saqlay olmaydi"""
+    if not mtime:
+        mtime = time.time()
+    return max(time.localtime(mtime)[:6], (1980, 1, 1, 0, 0, 0))
+
+class _DeflateEntry:
+    """Bitta yozuvni alohida oqimda siqish: bo'laklar navbatdan olinadi, natija vaqtinchalik faylga"""
+    
+    def __init__(self, name: str, mtime: Optional[float], stop: threading.Event):
+        self.info = zipfile.ZipInfo(name, date_time=zip_date_time(mtime))
+        self.info.compress_type = zipfile.ZIP_DEFLATED
+        self.chunks = queue.Queue(maxsize=Config.ARCHIVE_QUEUE_CHUNKS)
+        self.stop = stop
+        self.data = None
+    
+    def feed(self, chunk: Optional[bytes]):
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise _ReaderStopped()
+    
+    def run(self) -> '_DeflateEntry':
+        compressor = zlib.compressobj(Config.ARCHIVE_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        self.data = tempfile.SpooledTemporaryFile(max_size=Config.ARCHIVE_SPOOL_SIZE, dir=Config.TEMP_FOLDER)
+        crc = size = 0
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=0.5)
+            except queue.Empty:
+                if self.stop.is_set():
+                    raise _ReaderStopped()
+                continue
+            if chunk is None:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            self.data.write(compressor.compress(chunk))
+        self.data.write(compressor.flush())
+        self.info.CRC = crc
+        self.info.file_size = size
+        self.info.compress_size = self.data.tell()
+        self.data.seek(0)
+        return self
+    
+    def discard(self):
+        if self.data:
+            self.data.close()
+            self.data = None
+
+class _ZipArchiveWriter:
+    """Yozuvlarni bir nechta oqimda parallel siqib, ZIP ga asl tartibda yozish.
+    
+    Har bir yozuv o'z siquvchisiga oqim ko'rinishida beriladi; tayyor natijalar
+    yagona yozuvchi tomonidan ketma-ket qo'shiladi, kutilayotganlar soni cheklangan.
+    """
+    
+    def __init__(self, output_path: str):
+        self.zip = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED,
+                                   compresslevel=Config.ARCHIVE_COMPRESS_LEVEL, allowZip64=True)
+        self.stop = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=Config.ARCHIVE_COMPRESS_THREADS,
+                                       thread_name_prefix="archive-deflate")
+        self.pending: deque = deque()
+        self.current: Optional[_DeflateEntry] = None
+    
+    def begin(self, name: str, is_dir: bool, mtime: Optional[float]):
+        self.end()
+        while len(self.pending) >= Config.ARCHIVE_COMPRESS_THREADS * 2:
+            self._write_next()
+        if is_dir:
+            done = Future()
+            done.set_result(zipfile.ZipInfo(name + '/', date_time=zip_date_time(mtime)))
+            self.pending.append(done)
+            return
+        self.current = _DeflateEntry(name, mtime, self.stop)
+        self.pending.append(self.pool.submit(self.current.run))
+    
+    def write(self, chunk: bytes):
+        self.current.feed(chunk)
+    
+    def end(self):
+        if self.current:
+            self.current.feed(None)
+            self.current = None
+    
+    def _write_next(self):
+        result = self.pending.popleft().result()
+        if isinstance(result, zipfile.ZipInfo):
+            self.zip.writestr(result, b'')
+            return
+        try:
+            self._write_compressed(result.info, result.data)
+        finally:
+            result.discard()
+    
+    def _write_compressed(self, info: zipfile.ZipInfo, data):
+        """Oldindan siqilgan ma'lumotni qayta siqmasdan qo'shish (ZipFile.write bilan bir xil tartib)"""
+        zf = self.zip
+        zip64 = info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT
+        with zf._lock:
+            zf._writecheck(info)
+            zf._didModify = True
+            zf.fp.seek(zf.start_dir)
+            info.header_offset = zf.fp.tell()
+            zf.fp.write(info.FileHeader(zip64))
+            shutil.copyfileobj(data, zf.fp, Config.STREAM_CHUNK_SIZE)
+            zf.filelist.append(info)
+            zf.NameToInfo[info.filename] = info
+            zf.start_dir = zf.fp.tell()
+    
+    def finish(self):
+        self.end()
+        while self.pending:
+            self._write_next()
+    
+    def close(self):
+        self.stop.set()
+        self.current = None
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for future in self.pending:
+            if not future.cancelled() and future.exception() is None:
+                result = future.result()
+                if isinstance(result, _DeflateEntry):
+                    result.discard()
+        self.pending.clear()
+        self.zip.close()
+
+class _RarArchiveWriter:
+    """RAR yaratish faqat rasmiy `rar` dasturi orqali: yozuvlar vaqtinchalik papkaga
+    yig'iladi va oxirida bitta `rar a` chaqiruvi bilan qo'shiladi (har yozuvda arxiv qayta yozilmaydi)"""
+    
+    def __init__(self, output_path: str):
+        self.output_path = os.path.abspath(output_path)
+        self.staging = tempfile.mkdtemp(prefix='rar_', dir=Config.TEMP_FOLDER)
+        self.handle = None
+        self.entry = None
+    
+    def begin(self, name: str, is_dir: bool, mtime: Optional[float]):
+        self.end()
+        path = os.path.join(self.staging, *name.split('/'))
+        if is_dir:
+            os.makedirs(path, exist_ok=True)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.handle = open(path, 'wb')
+        self.entry = (path, mtime)
+    
+    def write(self, chunk: bytes):
+        self.handle.write(chunk)
+    
+    def end(self):
+        if not self.handle:
+            return
+        self.handle.close()
+        self.handle = None
+        path, mtime = self.entry
+        if mtime:
+            os.utime(path, (mtime, mtime))
+    
+    def finish(self):
+        self.end()
+        result = subprocess.run(
+            ['rar', 'a', '-idq', '-o+', '-r', self.output_path, '*'],
+            cwd=self.staging, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"rar xatosi: {result.stderr.decode(errors='replace').strip() or result.returncode}")
+    
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+class ArchiveTranscoder:
+    """Arxivni diskka ochmasdan, yozuvma-yozuv oqim ko'rinishida boshqa formatga o'tkazish.
+    
+    O'quvchi alohida oqimda yozuvlarni ochadi, yozuvchi esa ularni siquvchi oqimlarga
+    tarqatadi; orada cheklangan navbatlar turadi, shuning uchun xotira bir necha bo'lak bilan chegaralangan.
+    """
+    
+    _END = object()
+    WRITERS = {'zip': _ZipArchiveWriter, 'rar': _RarArchiveWriter}
+    
+    def __init__(self, input_path: str, output_path: str, target_format: str):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.source_format = get_file_extension(input_path)
+        self.target_format = target_format.lower()
+        self.input_size = os.path.getsize(input_path)
+        self.chunks = queue.Queue(maxsize=Config.ARCHIVE_QUEUE_CHUNKS)
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.total_entries: Optional[int] = None
+        self.entries = 0
+        self.total_bytes = 0
+    
+    def byte_limit(self) -> int:
+        ratio_limit = max(self.input_size * Config.ARCHIVE_MAX_RATIO, Config.ARCHIVE_RATIO_MIN_BYTES)
+        return min(Config.ARCHIVE_MAX_TOTAL_SIZE, ratio_limit)
+    
+    def check_declared(self, entries: int, total_bytes: int):
+        """Sarlavhadagi qiymatlar bo'yicha oldindan tekshirish (haqiqiy baytlar baribir sanaladi)"""
+        if entries > Config.ARCHIVE_MAX_ENTRIES:
+            raise ArchiveLimitError(f"Arxivda juda ko'p yozuv: {entries} (chegara {Config.ARCHIVE_MAX_ENTRIES})")
+        if total_bytes > self.byte_limit():
+            raise ArchiveLimitError(f"Arxiv ochilganda juda katta: {human_readable_size(total_bytes)}")
+        self.total_entries = entries
+    
+    # --- O'quvchilar (alohida oqimda ishlaydi) ---
+    def _put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise _ReaderStopped()
+    
+    def _read_zip(self):
+        with zipfile.ZipFile(self.input_path) as archive:
+            infos = archive.infolist()
+            self.check_declared(len(infos), sum(info.file_size for info in infos))
+            for info in infos:
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                self._put(('entry', info.filename, info.is_dir(), mtime))
+                if info.is_dir():
+                    continue
+                with archive.open(info) as source:
+                    while chunk := source.read(Config.STREAM_CHUNK_SIZE):
+                        self._put(('data', chunk))
+    
+    def _read_libarchive(self):
+        import libarchive
+        with libarchive.file_reader(self.input_path) as archive:
+            for entry in archive:
+                # Simlink va maxsus fayllar o'tkazib yuboriladi
+                if not (entry.isdir or entry.isfile):
+                    continue
+                self._put(('entry', entry.pathname, entry.isdir, entry.mtime))
+                if entry.isfile:
+                    for block in entry.get_blocks(Config.STREAM_CHUNK_SIZE):
+                        self._put(('data', block))
+    
+    def _read_py7zr(self):
+        import py7zr
+        from py7zr.io import Py7zIO, WriterFactory
+        put = self._put
+        
+        class Sink(Py7zIO):
+            def __init__(self):
+                self.length = 0
+            def write(self, data) -> int:
+                put(('data', bytes(data)))
+                self.length += len(data)
+                return len(data)
+            def read(self, size=None) -> bytes:
+                return b''
+            def seek(self, offset, whence=0) -> int:
+                return self.length
+            def flush(self):
+                pass
+            def size(self) -> int:
+                return self.length
+        
+        with open(self.input_path, 'rb') as fp:
+            # Fayl obyekti berilganda py7zr yozuvlarni ketma-ket (bitta oqimda) ochadi
+            with py7zr.SevenZipFile(fp) as archive:
+                infos = {info.filename: info for info in archive.list()}
+                self.check_declared(len(infos), sum(info.uncompressed or 0 for info in infos.values()))
+                for info in infos.values():
+                    if info.is_directory:
+                        put(('entry', info.filename, True, info.creationtime.timestamp() if info.creationtime else None))
+                
+                class Factory(WriterFactory):
+                    def create(self, filename: str) -> Py7zIO:
+                        info = infos.get(filename)
+                        created = info.creationtime if info else None
+                        put(('entry', filename, False, created.timestamp() if created else None))
+                        return Sink()
+                
+                archive.extract(factory=Factory())
+    
+    def reader(self) -> Callable:
+        if self.source_format == 'zip':
+            return self._read_zip
+        if Config.HAS_LIBARCHIVE:
+            return self._read_libarchive
+        if self.source_format == '7z' and Config.HAS_PY7ZR:
+            return self._read_py7zr
+        raise RuntimeError(f"{self.source_format.upper()} arxivini o'qish uchun libarchive kerak")
+    
+    def _produce(self, read: Callable):
+        try:
+            read()
+        except _ReaderStopped:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            with contextlib.suppress(_ReaderStopped):
+                self._put(self._END)
+    
+    # --- Yozuvchi (chaqiruvchi oqimda) ---
+    def run(self) -> Tuple[bool, str]:
+        writer_class = self.WRITERS.get(self.target_format)
+        if writer_class is None:
+            return False, f"{self.target_format.upper()} arxiv formati qo'llab-quvvatlanmaydi"
+        if self.target_format == 'rar' and not Config.HAS_RAR:
+            return False, "RAR yaratish uchun `rar` dasturi o'rnatilmagan"
+        
+        read = self.reader()
+        producer = threading.Thread(target=self._produce, args=(read,), name="archive-reader", daemon=True)
+        producer.start()
+        writer = writer_class(self.output_path)
+        completed = False
+        skipping = False
+        limit = self.byte_limit()
+        try:
+            while True:
+                item = self.chunks.get()
+                if item is self._END:
+                    break
+                if item[0] == 'entry':
+                    _, name, is_dir, mtime = item
+                    self.entries += 1
+                    if self.entries > Config.ARCHIVE_MAX_ENTRIES:
+                        raise ArchiveLimitError(f"Arxivda juda ko'p yozuv (chegara {Config.ARCHIVE_MAX_ENTRIES})")
+                    name = archive_entry_name(name)
+                    # Nomi bo'sh qolgan yozuv (masalan '../') ma'lumoti tashlab yuboriladi
+                    skipping = not name
+                    if skipping:
+                        writer.end()
+                    else:
+                        writer.begin(name, is_dir, mtime)
+                    report_progress(self.entries, self.total_entries, 'entries')
+                else:
+                    self.total_bytes += len(item[1])
+                    if self.total_bytes > limit:
+                        raise ArchiveLimitError(
+                            f"Arxiv ochilganda chegaradan oshdi ({human_readable_size(limit)}) - zip-bomba bo'lishi mumkin"
+                        )
+                    if not skipping:
+                        writer.write(item[1])
+            if self.error:
+                raise self.error
+            writer.finish()
+            completed = True
+        finally:
+            self.stop.set()
+            writer.close()
+            producer.join()
+            if not completed:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.output_path)
+        
+        return True, f"{self.entries} ta yozuv o'tkazildi ({human_readable_size(self.total_bytes)})"
+
+def transcode_archive(input_path: str, output_path: str, target_format: str) -> Tuple[bool, str]:
+    """Jarayonlar pulida ishlaydigan kirish nuqtasi"""
+    try:
+        return ArchiveTranscoder(input_path, output_path, target_format).run()
+    except (ArchiveLimitError, zipfile.BadZipFile) as e:
+        logger.warning(f"Arxiv rad etildi: {e}")
+        return False, str(e)
+
+# ==================== PDF SAHIFALARI ====================
+class PdfRasterizer:
+    """PDF sahifalarini jarayonlar pulida parallel ravishda rasmga aylantirish"""
+    
+    @staticmethod
+    async def convert(input_path: str, output_path: str, target_format: str, settings: Dict,
+                      progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        if not (Config.HAS_PYMUPDF and Config.HAS_PIL):
+            return False, "PyMuPDF kutubxonasi kerak"
+        
+        target_format = target_format.lower()
+        page_count = await executor.run_cpu(_pdf_page_count, input_path)
+        try:
+            pages = parse_page_range(settings.get('pdf_pages', ''), page_count)
+        except ValueError as e:
+            return False, str(e)
+        truncated = len(pages) > Config.PDF_MAX_PAGES
+        pages = pages[:Config.PDF_MAX_PAGES]
+        
+        dpi = min(max(int(settings.get('pdf_dpi', Config.PDF_DPI)), 36), Config.PDF_MAX_DPI)
+        quality = int(settings.get('image_quality', 85))
+        
+        # Har bir ishchiga ketma-ket sahifalar bo'lagi (hujjat bo'lak boshida bir marta ochiladi)
+        chunk_size = -(-len(pages) // executor.process_workers)
+        chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+        done = [0] * len(chunks)
+        
+        def chunk_progress(position: int) -> Optional[Callable]:
+            if progress is None:
+                return None
+            def update(count, _total, _unit):
+                done[position] = count
+                progress(sum(done), len(pages), 'pages')
+            return update
+        
+        work_dir = tempfile.mkdtemp(prefix='pdf_', dir=Config.TEMP_FOLDER)
+        try:
+            results = await asyncio.gather(*(
+                executor.run_cpu(_render_pdf_pages, input_path, chunk, dpi, target_format, work_dir, quality,
+                                 progress=chunk_progress(position))
+                for position, chunk in enumerate(chunks)
+            ))
+            paths = [path for chunk_paths in results for path in chunk_paths]
+            
+            if len(paths) == 1:
+                await executor.run_io(shutil.move, paths[0], output_path)
+            else:
+                await executor.run_io(write_page_bundle, paths, output_path)
+        finally:
+            await executor.run_io(shutil.rmtree, work_dir, True)
+        
+        message = f"{len(pages)} ta sahifa, {dpi} DPI"
+        if truncated:
+            message += f" (faqat birinchi {Config.PDF_MAX_PAGES} ta sahifa)"
+        return True, message
+
+# ==================== OFIS HUJJATLARI ====================
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def run_office_command(args: List[str], timeout: float) -> Tuple[int, str]:
+    """LibreOffice buyrug'ini bajarish; vaqt tugasa butun jarayonlar guruhi o'ldiriladi"""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+        raise
+    return process.returncode, stderr.decode(errors='replace').strip()
+
+class OfficeInstance:
+    """unoserver orqali boshqariladigan bitta uzoq yashaydigan headless LibreOffice"""
+    
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.port: Optional[int] = None
+        self.jobs = 0
+        # Har bir nusxaga alohida profil - aks holda soffice nusxalari bir-birini bloklaydi
+        self.profile_dir = os.path.abspath(os.path.join(Config.TEMP_FOLDER, f"office_{os.getpid()}_{index}"))
+    
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+    
+    async def start(self):
+        self.port = _free_port()
+        self.process = await asyncio.create_subprocess_exec(
+            *Config.UNOSERVER_COMMAND, '--interface', '127.0.0.1', '--port', str(self.port),
+            '--uno-interface', '127.0.0.1', '--uno-port', str(_free_port()),
+            '--executable', office_binary(), '--user-installation', Path(self.profile_dir).as_uri(),
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self.jobs = 0
+        
+        # XML-RPC porti ochilguncha kutish
+        deadline = time.monotonic() + Config.OFFICE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                break
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.close()
+                logger.info(f"📝 LibreOffice #{self.index} ishga tushdi (port {self.port})")
+                return
+            except OSError:
+                await asyncio.sleep(0.5)
+        await self.stop()
+        raise RuntimeError("LibreOffice ishga tushmadi")
+    
+    async def stop(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 10)
+            except asyncio.TimeoutError:
+                pass
+        # unoserver ishga tushirgan soffice ham shu guruhda
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+    
+    async def convert(self, input_path: str, output_path: str, target_format: str) -> Tuple[bool, str]:
+        args = ['unoconvert', '--host', '127.0.0.1', '--port', str(self.port), '--convert-to', target_format]
+        if target_format == 'txt':
+            args += ['--filter', 'Text (encoded)']
+        args += [os.path.abspath(input_path), os.path.abspath(output_path)]
+        
+        returncode, stderr = await run_office_command(args, Config.OFFICE_JOB_TIMEOUT)
+        self.jobs += 1
+        if returncode != 0 or not os.path.exists(output_path):
+            logger.error(f"unoconvert xatosi: {stderr[-500:]}")
+            return False, f"LibreOffice xatosi: {stderr.splitlines()[-1] if stderr else returncode}"
+        return True, "Muvaffaqiyatli"
+
+class OfficePool:
+    """Headless LibreOffice nusxalari puli: har bir ish uchun soffice ni qayta ishga tushirmaslik"""
+    
+    def __init__(self, size: int = None):
+        self.size = size or Config.OFFICE_POOL_SIZE
+        self._instances: List[OfficeInstance] = []
+        self._idle: Optional[asyncio.Queue] = None
+    
+    async def convert(self, input_path: str, output_path: str, target_format: str) -> Tuple[bool, str]:
+        if not Config.HAS_LIBREOFFICE:
+            return False, "LibreOffice topilmadi"
+        if not Config.HAS_UNOSERVER:
+            return await self.convert_once(input_path, output_path, target_format)
+        
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._instances = [OfficeInstance(i) for i in range(self.size)]
+            for instance in self._instances:
+                self._idle.put_nowait(instance)
+        
+        instance = await self._idle.get()
+        try:
+            if not instance.running:
+                await instance.start()
+            success, message = await instance.convert(input_path, output_path, target_format)
+            # Xatodan keyin yoki N ta ishdan so'ng nusxa yangilanadi (xotira oqishi, osilib qolish)
+            if not success or instance.jobs >= Config.OFFICE_MAX_JOBS:
+                await instance.stop()
+            return success, message
+        except asyncio.TimeoutError:
+            await instance.stop()
+            return False, "LibreOffice vaqt chegarasidan oshdi"
+        except RuntimeError as e:
+            return False, str(e)
+        except BaseException:
+            await instance.stop()
+            raise
+        finally:
+            self._idle.put_nowait(instance)
+    
+    @staticmethod
+    async def convert_once(input_path: str, output_path: str, target_format: str) -> Tuple[bool, str]:
+        """unoserver bo'lmasa: vaqtinchalik profil bilan bir martalik soffice --convert-to"""
+        work_dir = tempfile.mkdtemp(prefix='office_', dir=Config.TEMP_FOLDER)
+        try:
+            convert_to = 'txt:Text (encoded):UTF8' if target_format == 'txt' else target_format
+            args = [
+                office_binary(), '--headless', '--norestore', '--nolockcheck', '--nodefault',
+                f"-env:UserInstallation={Path(os.path.abspath(work_dir), 'profile').as_uri()}",
+                '--convert-to', convert_to, '--outdir', work_dir, os.path.abspath(input_path)
+            ]
+            try:
+                returncode, stderr = await run_office_command(args, Config.OFFICE_JOB_TIMEOUT)
+            except asyncio.TimeoutError:
+                return False, "LibreOffice vaqt chegarasidan oshdi"
+            
+            result = os.path.join(work_dir, f"{Path(input_path).stem}.{target_format}")
+            if not os.path.exists(result):
+                logger.error(f"soffice xatosi ({returncode}): {stderr[-500:]}")
+                return False, "LibreOffice faylni konvertatsiya qila olmadi"
+            shutil.move(result, output_path)
+            return True, "Muvaffaqiyatli"
+        finally:
+            await executor.run_io(shutil.rmtree, work_dir, True)
+    
+    async def stop(self):
+        for instance in self._instances:
+            await instance.stop()
+
+async def pandoc_to_text(input_path: str, output_path: str) -> Tuple[bool, str]:
+    """RTF → TXT pandoc orqali (LibreOffice ga qaraganda ancha yengil)"""
+    returncode, stderr = await run_office_command(
+        ['pandoc', '-f', 'rtf', '-t', 'plain', '--wrap=none', '-o', output_path, input_path],
+        Config.OFFICE_JOB_TIMEOUT
+    )
+    if returncode != 0:
+        return False, f"Pandoc xatosi: {stderr[-300:]}"
+    return True, "Muvaffaqiyatli"
+
+office_pool = OfficePool()
+
+# ==================== KONVERTATSIYA FUNKSIYALARI ====================
+class Converter:
+    """Barcha konvertatsiya operatsiyalari"""
+    
+    @staticmethod
+    async def convert_image(input_path: str, output_path: str, target_format: str, settings: Dict,
+                            progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Rasmni konvertatsiya qilish"""
+        try:
+            if target_format.lower() == 'mp4':
+                return await AnimationEngine.to_mp4(input_path, output_path, progress=progress)
+            return await executor.run_cpu(
+                _convert_image_sync, input_path, output_path, target_format, dict(settings),
+                progress=progress
+            )
+        except Exception as e:
+            logger.error(f"Rasm konvertatsiya xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def convert_document(input_path: str, output_path: str, target_format: str, settings: Dict,
+                               progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Hujjatni konvertatsiya qilish"""
+        try:
+            input_ext = get_file_extension(input_path)
+            target_format = target_format.lower()
+            if input_ext == 'pdf' and target_format in ('jpg', 'png'):
+                return await PdfRasterizer.convert(input_path, output_path, target_format, settings,
+                                                   progress=progress)
+            if input_ext == 'docx' and target_format == 'txt':
+                return await executor.run_cpu(_docx_to_text_sync, input_path, output_path, progress=progress)
+            if input_ext in ('docx', 'doc', 'rtf') and target_format in ('pdf', 'txt'):
+                if input_ext == 'rtf' and target_format == 'txt' and Config.HAS_PANDOC:
+                    success, message = await pandoc_to_text(input_path, output_path)
+                    if success:
+                        return success, message
+                    logger.warning(f"{message}, LibreOffice bilan urinib ko'riladi")
+                return await office_pool.convert(input_path, output_path, target_format)
+            return await executor.run_cpu(
+                _convert_document_sync, input_path, output_path, target_format, dict(settings),
+                progress=progress
+            )
+        except Exception as e:
+            logger.error(f"Hujjat konvertatsiya xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def convert_audio(input_path: str, output_path: str, target_format: str, settings: Dict,
+                            progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Audioni konvertatsiya qilish"""
+        try:
+            return await AudioEngine.convert(input_path, output_path, target_format, settings, progress=progress)
+            
+        except Exception as e:
+            logger.error(f"Audio konvertatsiya xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def convert_video(input_path: str, output_path: str, target_format: str, settings: Dict,
+                            progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Videoni konvertatsiya qilish"""
+        try:
+            return await VideoEngine.convert(input_path, output_path, target_format, settings, progress=progress)
+            
+        except Exception as e:
+            logger.error(f"Video konvertatsiya xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def convert_archive(input_path: str, output_path: str, target_format: str,
+                              progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Arxivni konvertatsiya qilish"""
+        try:
+            return await executor.run_cpu(transcode_archive, input_path, output_path, target_format,
+                                          progress=progress)
+            
+        except Exception as e:
+            logger.error(f"Arxiv konvertatsiya xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def compress_file(input_path: str, output_path: str, settings: Dict,
+                            progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Faylni siqish"""
+        try:
+            file_type = get_file_type(get_file_extension(input_path))
+            
+            # Rasmni siqish
+            if file_type == 'image' and Config.HAS_PIL:
+                return await executor.run_cpu(
+                    _compress_image_sync, input_path, output_path, dict(settings),
+                    progress=progress
+                )
+            
+            # Boshqa fayllar uchun oddiy nusxa
+            await executor.run_io(copy_file_with_progress, input_path, output_path, progress=progress)
+            return True, "Fayl nusxalandi (Siqish amalga oshirilmadi)"
+            
+        except Exception as e:
+            logger.error(f"Siqish xatosi: {e}")
+            return False, str(e)
+    
+    @staticmethod
+    async def convert(file_type: str, input_path: str, output_path: str, target_format: str,
+                      settings: Dict, progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        """Fayl turiga qarab tegishli konvertatsiyani bajarish"""
+        holder = [0]
+        token = _job_memory.set(holder)
+        try:
+            if file_type == 'image':
+                return await Converter.convert_image(input_path, output_path, target_format, settings, progress=progress)
+            elif file_type == 'document':
+                return await Converter.convert_document(input_path, output_path, target_format, settings, progress=progress)
+            elif file_type == 'audio':
+                return await Converter.convert_audio(input_path, output_path, target_format, settings, progress=progress)
+            elif file_type == 'video':
+                return await Converter.convert_video(input_path, output_path, target_format, settings, progress=progress)
+            elif file_type == 'archive':
+                return await Converter.convert_archive(input_path, output_path, target_format, progress=progress)
+            elif file_type == 'compress':
+                # Siqish - fayl turi emas, alohida amal (natija formati output_path kengaytmasida)
+                return await Converter.compress_file(input_path, output_path, settings, progress=progress)
+            return False, "Noma'lum fayl turi"
+        finally:
+            _job_memory.reset(token)
+            if holder[0]:
+                metrics.memory_peak.observe(holder[0], engine=file_type)
+                logger.info(
+                    f"📈 {get_file_extension(input_path)} → {target_format}: "
+                    f"xotira cho'qqisi {human_readable_size(holder[0])}"
+                )
+
+# ==================== KONVERTATSIYA YO'LLARI ====================
+class ConversionPlanner:
+    """CONVERSION_MATRIX ni graf sifatida ko'rib, formatlar orasidagi eng arzon yo'llarni topish.
+    
+    Qirra narxi - 1 MB kirish uchun o'lchangan soniyalar (EWMA). Har bir manba format uchun eng arzon
+    yo'llar Dijkstra bilan hisoblanib keshlanadi, yangi o'lchov kelganda kesh tozalanadi.
+    """
+    
+    # Ko'p sahifali natija ZIP to'plam bo'lishi mumkin - bunday qirralar faqat oxirgi bosqichda
+    TERMINAL_EDGES = {('pdf', 'jpg'), ('pdf', 'png')}
+    # Oraliq bosqichda sifat yo'qotadigan formatlar - teng narxda yo'qotishsiz yo'l tanlanadi
+    LOSSY_FORMATS = {'jpg', 'jpeg', 'webp', 'gif', 'mp3', 'ogg', 'm4a', 'mp4'}
+    # Bir xil format (bitta tugun)
+    ALIASES = {'jpeg': 'jpg'}
+    # Faqat animatsiyali manba uchun ma'noli qirralar (aks holda natija qotib turgan bitta kadrli video)
+    ANIMATED_EDGES = {('webp', 'mp4')}
+    ANIMATED_FORMATS = {'gif', 'webp'}
+    
+    def __init__(self, matrix: Dict[str, List[str]] = None, max_hops: int = None):
+        self.matrix = matrix if matrix is not None else CONVERSION_MATRIX
+        self.max_hops = max_hops or Config.PLANNER_MAX_HOPS
+        self._costs: Dict[Tuple[str, str], float] = {}
+        self._routes: Dict[Tuple[str, bool], Dict[str, Tuple[float, List[str]]]] = {}
+    
+    @classmethod
+    def canonical(cls, fmt: str) -> str:
+        return cls.ALIASES.get(fmt, fmt)
+    
+    def edge_cost(self, source: str, target: str) -> float:
+        """1 MB uchun soniya: o'lchangan qiymat yoki fayl turlari bo'yicha boshlang'ich taxmin"""
+        cost = self._costs.get((source, target))
+        if cost is None:
+            defaults = Config.PLANNER_DEFAULT_COSTS
+            cost = max(defaults.get(get_file_type(source), 1.0), defaults.get(get_file_type(target), 1.0))
+        return cost
+    
+    def observe(self, source: str, target: str, input_size: int, seconds: float):
+        """Bajarilgan bosqich vaqtini qirra narxiga qo'shish"""
+        rate = seconds / max(input_size / (1024 * 1024), 1.0)
+        previous = self._costs.get((source, target))
+        alpha = Config.PLANNER_EWMA_ALPHA
+        self._costs[(source, target)] = rate if previous is None else alpha * rate + (1 - alpha) * previous
+        self._routes.clear()
+    
+    def routes(self, source: str, animated: bool = False) -> Dict[str, Tuple[float, List[str]]]:
+        """Manbadan yetib boriladigan formatlar: {format: (narx, yo'l)}"""
+        key = (self.canonical(source), animated)
+        routes = self._routes.get(key)
+        if routes is None:
+            routes = self._routes[key] = self._shortest_paths(*key)
+        return routes
+    
+    @staticmethod
+    def writer_available(fmt: str) -> bool:
+        """RAR arxivini faqat 'rar' dasturi yoza oladi (libarchive faqat o'qiydi)"""
+        return fmt != 'rar' or Config.HAS_RAR
+    
+    def _edge_allowed(self, path: List[str], target: str, animated: bool) -> bool:
+        """Animatsiyaga oid qirra faqat animatsiya yo'l bo'ylab saqlanib kelgan bo'lsa"""
+        if not self.writer_available(target):
+            return False
+        if (path[-1], target) not in self.ANIMATED_EDGES:
+            return True
+        return animated and all(fmt in self.ANIMATED_FORMATS for fmt in path)
+    
+    def _shortest_paths(self, source: str, animated: bool = False) -> Dict[str, Tuple[float, List[str]]]:
+        """Bosqichlar soni cheklangan Dijkstra: holat - (format, bosqichlar soni)"""
+        best: Dict[str, Tuple[float, List[str]]] = {}
+        settled = set()
+        heap = [(0.0, 0.0, [source])]
+        while heap:
+            weight, cost, path = heapq.heappop(heap)
+            node, hops = path[-1], len(path) - 1
+            if (node, hops) in settled:
+                continue
+            settled.add((node, hops))
+            if hops and node not in best:
+                best[node] = (cost, path)
+            if hops == self.max_hops or (hops and (path[-2], node) in self.TERMINAL_EDGES):
+                continue
+            penalty = Config.PLANNER_LOSSY_PENALTY if hops and node in self.LOSSY_FORMATS else 0.0
+            for target in map(self.canonical, self.matrix.get(node, [])):
+                if target not in path and self._edge_allowed(path, target, animated):
+                    edge = self.edge_cost(node, target)
+                    heapq.heappush(heap, (weight + edge + penalty, cost + edge, path + [target]))
+        best.pop(source, None)
+        return best
+    
+    def plan(self, source: str, target: str, animated: bool = False) -> Optional[List[str]]:
+        route = self.routes(source, animated).get(self.canonical(target))
+        return route[1] if route else None
+    
+    @staticmethod
+    def estimate(cost: float, size: int) -> float:
+        """Yo'l narxidan fayl hajmi bo'yicha taxminiy vaqt (soniya)"""
+        return cost * max(size / (1024 * 1024), 1.0)
+    
+    async def execute(self, backend, source: str, target: str, input_path: str, output_path: str,
+                      settings: Dict, progress: Optional[Callable] = None,
+                      work_dir: Optional[str] = None, animated: bool = False) -> Tuple[bool, str]:
+        """Yo'lni bosqichma-bosqich bajarish, oraliq natijalar work_dir da (berilmasa vaqtinchalik papkada)"""
+        path = self.plan(source, target, animated)
+        if path is None:
+            return False, f"{source.upper()} → {target.upper()} konvertatsiya yo'li topilmadi"
+        
+        own_work_dir = work_dir is None
+        current = input_path
+        try:
+            for index, (step_source, step_target) in enumerate(zip(path, path[1:])):
+                last = index == len(path) - 2
+                if last:
+                    step_output = output_path
+                    step_settings = settings
+                else:
+                    if work_dir is None:
+                        work_dir = await executor.run_io(tempfile.mkdtemp, prefix='chain_', dir=Config.TEMP_FOLDER)
+                    step_output = os.path.join(work_dir, f"step{index}.{step_target}")
+                    # O'lcham faqat oxirgi bosqichda o'zgartiriladi (ikki marta kichraymasligi uchun)
+                    step_settings = dict(settings, resize_percent='100')
+                
+                size = os.path.getsize(current)
+                started = time.monotonic()
+                success, message = await backend.convert(
+                    get_file_type(step_source), current, step_output, step_target, step_settings,
+                    progress=progress
+                )
+                if not success:
+                    if len(path) > 2:
+                        message = f"{step_source.upper()} → {step_target.upper()} bosqichi: {message}"
+                    return False, message
+                self.observe(step_source, step_target, size, time.monotonic() - started)
+                current = step_output
+        finally:
+            if own_work_dir and work_dir:
+                await executor.run_io(shutil.rmtree, work_dir, True)
+        
+        if len(path) > 2:
+            message = f"{message} ({' → '.join(fmt.upper() for fmt in path)})"
+        return True, message
+
+conversion_planner = ConversionPlanner()
+
+# ==================== UMUMIY VAZIFALAR NAVBATI ====================
+class JobQueue:
+    """SQLite asosidagi umumiy vazifalar navbati (ijara muddati va qayta urinish bilan)"""
+    
+    def __init__(self, path: str = None):
+        self.path = path or Config.JOB_QUEUE_FILE
+        self._local = threading.local()
+    
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def open(self):
+        """Jadvallarni yaratish"""
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, worker_id TEXT, lease_until REAL, "
+            "progress TEXT, result TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "worker_id TEXT PRIMARY KEY, host TEXT, pid INTEGER, heartbeat REAL, current_job TEXT)"
+        )
+    
+    # ---------- Front tomoni ----------
+    def enqueue(self, payload: Dict) -> str:
+        job_id = os.urandom(8).hex()
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, payload, status, created, updated) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, json.dumps(payload), now, now)
+        )
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT status, progress, result FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'status': row[0],
+            'progress': json.loads(row[1]) if row[1] else None,
+            'result': json.loads(row[2]) if row[2] else None,
+        }
+    
+    def delete(self, job_id: str):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    
+    def alive_workers(self) -> int:
+        """So'nggi heartbeat vaqtiga ko'ra tirik ishchilar soni"""
+        since = time.time() - Config.WORKER_HEARTBEAT_INTERVAL * 3
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (since,)
+        ).fetchone()[0]
+    
+    def depth(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+    
+    # ---------- Ishchi tomoni ----------
+    def claim(self, worker_id: str) -> Optional[Tuple[str, Dict, int]]:
+        """Navbatdagi yoki ijarasi tugagan vazifani olish"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, payload, attempts FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY created LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                
+                job_id, payload, attempts = row
+                if attempts >= Config.JOB_MAX_ATTEMPTS:
+                    # Ishchilar ketma-ket to'xtagan vazifa - qayta urinmaymiz
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', result = ?, updated = ? WHERE id = ?",
+                        (json.dumps({'success': False, 'message': "Vazifa bir necha marta muvaffaqiyatsiz tugadi"}),
+                         now, job_id)
+                    )
+                    continue
+                
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker_id, now + Config.JOB_LEASE_SECONDS, now, job_id)
+                )
+                conn.execute("COMMIT")
+                return job_id, json.loads(payload), attempts + 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def heartbeat(self, worker_id: str, job_id: Optional[str] = None):
+        """Ishchi tirikligini bildirish va vazifa ijarasini uzaytirish"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (worker_id, host, pid, heartbeat, current_job) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (worker_id, socket.gethostname(), os.getpid(), now, job_id)
+        )
+        if job_id:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + Config.JOB_LEASE_SECONDS, job_id, worker_id)
+            )
+    
+    def set_progress(self, job_id: str, worker_id: str, progress: Tuple):
+        self._conn().execute(
+            "UPDATE jobs SET progress = ?, updated = ? WHERE id = ? AND worker_id = ?",
+            (json.dumps(progress), time.time(), job_id, worker_id)
+        )
+    
+    def finish(self, job_id: str, worker_id: str, result: Dict, retry: bool = False):
+        """Vazifa natijasini yozish (retry=True bo'lsa navbatga qaytariladi)"""
+        status = 'queued' if retry else ('done' if result.get('success') else 'failed')
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, worker_id = NULL, lease_until = NULL, updated = ? "
+            "WHERE id = ? AND worker_id = ?",
+            (status, json.dumps(result), time.time(), job_id, worker_id)
+        )
+    
+    def unregister(self, worker_id: str):
+        self._conn().execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+class LocalBackend:
+    """Konvertatsiyani shu jarayonda bajarish"""
+    
+    @timed_conversion
+    async def convert(self, file_type: str, input_path: str, output_path: str, target_format: str,
+                      settings: Dict, progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        return await Converter.convert(file_type, input_path, output_path, target_format, settings, progress)
+    
+    async def start(self):
+        pass
+    
+    async def stop(self):
+        pass
+
+class QueueBackend:
+    """Konvertatsiyani umumiy navbat orqali ishchi jarayonlarga topshirish"""
+    
+    def __init__(self, job_queue: JobQueue = None, local_workers: int = None):
+        self.job_queue = job_queue or JobQueue()
+        self.local_workers = Config.LOCAL_WORKERS if local_workers is None else local_workers
+        self._processes: List[subprocess.Popen] = []
+    
+    async def start(self):
+        await executor.run_io(self.job_queue.open)
+        
+        # Shu mashinada ishchi jarayonlarni ishga tushirish
+        for _ in range(self.local_workers):
+            self._processes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'worker']
+            ))
+        if self._processes:
+            logger.info(f"👷 {len(self._processes)} ta ishchi jarayon ishga tushirildi")
+    
+    async def stop(self):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                await executor.run_io(process.wait, timeout=Config.WORKER_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes.clear()
+    
+    @timed_conversion
+    async def convert(self, file_type: str, input_path: str, output_path: str, target_format: str,
+                      settings: Dict, progress: Optional[Callable] = None) -> Tuple[bool, str]:
+        payload = {
+            'file_type': file_type,
+            'input_path': input_path,
+            'output_path': output_path,
+            'target_format': target_format,
+            'settings': dict(settings),
+        }
+        job_id = await executor.run_io(self.job_queue.enqueue, payload)
+        waiting_since = time.monotonic()
+        last_progress = None
+        
+        try:
+            while True:
+                await asyncio.sleep(Config.JOB_POLL_INTERVAL)
+                job = await executor.run_io(self.job_queue.get, job_id)
+                if job is None:
+                    return False, "Vazifa navbatdan yo'qoldi"
+                
+                if job['status'] in ('done', 'failed'):
+                    result = job['result'] or {}
+                    return bool(result.get('success')), result.get('message', '')
+                
+                if progress and job['progress'] and job['progress'] != last_progress:
+                    last_progress = job['progress']
+                    progress(*last_progress)
+                
+                # Ishchi yo'q bo'lsa cheksiz kutmaslik
+                if job['status'] == 'queued':
+                    if await executor.run_io(self.job_queue.alive_workers):
+                        waiting_since = time.monotonic()
+                    elif time.monotonic() - waiting_since > Config.JOB_NO_WORKER_TIMEOUT:
+                        return False, "Bo'sh ishchi jarayon topilmadi"
+                else:
+                    waiting_since = time.monotonic()
+        finally:
+            await executor.run_io(self.job_queue.delete, job_id)
+
+class ConversionWorker:
+    """Navbatdan vazifalarni olib bajaruvchi ishchi jarayon"""
+    
+    def __init__(self, job_queue: JobQueue = None):
+        self.job_queue = job_queue or JobQueue()
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{os.urandom(3).hex()}"
+        self.current_job: Optional[str] = None
+        self._progress = None
+        self._stopping = False
+    
+    def stop(self):
+        self._stopping = True
+    
+    async def run(self):
+        """Asosiy ish sikli"""
+        await executor.run_io(self.job_queue.open)
+        pump = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"👷 Ishchi ishga tushdi: {self.worker_id}")
+        try:
+            while not self._stopping:
+                claimed = await executor.run_io(self.job_queue.claim, self.worker_id)
+                if claimed is None:
+                    await asyncio.sleep(Config.JOB_POLL_INTERVAL)
+                    continue
+                await self._process(*claimed)
+        finally:
+            pump.cancel()
+            await executor.run_io(self.job_queue.unregister, self.worker_id)
+            logger.info(f"👷 Ishchi to'xtadi: {self.worker_id}")
+    
+    async def _process(self, job_id: str, payload: Dict, attempt: int):
+        self.current_job = job_id
+        self._progress = None
+        logger.info(f"👷 Vazifa olindi: {job_id} ({payload['file_type']} → {payload['target_format']}, urinish {attempt})")
+        
+        def on_progress(done, total=None, unit=''):
+            self._progress = (done, total, unit)
+        
+        try:
+            await executor.run_io(self.job_queue.heartbeat, self.worker_id, job_id)
+            success, message = await Converter.convert(
+                payload['file_type'], payload['input_path'], payload['output_path'],
+                payload['target_format'], payload['settings'], progress=on_progress
+            )
+            result, retry = {'success': success, 'message': message}, False
+        except BrokenProcessPool as e:
+            # Ishchi pul buzilgan - boshqa urinishda qayta bajarish mumkin
+            result, retry = {'success': False, 'message': str(e)}, attempt < Config.JOB_MAX_ATTEMPTS
+        except Exception as e:
+            logger.error(f"Vazifa xatosi ({job_id}): {e}")
+            result, retry = {'success': False, 'message': str(e)}, False
+        finally:
+            self.current_job = None
+        
+        await executor.run_io(self.job_queue.finish, job_id, self.worker_id, result, retry)
+    
+    async def _heartbeat_loop(self):
+        """Heartbeat va progressni navbatga yozib turish"""
+        last_heartbeat = 0.0
+        last_progress = None
+        while True:
+            try:
+                job_id = self.current_job
+                if time.monotonic() - last_heartbeat >= Config.WORKER_HEARTBEAT_INTERVAL:
+                    await executor.run_io(self.job_queue.heartbeat, self.worker_id, job_id)
+                    last_heartbeat = time.monotonic()
+                if job_id and self._progress and self._progress != last_progress:
+                    last_progress = self._progress
+                    await executor.run_io(self.job_queue.set_progress, job_id, self.worker_id, last_progress)
+            except Exception as e:
+                logger.error(f"Heartbeat xatosi: {e}")
+            await asyncio.sleep(Config.JOB_PROGRESS_INTERVAL)
+
+def run_worker():
+    """Ishchi jarayonni ishga tushirish (python main.py worker)"""
+    check_libraries()
+    executor.process_workers = Config.WORKER_POOL_SIZE
+    worker = ConversionWorker()
+    
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        try:
+            await worker.run()
+        finally:
+            await office_pool.stop()
+            executor.shutdown()
+    
+    asyncio.run(main())
+
+
+# ==================== HOLAT OMBORI (SQLITE) ====================
+def _state_json_default(obj):
+    """JSON ga datetime obyektlarini yozish"""
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    raise TypeError(f"{type(obj).__name__} JSON ga yozib bo'lmaydi")
+
+def _state_json_hook(obj: Dict):
+    """JSON dan datetime obyektlarini tiklash"""
+    if len(obj) == 1 and '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+class StateStore:
+    """SQLite (WAL) asosidagi doimiy holat ombori. Yozuvlar fon oqimida guruhlab bajariladi"""
+    
+    TABLES = ('files', 'settings', 'batches')
+    
+    def __init__(self, path: str = None):
+        self.path = path or Config.DATABASE_FILE
+        self._reader: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # Hali diskka yozilmagan o'zgarishlar: (jadval, kalit) -> (tartib raqami, JSON yoki None)
+        self._pending: Dict[Tuple[str, str], Tuple[int, Optional[str]]] = {}
+        self._pending_lock = threading.Lock()
+        self._seq = itertools.count(1)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def open(self):
+        """Bazani ochish va jadvallarni yaratish"""
+        conn = self._connect()
+        with conn:
+            for table in self.TABLES:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    f"key TEXT PRIMARY KEY, user_id INTEGER, created REAL, data TEXT NOT NULL)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_user_id ON {table}(user_id)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_created ON {table}(created)")
+        self._reader = conn
+        self._writer = threading.Thread(target=self._write_loop, name="state-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"💾 Holat ombori ochildi: {self.path}")
+    
+    def close(self):
+        """Navbatdagi yozuvlarni diskka yozib, bazani yopish"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+    
+    # ---------- O'qish ----------
+    def fetch(self, table: str, key: str) -> Optional[str]:
+        with self._pending_lock:
+            pending = self._pending.get((table, key))
+        if pending is not None:
+            return pending[1]
+        with self._read_lock:
+            row = self._reader.execute(f"SELECT data FROM {table} WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def keys(self, table: str) -> List[str]:
+        """Jadval kalitlari: diskdagilar ustiga hali yozilmagan o'zgarishlar qo'yiladi (yozuvchi kutilmaydi)"""
+        # Avval navbat, keyin baza: oradagi commit natijasi ikkalasida ham bir xil
+        with self._pending_lock:
+            pending = {key: data for (name, key), (_, data) in self._pending.items() if name == table}
+        with self._read_lock:
+            rows = self._reader.execute(f"SELECT key FROM {table}").fetchall()
+        keys = [row[0] for row in rows if row[0] not in pending]
+        keys.extend(key for key, data in pending.items() if data is not None)
+        return keys
+    
+    def count(self, table: str) -> int:
+        return len(self.keys(table))
+    
+    # ---------- Yozish ----------
+    def put(self, table: str, key: str, data: str, user_id: Optional[int], created: Optional[float]):
+        seq = next(self._seq)
+        with self._pending_lock:
+            self._pending[(table, key)] = (seq, data)
+        self._queue.put((seq, table, key, data, user_id, created))
+    
+    def delete(self, table: str, key: str):
+        seq = next(self._seq)
+        with self._pending_lock:
+            self._pending[(table, key)] = (seq, None)
+        self._queue.put((seq, table, key, None, None, None))
+    
+    def _write_loop(self):
+        """Yozuvlarni guruhlab bitta tranzaksiyada bajarish"""
+        conn = self._connect()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + Config.STATE_FLUSH_INTERVAL
+            while len(batch) < Config.STATE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or not isinstance(batch[-1], tuple):
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            # None - to'xtash belgisi
+            if None in batch:
+                running = False
+            batch = [op for op in batch if isinstance(op, tuple)]
+            
+            try:
+                with conn:
+                    for seq, table, key, data, user_id, created in batch:
+                        if data is None:
+                            conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                        else:
+                            conn.execute(
+                                f"INSERT OR REPLACE INTO {table} (key, user_id, created, data) "
+                                f"VALUES (?, ?, ?, ?)",
+                                (key, user_id, created, data)
+                            )
+            except Exception as e:
+                logger.error(f"Holat omboriga yozish xatosi: {e}")
+            
+            with self._pending_lock:
+                for seq, table, key, *_ in batch:
+                    pending = self._pending.get((table, key))
+                    if pending is not None and pending[0] == seq:
+                        del self._pending[(table, key)]
+        conn.close()
+
+class StoredMapping(MutableMapping):
+    """StateStore jadvali ustidagi lug'at (so'nggi ishlatilganlar xotirada keshlanadi)"""
+    
+    def __init__(self, store: StateStore, table: str, key_type=str,
+                 created_field: Optional[str] = None, cache_size: int = None):
+        self.store = store
+        self.table = table
+        self.key_type = key_type
+        self.created_field = created_field
+        self.cache_size = cache_size or Config.STATE_CACHE_SIZE
+        self._cache: "OrderedDict" = OrderedDict()
+    
+    def _remember(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def __getitem__(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        data = self.store.fetch(self.table, str(key))
+        if data is None:
+            raise KeyError(key)
+        value = json.loads(data, object_hook=_state_json_hook)
+        self._remember(key, value)
+        return value
+    
+    def __setitem__(self, key, value: Dict):
+        data = json.dumps(value, default=_state_json_default, ensure_ascii=False)
+        user_id = value.get('user_id', key if self.key_type is int else None)
+        created = None
+        if self.created_field and isinstance(value.get(self.created_field), datetime):
+            created = value[self.created_field].timestamp()
+        self.store.put(self.table, str(key), data, user_id, created)
+        self._remember(key, value)
+    
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self.store.delete(self.table, str(key))
+    
+    def __iter__(self):
+        for key in self.store.keys(self.table):
+            yield self.key_type(key)
+    
+    def __len__(self):
+        return self.store.count(self.table)
+
+# ==================== YUKLANGAN FAYLLAR OMBORI ====================
+class UploadStore:
+    """Telegram file_unique_id bo'yicha yuklangan fayllar ombori (havolalar soni bilan)"""
+    
+    def __init__(self, folder: str = None):
+        self.folder = folder or Config.UPLOAD_FOLDER
+        self._refs: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def blob_path(self, file_unique_id: str, extension: str) -> str:
+        return os.path.join(self.folder, f"{file_unique_id}.{extension}")
+    
+    async def acquire(self, file_unique_id: str, extension: str,
+                      download: Callable[[str], Awaitable]) -> Tuple[str, bool]:
+        """Faylni ombordan olish yoki yuklab olish. (yo'l, qayta_ishlatildi) qaytaradi"""
+        path = self.blob_path(file_unique_id, extension)
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        
+        # Bir xil fayl bir vaqtda ikki marta yuklanmasligi uchun
+        async with lock:
+            reused = os.path.exists(path)
+            if reused:
+                # Yoshini yangilash (tozalash vazifasi uchun)
+                os.utime(path)
+            else:
+                tmp_path = f"{path}.part"
+                try:
+                    await download(tmp_path)
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+        
+        if not lock.locked():
+            self._locks.pop(path, None)
+        
+        self._refs[path] = self._refs.get(path, 0) + 1
+        return path, reused
+    
+    def release(self, path: str):
+        """Fayl yozuvi o'chirilganda havolani kamaytirish"""
+        count = self._refs.get(path, 0) - 1
+        if count > 0:
+            self._refs[path] = count
+        else:
+            self._refs.pop(path, None)
+    
+    def is_referenced(self, path: str) -> bool:
+        return self._refs.get(path, 0) > 0
+    
+    def remove_unused(self, path: str) -> bool:
+        """Hech bir yozuv ishlatmayotgan (va hozir yuklanmayotgan) faylni o'chirish"""
+        if self.is_referenced(path) or path in self._locks:
+            return False
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        return True
+    
+    def rebuild(self, records):
+        """Havolalar sonini fayl yozuvlaridan qayta hisoblash"""
+        self._refs.clear()
+        for data in records:
+            path = data.get('input_path')
+            if path:
+                self._refs[path] = self._refs.get(path, 0) + 1
+
+# ==================== NATIJALAR KESHI ====================
+def hash_file(file_path: str) -> str:
+    """Fayl tarkibining SHA-256 xeshi"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(Config.COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(src: str, dst: str):
+    """Faylni hardlink orqali, bo'lmasa nusxalab joylashtirish"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class ResultCache:
+    """Kirish xeshi + format + sozlamalar bo'yicha diskdagi natijalar keshi (LRU)"""
+    
+    # Natijaga ta'sir qiluvchi sozlamalar va ularning standart qiymatlari
+    SETTINGS_DEFAULTS = {
+        'image_quality': '85',
+        'resize_percent': '100',
+        'audio_bitrate': '192k',
+        'audio_sample_rate': '44100',
+        'pdf_dpi': str(Config.PDF_DPI),
+        'pdf_pages': 'all',
+        'pdf_output': 'zip',
+        'compress_target': '0',
+        'strip_metadata': '1',
+    }
+    
+    def __init__(self, folder: str = None, max_bytes: int = None):
+        self.folder = folder or Config.CACHE_FOLDER
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CACHE_MAX_BYTES
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def make_key(cls, content_hash: str, target_format: str, settings: Dict) -> str:
+        """Kesh kalitini yaratish"""
+        effective = {
+            key: str(settings.get(key, default))
+            for key, default in cls.SETTINGS_DEFAULTS.items()
+        }
+        payload = json.dumps([content_hash, target_format.lower(), effective], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def load(self):
+        """Diskdagi mavjud yozuvlarni indeksga o'qish (eng eskisi birinchi)"""
+        os.makedirs(self.folder, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.folder):
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            stats = entry.stat()
+            found.append((stats.st_mtime, entry.name.split('.', 1)[0], entry.path, stats.st_size))
+        
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            for _, key, path, size in sorted(found):
+                self._entries[key] = (path, size)
+                self._size += size
+        self._evict()
+        logger.info(f"🗃️ Natijalar keshi: {len(self._entries)} ta yozuv, {human_readable_size(self._size)}")
+    
+    def get(self, key: str) -> Optional[str]:
+        """Keshdan natija yo'lini olish (topilmasa None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path, size = entry
+            if not os.path.exists(path):
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+        
+        # Qayta ishga tushganda ham LRU tartibi saqlanishi uchun
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+    
+    def put(self, key: str, file_path: str) -> Optional[str]:
+        """Natijani keshga qo'shish"""
+        size = os.path.getsize(file_path)
+        if size > self.max_bytes:
+            return None
+        
+        ext = get_file_extension(file_path)
+        path = os.path.join(self.folder, f"{key}.{ext}" if ext else key)
+        tmp_path = os.path.join(self.folder, f".{key}.tmp")
+        link_or_copy(file_path, tmp_path)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (path, size)
+            self._size += size
+        self._evict()
+        return path
+    
+    def trim(self, nbytes: int) -> int:
+        """Disk to'lganda: eng eski yozuvlarni kamida nbytes bo'shaguncha o'chirish"""
+        removed = []
+        freed = 0
+        with self._lock:
+            while freed < nbytes and self._entries:
+                _, (path, size) = self._entries.popitem(last=False)
+                self._size -= size
+                freed += size
+                removed.append(path)
+        
+        for path in removed:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+        if removed:
+            logger.info(f"🗃️ Disk uchun keshdan {len(removed)} ta natija o'chirildi ({human_readable_size(freed)})")
+        return freed
+    
+    def _evict(self):
+        """Hajm chegarasidan oshsa eng eski yozuvlarni o'chirish"""
+        removed = []
+        with self._lock:
+            while self._size > self.max_bytes and self._entries:
+                _, (path, size) = self._entries.popitem(last=False)
+                self._size -= size
+                removed.append(path)
+        
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"🗃️ Keshdan {len(removed)} ta eski natija o'chirildi")
+
+# ==================== YUBORILGAN FAYLLAR INDEKSI ====================
+def extract_sent_media(message) -> Optional[Tuple[str, str]]:
+    """Yuborilgan xabardan (tur, file_id) juftligini olish"""
+    if message is None:
+        return None
+    if message.photo:
+        return 'photo', message.photo[-1].file_id
+    for kind in ('video', 'audio', 'animation', 'document'):
+        media = getattr(message, kind, None)
+        if media is not None:
+            return kind, media.file_id
+    return None
+
+class SentFileIndex:
+    """(file_unique_id, format, sozlamalar) → Telegram file_id xaritasi (JSON faylda saqlanadi)"""
+    
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or Config.SENT_FILES_FILE
+        self.max_entries = max_entries or Config.SENT_FILES_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._save_task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def make_key(file_unique_id: str, target_format: str, settings: Dict) -> str:
+        """Indeks kalitini yaratish"""
+        effective = {
+            key: str(settings.get(key, default))
+            for key, default in ResultCache.SETTINGS_DEFAULTS.items()
+        }
+        return json.dumps([file_unique_id, target_format.lower(), effective], sort_keys=True)
+    
+    def load(self):
+        """Indeksni fayldan o'qish"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._entries = OrderedDict(data)
+            logger.info(f"📨 Yuborilgan fayllar indeksi: {len(self._entries)} ta yozuv")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Yuborilgan fayllar indeksini o'qib bo'lmadi: {e}")
+    
+    def save(self):
+        """Indeksni faylga atomar yozish"""
+        data = list(self._entries.items())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def put(self, key: str, kind: str, telegram_file_id: str, size: int):
+        self._entries[key] = {
+            'kind': kind,
+            'file_id': telegram_file_id,
+            'size': size,
+            'time': time.time()
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._schedule_save()
+    
+    def discard(self, key: str):
+        if self._entries.pop(key, None) is not None:
+            self._schedule_save()
+    
+    def _schedule_save(self):
+        """Bir nechta o'zgarishni bitta yozishga birlashtirish"""
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+    
+    async def _save_later(self):
+        try:
+            await asyncio.sleep(Config.SENT_FILES_SAVE_DELAY)
+            await executor.run_io(self.save)
+        except Exception as e:
+            logger.error(f"Yuborilgan fayllar indeksini saqlab bo'lmadi: {e}")
+        finally:
+            self._save_task = None
+
+# ==================== VAZIFA ISH PAPKALARI ====================
+def tmpfs_workspace_root() -> Optional[str]:
+    """tmpfs dagi ish papkalari ildizi (faqat mahalliy backend uchun - navbat ishchilari boshqa mashinada bo'lishi mumkin)"""
+    if Config.JOB_QUEUE_MODE != 'local' or not os.path.isdir(Config.WORKSPACE_TMPFS):
+        return None
+    return os.path.join(Config.WORKSPACE_TMPFS, "converter_jobs")
+
+class JobWorkspace:
+    """Bitta vazifaning alohida ish papkasi.
+    
+    Oraliq va chiqish fayllari shu papkada yoziladi, tayyor natija publish() orqali OUTPUT_FOLDER dagi
+    vazifaga xos papkaga atomar ko'chiriladi. Vazifa tugaganda (xato yoki bekor qilinganda ham) hammasi o'chiriladi.
+    """
+    
+    def __init__(self, prefix: str = 'job_', size_hint: int = 0):
+        self.job_id = f"{prefix}{secrets.token_hex(8)}"
+        self.size_hint = size_hint
+        self.dir: Optional[str] = None
+        self.output_dir: Optional[str] = None
+    
+    def _root(self) -> str:
+        """Fayl sig'sa tmpfs, aks holda diskdagi TEMP_FOLDER"""
+        root = tmpfs_workspace_root()
+        if root is not None:
+            try:
+                free = shutil.disk_usage(Config.WORKSPACE_TMPFS).free
+                if self.size_hint * Config.WORKSPACE_SIZE_FACTOR <= free * Config.WORKSPACE_TMPFS_MAX_SHARE:
+                    return root
+            except OSError:
+                pass
+        return Config.TEMP_FOLDER
+    
+    def _create(self):
+        root = self._root()
+        os.makedirs(root, exist_ok=True)
+        self.dir = os.path.join(root, self.job_id)
+        os.mkdir(self.dir)
+    
+    def _teardown(self):
+        for path in (self.dir, self.output_dir):
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+    
+    async def open(self) -> 'JobWorkspace':
+        await executor.run_io(self._create)
+        return self
+    
+    async def close(self):
+        # Vazifa bekor qilinganda ham tozalash oxirigacha bajariladi
+        await asyncio.shield(executor.run_io(self._teardown))
+    
+    async def __aenter__(self) -> 'JobWorkspace':
+        return await self.open()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+    
+    def _publish(self, path: str) -> str:
+        self.output_dir = os.path.join(Config.OUTPUT_FOLDER, self.job_id)
+        os.makedirs(self.output_dir, exist_ok=True)
+        target = os.path.join(self.output_dir, os.path.basename(path))
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Boshqa fayl tizimi (tmpfs): avval yonidagi vaqtinchalik nomga nusxalanadi, so'ng atomar almashtiriladi
+            part = f"{target}.part"
+            shutil.copyfile(path, part)
+            os.replace(part, target)
+            os.remove(path)
+        return target
+    
+    async def publish(self, path: str) -> str:
+        """Tayyor natijani chiqish papkasiga atomar ko'chirish (fayl nomi saqlanadi)"""
+        return await executor.run_io(self._publish, path)
+
+# ==================== VAZIFALAR REJALASHTIRUVCHISI ====================
+class ConversionJob:
+    """Navbatdagi bitta konvertatsiya vazifasi"""
+    
+    def __init__(self, job_id: str, user_id: int, run: Callable[[], Awaitable],
+                 on_position: Optional[Callable[[int], Awaitable]] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.run = run
+        self.on_position = on_position
+        self.position = None
+        self.task: Optional[asyncio.Task] = None
+        # Oxirgi navbat o'rni xabari - vazifa u tugamaguncha boshlanmaydi
+        self.notify_task: Optional[asyncio.Task] = None
+        self.enqueued_at = time.monotonic()
+
+class JobScheduler:
+    """Umumiy va foydalanuvchi bo'yicha cheklovli, navbatma-navbat (round-robin) rejalashtiruvchi"""
+    
+    def __init__(self, max_concurrent: int = None, per_user_limit: int = None,
+                 max_queued_per_user: int = None):
+        self.max_concurrent = max_concurrent or Config.MAX_CONCURRENT_JOBS
+        self.per_user_limit = per_user_limit or Config.MAX_JOBS_PER_USER
+        self.max_queued_per_user = max_queued_per_user or Config.MAX_QUEUED_PER_USER
+        self._queues: Dict[int, deque] = {}
+        self._ring: deque = deque()  # Navbatida vazifasi bor foydalanuvchilar
+        self._running: Dict[int, int] = {}
+        self._active = 0
+        self._tasks = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+    
+    def user_load(self, user_id: int) -> int:
+        """Foydalanuvchining bajarilayotgan va navbatdagi vazifalari soni"""
+        return self._running.get(user_id, 0) + len(self._queues.get(user_id, ()))
+    
+    def submit(self, job: ConversionJob) -> int:
+        """Vazifani navbatga qo'yish. 0 - darhol boshlandi, aks holda navbatdagi o'rni"""
+        if self._closed:
+            raise RuntimeError("Rejalashtiruvchi to'xtatilmoqda")
+        if len(self._queues.get(job.user_id, ())) >= self.max_queued_per_user:
+            raise OverflowError("Navbatda juda ko'p vazifa")
+        
+        if job.user_id not in self._queues:
+            self._queues[job.user_id] = deque()
+            self._ring.append(job.user_id)
+        self._queues[job.user_id].append(job)
+        self._idle.clear()
+        
+        self._dispatch()
+        if job.task is not None:
+            return 0
+        
+        job.position = self.positions().get(job, 0)
+        self._post_position(job, job.position)
+        return job.position
+    
+    def positions(self) -> Dict[ConversionJob, int]:
+        """Navbatdagi vazifalarning taxminiy o'rinlari (navbatma-navbat tartibda)"""
+        queues = [list(self._queues[user_id]) for user_id in self._ring]
+        result = {}
+        pos = 1
+        depth = 0
+        while any(depth < len(q) for q in queues):
+            for q in queues:
+                if depth < len(q):
+                    result[q[depth]] = pos
+                    pos += 1
+            depth += 1
+        return result
+    
+    def _next_job(self) -> Optional[ConversionJob]:
+        """Cheklovga yetmagan keyingi foydalanuvchining vazifasini olish"""
+        for _ in range(len(self._ring)):
+            user_id = self._ring[0]
+            if self._running.get(user_id, 0) < self.per_user_limit:
+                self._ring.popleft()
+                queue = self._queues[user_id]
+                job = queue.popleft()
+                if queue:
+                    self._ring.append(user_id)
+                else:
+                    del self._queues[user_id]
+                return job
+            self._ring.rotate(-1)
+        return None
+    
+    def _dispatch(self):
+        """Bo'sh joylar bo'yicha vazifalarni ishga tushirish"""
+        while self._active < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                break
+            self._active += 1
+            self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            job.position = 0
+            job.task = asyncio.create_task(self._run(job))
+            self._tasks.add(job.task)
+            job.task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, job: ConversionJob):
+        try:
+            # Kechikkan "navbatda" tahriri progress xabarini ustidan yozib yubormasligi uchun
+            if job.notify_task is not None:
+                with contextlib.suppress(Exception):
+                    await job.notify_task
+            await job.run()
+        except asyncio.CancelledError:
+            logger.warning(f"Vazifa bekor qilindi: {job.job_id}")
+        except Exception as e:
+            logger.error(f"Vazifa xatosi ({job.job_id}): {e}")
+        finally:
+            self._active -= 1
+            self._running[job.user_id] -= 1
+            if not self._running[job.user_id]:
+                del self._running[job.user_id]
+            self._dispatch()
+            self._notify_positions()
+            if not self._active and not self._queues:
+                self._idle.set()
+    
+    async def drain(self, timeout: float) -> bool:
+        """Yangi vazifalarni qabul qilmaslik va mavjudlarini tugashini kutish"""
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            # Navbatdagilarni tashlab, bajarilayotganlarni bekor qilish
+            self._queues.clear()
+            self._ring.clear()
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            return False
+    
+    def _notify_positions(self):
+        """O'rni o'zgargan vazifalarga xabar berish"""
+        for job, pos in self.positions().items():
+            if pos == job.position:
+                continue
+            job.position = pos
+            self._post_position(job, pos)
+    
+    def _post_position(self, job: ConversionJob, pos: int):
+        """Navbat o'rni xabarlari ketma-ket yuboriladi, vazifa boshlangan bo'lsa yuborilmaydi"""
+        if not job.on_position:
+            return
+        previous = job.notify_task
+        
+        async def notify():
+            if previous is not None:
+                with contextlib.suppress(Exception):
+                    await previous
+            if job.task is None:
+                await job.on_position(pos)
+        
+        job.notify_task = asyncio.create_task(notify())
+
+# ==================== PROGRESS XABARI ====================
+class ProgressReporter:
+    """Konvertatsiya jarayonini xabarda ko'rsatish (tahrirlar soni cheklangan)"""
+    
+    UNITS = {
+        'pages': 'sahifa',
+        'frames': 'kadr',
+        'lines': 'qator',
+        'steps': 'bosqich',
+        'entries': 'fayl',
+        'seconds': 'soniya',
+        'passes': 'urinish',
+    }
+    
+    def __init__(self, message, header: str, interval: float = None):
+        self.message = message
+        self.header = header
+        self.interval = interval if interval is not None else Config.PROGRESS_EDIT_INTERVAL
+        self._latest: Optional[Tuple[float, Optional[float], str]] = None
+        self._shown = None
+        self._last_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+    
+    def update(self, done: float, total: Optional[float] = None, unit: str = ''):
+        """Yangi qiymatni qabul qilish (tahrir keyinroq birlashtirib yuboriladi)"""
+        if self._closed:
+            return
+        self._latest = (done, total, unit)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush())
+    
+    async def _flush(self):
+        try:
+            delay = self._last_edit + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = self.render(*self._latest)
+            if text != self._shown:
+                await self.message.edit_text(text)
+                self._shown = text
+            self._last_edit = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Progress xabarini yangilab bo'lmadi: {e}")
+        finally:
+            self._task = None
+    
+    def render(self, done: float, total: Optional[float], unit: str) -> str:
+        """Progress matnini yaratish"""
+        if unit == 'bytes':
+            amount = human_readable_size(int(done))
+            if total:
+                amount += f" / {human_readable_size(int(total))}"
+        else:
+            amount = f"{int(done)}"
+            if total:
+                amount += f"/{int(total)}"
+            amount += f" {self.UNITS.get(unit, unit)}".rstrip()
+        
+        text = f"{self.header}\n\n"
+        if total:
+            percent = min(100, int(done * 100 / total))
+            filled = percent // 10
+            text += f"⏳ Jarayon: {percent}% ({amount})\n"
+            text += "▓" * filled + "░" * (10 - filled)
+        else:
+            text += f"⏳ Jarayon: {amount}"
+        return text
+    
+    async def close(self):
+        """Kutilayotgan tahrirni bekor qilish"""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# ==================== HTTP SERVER ====================
+class HttpRequest:
+    """HTTP so'rovi (faqat kerakli maydonlar)"""
+    
+    def __init__(self, method: str, path: str, headers: Dict[str, str]):
+        self.method = method
+        self.path = path
+        self.headers = headers
+
+class HttpServer:
+    """Minimal asinxron HTTP server (katta fayllarni yuklab olish va xizmat yo'llari uchun)"""
+    
+    MAX_HEADER_SIZE = 16 * 1024
+    
+    def __init__(self, host: str = None, port: int = None):
+        self.host = host or Config.HTTP_SERVER_LISTEN
+        self.port = port or Config.HTTP_SERVER_PORT
+        self._routes: List[Tuple[str, Callable]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    def route(self, prefix: str, handler: Callable[[HttpRequest, asyncio.StreamWriter], Awaitable]):
+        """Yo'l prefiksi uchun handler qo'shish"""
+        self._routes.append((prefix, handler))
+    
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"🌐 HTTP server ishga tushdi: {self.host}:{self.port}")
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=30)
+            if len(head) > self.MAX_HEADER_SIZE:
+                raise ValueError("Sarlavhalar juda katta")
+            
+            lines = head.decode('latin-1').split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            
+            request = HttpRequest(method.upper(), urllib.parse.unquote(target.split('?', 1)[0]), headers)
+            for prefix, handler in self._routes:
+                if request.path.startswith(prefix):
+                    await handler(request, writer)
+                    break
+            else:
+                await self.send_response(writer, 404, b"Not Found")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.error(f"HTTP so'rov xatosi: {e}")
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    @staticmethod
+    async def send_response(writer: asyncio.StreamWriter, status: int, body: bytes = b"",
+                            headers: Dict[str, str] = None, head_only: bool = False):
+        """Oddiy javob yuborish"""
+        reason = http.HTTPStatus(status).phrase
+        all_headers = {'Content-Length': str(len(body)), 'Connection': 'close'}
+        all_headers.update(headers or {})
+        lines = [f"HTTP/1.1 {status} {reason}"] + [f"{k}: {v}" for k, v in all_headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        if body and not head_only:
+            writer.write(body)
+        await writer.drain()
+    
+    @staticmethod
+    def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+        """'bytes=a-b' sarlavhasini (boshi, oxiri) ga aylantirish. Noto'g'ri bo'lsa None"""
+        if not header.startswith('bytes=') or ',' in header:
+            return None
+        start_text, _, end_text = header[6:].strip().partition('-')
+        if not start_text:
+            # Oxirgi N bayt
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if start >= size or end < start:
+            return None
+        return start, min(end, size - 1)
+    
+    @staticmethod
+    async def send_file(request: HttpRequest, writer: asyncio.StreamWriter,
+                        file_path: str, file_name: str):
+        """Faylni Range so'rovlarini qo'llab-quvvatlagan holda bo'laklab yuborish"""
+        size = os.path.getsize(file_path)
+        head_only = request.method == 'HEAD'
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Type': mimetypes.guess_type(file_name)[0] or 'application/octet-stream',
+            'Content-Disposition': f"attachment; filename*=UTF-8''{urllib.parse.quote(file_name)}",
+        }
+        
+        status, start, end = 200, 0, size - 1
+        range_header = request.headers.get('range')
+        if range_header:
+            try:
+                byte_range = HttpServer.parse_range(range_header, size)
+            except ValueError:
+                byte_range = None
+            if byte_range is None:
+                headers['Content-Range'] = f"bytes */{size}"
+                await HttpServer.send_response(writer, 416, headers=headers)
+                return
+            status, (start, end) = 206, byte_range
+            headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        
+        length = end - start + 1 if size else 0
+        headers['Content-Length'] = str(length)
+        reason = http.HTTPStatus(status).phrase
+        lines = [f"HTTP/1.1 {status} {reason}", "Connection: close"] + [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        if head_only or not length:
+            return
+        
+        # Nol nusxali yuborish (mavjud bo'lmasa asyncio o'zi bo'laklab o'qiydi)
+        loop = asyncio.get_running_loop()
+        with open(file_path, 'rb') as f:
+            await loop.sendfile(writer.transport, f, offset=start, count=length)
+
+class DownloadLinks:
+    """Telegram orqali yuborib bo'lmaydigan katta fayllar uchun vaqtinchalik havolalar"""
+    
+    def __init__(self, folder: str = None):
+        self.folder = folder or Config.DOWNLOAD_FOLDER
+        self._files: Dict[str, str] = {}
+    
+    def load(self):
+        """Mavjud fayllarni indeksga o'qish (nomi: <token>_<fayl nomi>)"""
+        os.makedirs(self.folder, exist_ok=True)
+        for entry in os.scandir(self.folder):
+            token, sep, _ = entry.name.partition('_')
+            if sep and entry.is_file():
+                self._files[token] = entry.path
+    
+    def create(self, file_path: str, file_name: str) -> str:
+        """Faylni havola papkasiga joylashtirish va tokenni qaytarish"""
+        token = secrets.token_hex(16)
+        safe_name = os.path.basename(file_name).replace('/', '_') or 'file'
+        path = os.path.join(self.folder, f"{token}_{safe_name}")
+        link_or_copy(file_path, path)
+        self._files[token] = path
+        return token
+    
+    def url(self, token: str) -> str:
+        file_name = os.path.basename(self._files[token]).split('_', 1)[1]
+        return f"{Config.PUBLIC_BASE_URL.rstrip('/')}/d/{token}/{urllib.parse.quote(file_name)}"
+    
+    def resolve(self, token: str) -> Optional[str]:
+        path = self._files.get(token)
+        if path is None or not os.path.exists(path):
+            self._files.pop(token, None)
+            return None
+        return path
+    
+    def forget(self, path: str):
+        token = os.path.basename(path).split('_', 1)[0]
+        self._files.pop(token, None)
+    
+    async def handle(self, request: HttpRequest, writer: asyncio.StreamWriter):
+        """GET/HEAD /d/<token>/<fayl nomi>"""
+        if request.method not in ('GET', 'HEAD'):
+            await HttpServer.send_response(writer, 405, b"Method Not Allowed")
+            return
+        parts = request.path.split('/')
+        path = self.resolve(parts[2]) if len(parts) > 2 else None
+        if path is None:
+            await HttpServer.send_response(writer, 404, b"Not Found", head_only=request.method == 'HEAD')
+            return
+        file_name = os.path.basename(path).split('_', 1)[1]
+        await HttpServer.send_file(request, writer, path, file_name)
+
+# ==================== MEDIA GURUHLAR (ALBOMLAR) ====================
+class MediaGroupCollector:
+    """Albom xabarlarini media_group_id bo'yicha bitta guruhga yig'ish.
+    
+    Telegram albomning har bir faylini alohida update sifatida yuboradi. Guruhdagi barcha yuklashlar
+    tugagach Config.MEDIA_GROUP_WINDOW soniya ichida yangi xabar kelmasa guruh yopiladi.
+    """
+    
+    def __init__(self, on_complete: Callable[[Dict], Awaitable], window: float = None):
+        self.on_complete = on_complete
+        self.window = window if window is not None else Config.MEDIA_GROUP_WINDOW
+        self._groups: Dict[str, Dict] = {}
+    
+    def expect(self, group_id: str, chat_id: int, user_id: int) -> bool:
+        """Guruhning yangi fayli yuklanmoqda. Guruhdagi birinchi xabar bo'lsa True"""
+        group = self._groups.get(group_id)
+        created = group is None
+        if created:
+            group = self._groups[group_id] = {
+                'group_id': group_id,
+                'chat_id': chat_id,
+                'user_id': user_id,
+                'status_msg': None,
+                'items': [],
+                'pending': 0,
+                'timer': None,
+            }
+        group['pending'] += 1
+        if group['timer'] is not None:
+            group['timer'].cancel()
+            group['timer'] = None
+        return created
+    
+    def set_status(self, group_id: str, message):
+        if group_id in self._groups:
+            self._groups[group_id]['status_msg'] = message
+    
+    def add(self, group_id: str, message_id: int, file_id: str):
+        """Fayl yuklandi va ro'yxatga olindi"""
+        self._groups[group_id]['items'].append((message_id, file_id))
+        self._finished(group_id)
+    
+    def discard(self, group_id: str):
+        """Fayl yuklanmadi (xato) - guruh qolgan fayllar bilan davom etadi"""
+        self._finished(group_id)
+    
+    def _finished(self, group_id: str):
+        group = self._groups[group_id]
+        group['pending'] -= 1
+        if group['pending'] == 0:
+            group['timer'] = asyncio.create_task(self._close_after(group_id))
+    
+    async def _close_after(self, group_id: str):
+        await asyncio.sleep(self.window)
+        group = self._groups.pop(group_id)
+        try:
+            await self.on_complete(group)
+        except Exception as e:
+            logger.error(f"Albomni yakunlash xatosi: {e}")
+
+# ==================== MUDDATLAR INDEKSI ====================
+def remove_path(path: str):
+    """Fayl yoki papkani o'chirish (allaqachon yo'q bo'lsa xato emas)"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+class ExpiryIndex:
+    """Muddati tugaydigan fayl va yozuvlar indeksi (muddat bo'yicha min-heap).
+    
+    Yozuv yaratilganda qo'shiladi; fon vazifasi eng yaqin muddatgacha uxlaydi va faqat muddati o'tganlarini
+    o'chiradi. Disk band ulushi Config.DISK_HIGH_WATERMARK dan oshsa eng eskilari muddatidan oldin o'chiriladi.
+    """
+    
+    def __init__(self, handlers: Dict[str, Callable[[str], Awaitable]],
+                 on_disk_pressure: Optional[Callable[[int], Awaitable]] = None, ttl: float = None):
+        self.handlers = handlers  # tur -> o'chiruvchi
+        self.on_disk_pressure = on_disk_pressure
+        self.ttl = ttl if ttl is not None else Config.CLEANUP_HOURS * 3600
+        self._heap: List[Tuple[float, str, str]] = []
+        # Haqiqiy muddatlar: qayta rejalangan yoki bekor qilingan yozuvning eski heap elementi e'tiborsiz qoldiriladi
+        self._deadlines: Dict[Tuple[str, str], float] = {}
+        self._wakeup = asyncio.Event()
+    
+    def __len__(self) -> int:
+        return len(self._deadlines)
+    
+    def schedule(self, kind: str, key: str, created: Optional[float] = None):
+        """Yozuvni yaratilgan vaqtidan ttl o'tib o'chirishga rejalash"""
+        deadline = (created if created is not None else time.time()) + self.ttl
+        self._deadlines[(kind, key)] = deadline
+        heapq.heappush(self._heap, (deadline, kind, key))
+        if self._heap[0][0] == deadline:
+            self._wakeup.set()
+    
+    def discard(self, kind: str, key: str):
+        self._deadlines.pop((kind, key), None)
+    
+    def _pop(self, before: Optional[float] = None) -> Optional[Tuple[str, str]]:
+        """Eng eski amaldagi yozuvni olish (before berilsa - faqat muddati o'tgan bo'lsa)"""
+        while self._heap and (before is None or self._heap[0][0] <= before):
+            deadline, kind, key = heapq.heappop(self._heap)
+            if self._deadlines.get((kind, key)) == deadline:
+                del self._deadlines[(kind, key)]
+                return kind, key
+        return None
+    
+    async def _expire(self, kind: str, key: str):
+        try:
+            await self.handlers[kind](key)
+        except Exception as e:
+            logger.error(f"Tozalash xatosi ({kind} {key}): {e}")
+    
+    async def run(self):
+        """Fon vazifasi: muddatlar va disk chegarasi"""
+        next_disk_check = 0.0
+        while True:
+            expired = 0
+            while (entry := self._pop(time.time())) is not None:
+                await self._expire(*entry)
+                expired += 1
+            if expired:
+                logger.info(f"🧹 Muddati o'tgan {expired} ta yozuv tozalandi")
             
-            # Boshqa fayllar uchun oddiy nusxa
-            shutil.copy(input_path, output_path)
-            return True, "Fayl nusxalandi (Siqish amalga oshirilmadi)"
+            if time.monotonic() >= next_disk_check:
+                try:
+                    await self.enforce_disk_limit()
+                except Exception as e:
+                    logger.error(f"Disk hajmini tekshirish xatosi: {e}")
+                next_disk_check = time.monotonic() + Config.DISK_CHECK_INTERVAL
             
-        except Exception as e:
-            logger.error(f"Siqish xatosi: {e}")
-            return False, str(e)
+            timeout = max(0.0, next_disk_check - time.monotonic())
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def enforce_disk_limit(self):
+        """Disk yuqori chegaradan oshgan bo'lsa avval keshni, so'ng eng eski yozuvlarni o'chirish"""
+        usage = await executor.run_io(shutil.disk_usage, Config.UPLOAD_FOLDER)
+        if usage.used < usage.total * Config.DISK_HIGH_WATERMARK:
+            return
+        
+        target = usage.total * Config.DISK_LOW_WATERMARK
+        logger.warning(f"💽 Disk {usage.used / usage.total:.0%} band - eski fayllar o'chirilmoqda")
+        if self.on_disk_pressure:
+            await self.on_disk_pressure(int(usage.used - target))
+        
+        evicted = 0
+        while usage.used > target:
+            entry = self._pop()
+            if entry is None:
+                break
+            await self._expire(*entry)
+            evicted += 1
+            usage = await executor.run_io(shutil.disk_usage, Config.UPLOAD_FOLDER)
+        if evicted:
+            logger.warning(f"💽 Disk uchun {evicted} ta yozuv muddatidan oldin o'chirildi")
 
 # ==================== BOT HANDLERLARI ====================
 class FileConvertBot:
+    # Faqat handlerlar ishlatadigan yangilanish turlari
+    ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+    
+    # Sozlama tugmalari: callback prefiksi → sozlama nomi
+    SETTING_CALLBACKS = {
+        'qual': 'image_quality',
+        'resize': 'resize_percent',
+        'abr': 'audio_bitrate',
+        'asr': 'audio_sample_rate',
+        'dpi': 'pdf_dpi',
+        'pdfout': 'pdf_output',
+        'ctgt': 'compress_target',
+        'strip': 'strip_metadata',
+    }
+    
     def __init__(self):
         self.app = None
-        self.active_conversions = {}
-        self.user_files = {}
-        self.user_settings = {}
+        self.active_conversions: Dict[str, ConversionJob] = {}
+        self.scheduler = JobScheduler()
+        self.result_cache = ResultCache()
+        self.sent_files = SentFileIndex()
+        self.upload_store = UploadStore()
+        self.backend = QueueBackend() if Config.JOB_QUEUE_MODE == 'queue' else LocalBackend()
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.http_server = HttpServer()
+        self.metrics_server: Optional[HttpServer] = None
+        self.download_links = DownloadLinks()
+        self.state_store = StateStore()
+        self.user_files = StoredMapping(self.state_store, 'files', created_field='upload_time')
+        self.user_settings = StoredMapping(self.state_store, 'settings', key_type=int)
+        self.media_batches = StoredMapping(self.state_store, 'batches', created_field='created')
+        self.media_groups = MediaGroupCollector(self.finish_media_group)
+        self.expiry = ExpiryIndex({
+            'file': self.expire_file,
+            'batch': self.expire_batch,
+            'download': self.expire_download,
+            'path': self.expire_path,
+        }, on_disk_pressure=self.relieve_disk_pressure)
+        self.cleanup_task: Optional[asyncio.Task] = None
+        self.lag_task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+        metrics.gauge('converter_queue_depth', "Navbatda kutayotgan vazifalar", callback=lambda: self.scheduler.queued)
+        metrics.gauge('converter_jobs_active', "Bajarilayotgan vazifalar", callback=lambda: self.scheduler.active)
         
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start komandasi"""
@@ -440,6 +4558,7 @@ class FileConvertBot:
 • Rasm → PDF konvertatsiyasi
 • PDF → Rasm konvertatsiyasi
 • Fayl siqish
+• Albom (bir nechta rasm) → bitta PDF yoki ZIP
 
 ⚙️ *Qo'shimcha:*
 • Maksimal fayl hajmi: 2GB
@@ -452,6 +4571,7 @@ class FileConvertBot:
 /help - Yordam
 /formats - Barcha formatlar
 /settings - Sozlamalar
+/pages - PDF sahifalarini tanlash
 
 📎 *Faylni yuboring va kerakli formatni tanlang!*
 """
@@ -469,6 +4589,26 @@ class FileConvertBot:
             reply_markup=keyboard
         )
     
+    async def pages_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """PDF → rasm uchun sahifa oralig'ini o'rnatish"""
+        user_id = update.effective_user.id
+        spec = ''.join(context.args).strip().lower() or 'all'
+        try:
+            # Faqat sintaksisni tekshirish, sahifalar soni hujjat ochilganda ma'lum bo'ladi
+            parse_page_range(spec, 10 ** 4)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}\n\nMisol: /pages 1-5,8,10-  yoki  /pages all")
+            return
+        
+        settings = dict(self.user_settings.get(user_id, {}))
+        settings['pdf_pages'] = spec
+        self.user_settings[user_id] = settings
+        
+        await update.message.reply_text(
+            "✅ Barcha sahifalar konvertatsiya qilinadi." if spec == 'all'
+            else f"✅ PDF sahifalari: {spec}"
+        )
+    
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Help komandasi"""
         help_text = """
@@ -511,6 +4651,7 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
     
     async def handle_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Fayl yuborilganda"""
+        group_id = None
         try:
             message = update.message
             user_id = message.from_user.id
@@ -541,11 +4682,12 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                 return
             
             # Fayl hajmini tekshirish
-            if file_size > Config.MAX_FILE_SIZE:
+            download_limit = get_download_limit()
+            if file_size > download_limit:
                 await message.reply_text(
                     f"❌ Fayl hajmi juda katta!\n"
                     f"📊 Sizning faylingiz: {human_readable_size(file_size)}\n"
-                    f"📈 Maksimal: {human_readable_size(Config.MAX_FILE_SIZE)}"
+                    f"📈 Maksimal: {human_readable_size(download_limit)}"
                 )
                 return
             
@@ -558,34 +4700,55 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                 )
                 return
             
-            # Yuklash jarayoni
-            status_msg = await message.reply_text(
-                f"📥 *Fayl yuklanmoqda...*\n"
-                f"📊 Hajmi: {human_readable_size(file_size)}\n"
-                f"📎 Format: {file_ext.upper()}"
-            )
+            # Albom fayllari bitta guruhga yig'iladi - har biriga alohida xabar yuborilmaydi
+            if message.media_group_id:
+                group_id = message.media_group_id
+                if self.media_groups.expect(group_id, message.chat_id, user_id):
+                    self.media_groups.set_status(group_id, await message.reply_text("📥 Albom qabul qilinmoqda..."))
+            else:
+                # Yuklash jarayoni
+                status_msg = await message.reply_text(
+                    f"📥 *Fayl yuklanmoqda...*\n"
+                    f"📊 Hajmi: {human_readable_size(file_size)}\n"
+                    f"📎 Format: {file_ext.upper()}"
+                )
             
             # Fayl ID yaratish
             file_id = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hashlib.md5(file_name.encode()).hexdigest()[:8]}"
-            input_path = os.path.join(Config.UPLOAD_FOLDER, f"{file_id}.{file_ext}")
             
-            # Faylni yuklash
-            file = await file_obj.get_file()
-            await file.download_to_drive(input_path)
+            # Faylni yuklash (avval yuklangan bo'lsa qayta ishlatiladi)
+            async def download(path: str):
+                started = time.monotonic()
+                success = False
+                try:
+                    await self.download_file(file_obj, path)
+                    success = True
+                finally:
+                    metrics.observe_stage('download', time.monotonic() - started, file_ext, '',
+                                          get_file_type(file_ext), success)
+                metrics.bytes_total.inc(file_size, direction='in', format=file_ext)
+            
+            input_path, reused = await self.upload_store.acquire(
+                file_obj.file_unique_id, file_ext, download
+            )
+            if reused:
+                logger.info(f"♻️ Fayl qayta ishlatildi (yuklashsiz): {file_obj.file_unique_id}")
             
-            # Fayl ma'lumotlari
-            file_info = get_file_info(input_path)
+            # Fayl ma'lumotlari (rasm sarlavhasi shu yerda bir marta o'qiladi)
+            file_info = await executor.run_io(get_file_info, input_path)
             
             # Foydalanuvchi ma'lumotlarini saqlash
             self.user_files[file_id] = {
                 'user_id': user_id,
                 'input_path': input_path,
+                'file_unique_id': file_obj.file_unique_id,
                 'original_name': file_name,
                 'extension': file_ext,
                 'size': file_size,
                 'info': file_info,
                 'upload_time': datetime.now()
             }
+            self.expiry.schedule('file', file_id)
             
             # Boshlang'ich sozlamalar
             if user_id not in self.user_settings:
@@ -594,53 +4757,113 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                     'resize_percent': '100'
                 }
             
-            # Format tanlash tugmachasini yuborish
-            keyboard = create_format_keyboard(file_ext, file_id, self.user_settings.get(user_id, {}))
+            if group_id:
+                self.media_groups.add(group_id, message.message_id, file_id)
+                return
             
-            if keyboard:
-                info_text = f"""
-✅ *Fayl muvaffaqiyatli yuklandi!*
-
-📄 *Ma'lumotlar:*
-• 🏷️ Nomi: `{file_name}`
-• 📊 Hajmi: {file_info.get('size', 'Noma\'lum')}
-• 📎 Format: {file_ext.upper()}
-• 🗂️ Turi: {file_info.get('type', 'Noma\'lum').title()}
-
-"""
-                
-                if 'dimensions' in file_info:
-                    info_text += f"• 📐 O'lchamlari: {file_info['dimensions']}\n"
-                
-                info_text += f"\n⬇️ *Quyidagi formatlardan birini tanlang:*"
-                
-                await status_msg.edit_text(
-                    info_text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=keyboard
-                )
-            else:
-                await status_msg.edit_text(
-                    f"⚠️ *Diqqat!*\n\n"
-                    f"Fayl formati: {file_ext.upper()}\n"
-                    f"Ushbu formatdan konvertatsiya qilish imkoni hozircha mavjud emas.\n\n"
-                    f"✅ Qo'llab-quvvatlanadigan formatlar: /formats"
-                )
+            # Format tanlash tugmachasini yuborish
+            text, keyboard = self.file_keyboard_message(file_id)
+            await status_msg.edit_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
                 
         except Exception as e:
             logger.error(f"Fayl qabul qilish xatosi: {e}")
+            if group_id:
+                self.media_groups.discard(group_id)
             await update.message.reply_text(
                 f"❌ Xatolik yuz berdi: {str(e)[:200]}\n"
                 f"Iltimos, qayta urinib ko'ring yoki /start ni bosing."
             )
     
+    def file_keyboard_message(self, file_id: str) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Yuklangan fayl haqida matn va format tanlash tugmalari"""
+        file_data = self.user_files[file_id]
+        file_ext = file_data['extension']
+        file_info = file_data['info']
+        keyboard = create_format_keyboard(file_ext, file_id, self.user_settings.get(file_data['user_id'], {}),
+                                          file_data['size'], file_info.get('animated', False))
+        
+        if not keyboard:
+            return (
+                f"⚠️ *Diqqat!*\n\n"
+                f"Fayl formati: {file_ext.upper()}\n"
+                f"Ushbu formatdan konvertatsiya qilish imkoni hozircha mavjud emas.\n\n"
+                f"✅ Qo'llab-quvvatlanadigan formatlar: /formats"
+            ), None
+        
+        info_text = f"""
+✅ *Fayl muvaffaqiyatli yuklandi!*
+
+📄 *Ma'lumotlar:*
+• 🏷️ Nomi: `{file_data['original_name']}`
+• 📊 Hajmi: {file_info.get('size', "Noma'lum")}
+• 📎 Format: {file_ext.upper()}
+• 🗂️ Turi: {file_info.get('type', "Noma'lum").title()}
+
+"""
+        
+        if 'dimensions' in file_info:
+            info_text += f"• 📐 O'lchamlari: {file_info['dimensions']}\n"
+        
+        info_text += "\n⬇️ *Quyidagi formatlardan birini tanlang:*"
+        return info_text, keyboard
+    
+    async def finish_media_group(self, group: Dict):
+        """Albom yig'ilgach bitta xabar: butun to'plam uchun formatlar (bitta fayl bo'lsa - oddiy tanlov)"""
+        file_ids = [file_id for _, file_id in sorted(group['items'])]
+        status_msg = group['status_msg']
+        if status_msg is None:
+            status_msg = await self.app.bot.send_message(group['chat_id'], "📥 Albom qabul qilinmoqda...")
+        
+        if not file_ids:
+            await status_msg.edit_text("❌ Albom fayllarini yuklab bo'lmadi. Iltimos, qayta yuboring.")
+            return
+        
+        if len(file_ids) == 1:
+            text, keyboard = self.file_keyboard_message(file_ids[0])
+            await status_msg.edit_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
+            return
+        
+        batch_id = f"g{group['group_id']}"
+        self.media_batches[batch_id] = {
+            'user_id': group['user_id'],
+            'file_ids': file_ids,
+            'created': datetime.now(),
+        }
+        self.expiry.schedule('batch', batch_id)
+        files = [self.user_files[file_id] for file_id in file_ids]
+        names = "\n".join(f"• `{data['original_name']}`" for data in files)
+        await status_msg.edit_text(
+            f"📚 *Albom qabul qilindi!*\n\n"
+            f"📎 Fayllar: {len(files)} ta\n"
+            f"📊 Jami hajmi: {human_readable_size(sum(data['size'] for data in files))}\n\n"
+            f"{names}\n\n"
+            f"⬇️ *Barchasini bitta faylga aylantirish:*",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=create_batch_keyboard(batch_id, [data['extension'] for data in files])
+        )
+    
+    async def download_file(self, file_obj, dest_path: str):
+        """Faylni xotiraga to'liq o'qimasdan bo'laklab yuklab olish"""
+        tg_file = await file_obj.get_file()
+        source = tg_file.file_path
+        
+        # Mahalliy Bot API server faylni o'z diskida saqlaydi - tarmoqsiz olish
+        if Config.BOT_API_LOCAL_MODE and os.path.isabs(source) and os.path.exists(source):
+            await executor.run_io(link_or_copy, source, dest_path)
+            return
+        
+        async with self.http_client.stream('GET', source) as response:
+            response.raise_for_status()
+            with open(dest_path, 'wb') as f:
+                async for chunk in response.aiter_bytes(Config.STREAM_CHUNK_SIZE):
+                    await executor.run_io(f.write, chunk)
+    
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Inline tugmalar bosilganda"""
         query = update.callback_query
         await query.answer()
         
         data = query.data
-        user_id = query.from_user.id
         
         # Konvertatsiya boshlash
         if data.startswith('conv:'):
@@ -650,8 +4873,33 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                 await query.edit_message_text("❌ Fayl topilmadi. Iltimos, qayta yuboring.")
                 return
             
-            # Konvertatsiya boshlash
-            await self.start_conversion(query, file_id, target_format)
+            # Konvertatsiyani navbatga qo'yish
+            await self.enqueue_conversion(query, file_id, target_format)
+        
+        # Siqish
+        elif data.startswith('comp:'):
+            _, file_id = data.split(':')
+            
+            if file_id not in self.user_files:
+                await query.edit_message_text("❌ Fayl topilmadi. Iltimos, qayta yuboring.")
+                return
+            
+            target_format = compress_target_format(self.user_files[file_id]['extension'])
+            await self.enqueue_conversion(query, file_id, target_format, compress=True)
+        
+        # Albom: bitta natija yoki har bir fayl alohida
+        elif data.startswith('batch:'):
+            _, batch_id, target = data.split(':')
+            
+            if batch_id not in self.media_batches:
+                await query.edit_message_text("❌ Albom topilmadi. Iltimos, qayta yuboring.")
+                return
+            
+            await self.enqueue_batch(query, batch_id, target)
+        
+        elif data.startswith('split:'):
+            _, batch_id = data.split(':')
+            await self.split_batch(query, batch_id)
         
         # Sozlamalar
         elif data.startswith('set:'):
@@ -663,8 +4911,13 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
             _, file_id = data.split(':')
             await self.show_file_info(query, file_id)
         
+        # Sozlamani o'zgartirish
+        elif data.split(':', 1)[0] in self.SETTING_CALLBACKS:
+            key, file_id, value = data.split(':')
+            await self.update_setting(query, file_id, key, value)
+        
         # Orqaga qaytish
-        elif data.startswith('back:'):
+        elif data.startswith(('back:', 'save:')):
             _, file_id = data.split(':')
             await self.back_to_formats(query, file_id)
         
@@ -676,93 +4929,313 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
         elif data == 'main_menu':
             await self.show_main_menu(query)
     
-    async def start_conversion(self, query, file_id: str, target_format: str):
-        """Konvertatsiyani boshlash"""
+    async def enqueue_conversion(self, query, file_id: str, target_format: str, compress: bool = False):
+        """Konvertatsiyani (yoki siqishni) rejalashtiruvchi navbatiga qo'yish"""
+        file_data = self.user_files[file_id]
+        await self.schedule_job(
+            query, f"{file_id}:{target_format}{':comp' if compress else ''}", file_data['user_id'],
+            file_data['original_name'], target_format,
+            lambda: self.start_conversion(query, file_id, target_format, compress=compress),
+            source=file_data['extension'],
+            engine='compress' if compress else get_file_type(file_data['extension'])
+        )
+    
+    async def schedule_job(self, query, job_id: str, user_id: int, label: str, target_format: str,
+                           start: Callable[[], Awaitable], source: str = '', engine: str = ''):
+        """Vazifani rejalashtiruvchi navbatiga qo'yish va navbatdagi o'rnini ko'rsatish"""
+        if job_id in self.active_conversions:
+            await query.message.reply_text("⏳ Bu konvertatsiya allaqachon navbatda!")
+            return
+        
+        async def run():
+            metrics.observe_stage('queue', time.monotonic() - job.enqueued_at, source, target_format, engine)
+            try:
+                await start()
+            finally:
+                self.active_conversions.pop(job_id, None)
+        
+        async def on_position(position: int):
+            try:
+                await query.edit_message_text(
+                    f"⏳ *Navbatda...*\n\n"
+                    f"📤 Kirish: `{label}`\n"
+                    f"🎯 Format: {target_format.upper()}\n\n"
+                    f"🔢 Navbatdagi o'rningiz: {position}",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except Exception as e:
+                logger.debug(f"Navbat xabarini yangilab bo'lmadi: {e}")
+        
+        job = ConversionJob(job_id, user_id, run, on_position)
+        try:
+            self.scheduler.submit(job)
+        except OverflowError:
+            await query.message.reply_text(
+                f"❌ Navbatda juda ko'p vazifangiz bor (maksimal {Config.MAX_QUEUED_PER_USER} ta)"
+            )
+            return
+        except RuntimeError:
+            await query.message.reply_text(
+                "🔄 Bot qayta ishga tushirilmoqda. Iltimos, birozdan keyin urinib ko'ring."
+            )
+            return
+        
+        # Navbatdagi o'rni haqidagi xabarni rejalashtiruvchi o'zi yuboradi
+        self.active_conversions[job_id] = job
+    
+    async def enqueue_batch(self, query, batch_id: str, target: str):
+        """Albomni bitta natijaga aylantirishni navbatga qo'yish"""
+        batch = self.media_batches[batch_id]
+        await self.schedule_job(
+            query, f"{batch_id}:{target}", batch['user_id'], f"{len(batch['file_ids'])} ta fayl", target,
+            lambda: self.start_batch(query, batch_id, target),
+            source='album', engine='batch'
+        )
+    
+    async def start_batch(self, query, batch_id: str, target: str):
+        """Albom fayllarini parallel kodlab bitta PDF/ZIP qilib yuborish"""
+        workspace = None
+        try:
+            batch = self.media_batches[batch_id]
+            files = [self.user_files[file_id] for file_id in batch['file_ids'] if file_id in self.user_files]
+            if not files:
+                await query.edit_message_text("❌ Albom fayllari topilmadi. Iltimos, qayta yuboring.")
+                return
+            
+            settings = self.user_settings.get(batch['user_id'], {})
+            chat_id = query.message.chat_id
+            output_ext = 'pdf' if target == 'pdf' else 'zip'
+            output_name = f"album_{len(files)}_{target}.{output_ext}"
+            workspace = await JobWorkspace(prefix='batch_', size_hint=sum(data['size'] for data in files)).open()
+            output_path = workspace.path(output_name)
+            
+            progress_header = (
+                f"🔄 *Albom konvertatsiya qilinmoqda...*\n\n"
+                f"📎 Fayllar: {len(files)} ta\n"
+                f"📥 Chiqish: `{output_name}`"
+            )
+            progress_msg = await query.edit_message_text(
+                f"{progress_header}\n\n"
+                f"⏳ Jarayon: 0%\n"
+                f"░░░░░░░░░░"
+            )
+            reporter = ProgressReporter(progress_msg, progress_header)
+            
+            try:
+                if target == 'zip':
+                    entries = [(data['input_path'], data['original_name']) for data in files]
+                    success, message = await executor.run_cpu(write_batch_zip, entries, output_path,
+                                                              progress=reporter.update)
+                else:
+                    success, message = await self.encode_batch(files, target, settings, workspace.dir, output_path,
+                                                               reporter.update)
+            finally:
+                await reporter.close()
+            
+            if not success or not os.path.exists(output_path):
+                await progress_msg.edit_text(
+                    f"❌ *Albom konvertatsiyasi muvaffaqiyatsiz tugadi!*\n\n"
+                    f"⚠️ Xato: {message[:300]}"
+                )
+                return
+            output_path = await workspace.publish(output_path)
+            
+            await progress_msg.edit_text(
+                f"✅ *Albom tayyor!*\n\n"
+                f"📎 {len(files)} ta fayl → {BATCH_TARGET_LABELS[target]}\n"
+                f"📊 Hajmi: {human_readable_size(os.path.getsize(output_path))}\n\n"
+                f"📤 Yuklab olinmoqda..."
+            )
+            await self.send_converted_file(chat_id, output_path, output_name, output_ext, 'albom')
+            
+        except Exception as e:
+            logger.error(f"Albom konvertatsiya xatosi: {e}")
+            await query.edit_message_text(
+                f"❌ *Kutilmagan xatolik yuz berdi!*\n\n"
+                f"```{str(e)[:500]}```\n\n"
+                f"Iltimos, qayta urinib ko'ring."
+            )
+        finally:
+            if workspace is not None:
+                await workspace.close()
+    
+    async def encode_batch(self, files: List[Dict], target: str, settings: Dict, work_dir: str,
+                           output_path: str, progress: Callable) -> Tuple[bool, str]:
+        """Har bir rasm backend orqali parallel kodlanadi, so'ng bitta PDF yoki ZIP ga yig'iladi"""
+        resize_percent = int(settings.get('resize_percent', 100))
+        done = 0
+        
+        def page_format(data: Dict) -> str:
+            if target != 'pdf':
+                return target
+            # PDF sahifalari: JPEG o'zicha, qolganlari yo'qotishsiz PNG (alfa kanal saqlanadi)
+            return 'jpg' if data['extension'] in ('jpg', 'jpeg') else 'png'
+        
+        async def encode(index: int, data: Dict) -> str:
+            nonlocal done
+            fmt = page_format(data)
+            # PDF ichiga JPEG va PNG qayta kodlanmasdan joylanadi
+            if target == 'pdf' and ConversionPlanner.canonical(data['extension']) == fmt and resize_percent == 100:
+                path = data['input_path']
+            else:
+                path = os.path.join(work_dir, f"{index:04d}.{fmt}")
+                success, message = await self.backend.convert(
+                    'image', data['input_path'], path, fmt, settings
+                )
+                if not success:
+                    raise RuntimeError(f"{data['original_name']}: {message}")
+            done += 1
+            progress(done, len(files), 'entries')
+            return path
+        
+        results = await asyncio.gather(
+            *(encode(index, data) for index, data in enumerate(files)), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            return False, str(errors[0])
+        
+        if target == 'pdf':
+            return await executor.run_cpu(_images_to_pdf_sync, results, output_path, progress=progress)
+        
+        entries = [
+            (path, f"{data['original_name'].rsplit('.', 1)[0]}.{page_format(data)}")
+            for path, data in zip(results, files)
+        ]
+        return await executor.run_cpu(write_batch_zip, entries, output_path, progress=progress)
+    
+    async def start_conversion(self, query, file_id: str, target_format: str, compress: bool = False):
+        """Konvertatsiyani boshlash (compress=True - rasmni sozlamalardagi hajmga siqish)"""
+        workspace = None
         try:
             file_data = self.user_files[file_id]
             input_path = file_data['input_path']
             original_name = file_data['original_name']
             original_ext = file_data['extension']
             user_id = file_data['user_id']
+            settings = self.user_settings.get(user_id, {})
+            chat_id = query.message.chat_id
             
             # Output fayl nomi
             base_name = original_name.rsplit('.', 1)[0]
-            output_name = f"{base_name}_converted.{target_format}"
-            output_path = os.path.join(Config.OUTPUT_FOLDER, output_name)
+            output_name = f"{base_name}_{'compressed' if compress else 'converted'}.{target_format}"
             
-            # Progress bar yaratish
-            progress_msg = await query.edit_message_text(
-                f"🔄 *Konvertatsiya boshlanmoqda...*\n\n"
+            # Siqish natijasi shu formatdagi oddiy konvertatsiyadan farqli keshlanadi
+            result_key = f"{target_format}:compress" if compress else target_format
+            
+            # Avval yuborilgan natijani file_id orqali qayta yuborish
+            sent_key = None
+            if file_data.get('file_unique_id'):
+                sent_key = SentFileIndex.make_key(file_data['file_unique_id'], result_key, settings)
+                sent_entry = self.sent_files.get(sent_key)
+                metrics.cache_lookup('sent', sent_entry is not None)
+                if sent_entry and await self.send_cached_file(chat_id, sent_entry, target_format, original_ext):
+                    await query.edit_message_text(
+                        f"✅ *Konvertatsiya muvaffaqiyatli yakunlandi!*\n\n"
+                        f"📤 {original_ext.upper()} → {target_format.upper()}\n"
+                        f"📊 Hajmi: {human_readable_size(sent_entry['size'])}"
+                    )
+                    return
+                if sent_entry:
+                    self.sent_files.discard(sent_key)
+            
+            # Vazifaning alohida ish papkasi (bir xil nomli fayllarni konvertatsiya qilayotganlar to'qnashmaydi)
+            workspace = await JobWorkspace(size_hint=file_data['size']).open()
+            output_path = workspace.path(output_name)
+            
+            # Progress xabari
+            progress_header = (
+                f"🔄 *Konvertatsiya qilinmoqda...*\n\n"
                 f"📤 Kirish: `{original_name}`\n"
-                f"📥 Chiqish: `{output_name}`\n\n"
+                f"📥 Chiqish: `{output_name}`"
+            )
+            progress_msg = await query.edit_message_text(
+                f"{progress_header}\n\n"
                 f"⏳ Jarayon: 0%\n"
                 f"░░░░░░░░░░"
             )
+            reporter = ProgressReporter(progress_msg, progress_header)
             
             # Konvertatsiya jarayoni
             success = False
             error_message = ""
             
             # Fayl turi
-            file_type = get_file_type(original_ext)
-            settings = self.user_settings.get(user_id, {})
+            file_type = 'compress' if compress else get_file_type(original_ext)
+            
+            # Keshdan qidirish
+            if 'sha256' not in file_data:
+                file_data['sha256'] = await executor.run_io(hash_file, input_path)
+                self.user_files[file_id] = file_data
+            cache_key = ResultCache.make_key(file_data['sha256'], result_key, settings)
+            cached_path = await executor.run_io(self.result_cache.get, cache_key)
+            metrics.cache_lookup('result', cached_path is not None)
             
             # Konvertatsiya qilish
-            if file_type == 'image':
-                success, error_message = await Converter.convert_image(
-                    input_path, output_path, target_format, settings
-                )
-            elif file_type == 'document':
-                success, error_message = await Converter.convert_document(
-                    input_path, output_path, target_format, settings
-                )
-            elif file_type == 'audio':
-                success, error_message = await Converter.convert_audio(
-                    input_path, output_path, target_format, settings
-                )
-            elif file_type == 'video':
-                success, error_message = await Converter.convert_video(
-                    input_path, output_path, target_format, settings
-                )
-            elif file_type == 'archive':
-                success, error_message = await Converter.convert_archive(
-                    input_path, output_path, target_format
-                )
-            else:
-                error_message = "Noma'lum fayl turi"
+            try:
+                if cached_path:
+                    await executor.run_io(link_or_copy, cached_path, output_path)
+                    success, error_message = True, "Keshdan olindi"
+                    logger.info(f"🗃️ Kesh topildi: {original_ext} → {target_format}")
+                elif compress:
+                    success, error_message = await self.backend.convert(
+                        file_type, input_path, output_path, target_format, settings,
+                        progress=reporter.update
+                    )
+                else:
+                    # Kerak bo'lsa oraliq formatlar orqali (masalan DOCX → PDF → PNG)
+                    success, error_message = await conversion_planner.execute(
+                        self.backend, original_ext, target_format, input_path, output_path, settings,
+                        progress=reporter.update, work_dir=workspace.dir,
+                        animated=file_data['info'].get('animated', False)
+                    )
+            finally:
+                await reporter.close()
             
-            # Progress bar animatsiyasi
-            for i in range(1, 11):
-                await asyncio.sleep(0.5)
-                progress_text = f"🔄 *Konvertatsiya boshlanmoqda...*\n\n📤 Kirish: `{original_name}`\n📥 Chiqish: `{output_name}`\n\n⏳ Jarayon: {i*10}%\n"
-                progress_text += "".join(["▓" if j <= i else "░" for j in range(1, 11)])
-                await progress_msg.edit_text(progress_text)
+            # Faqat to'liq yozilgan natija chiqish papkasiga ko'chiriladi
+            if success and os.path.exists(output_path):
+                output_path = await workspace.publish(output_path)
+            
+            # Natijani keshga saqlash
+            if success and not cached_path and os.path.exists(output_path):
+                try:
+                    await executor.run_io(self.result_cache.put, cache_key, output_path)
+                except Exception as e:
+                    logger.warning(f"Natijani keshga saqlab bo'lmadi: {e}")
             
             # Natijani ko'rsatish
             if success and os.path.exists(output_path):
                 output_size = os.path.getsize(output_path)
+                # Ko'p sahifali PDF natijasi - sahifalar ZIP to'plami
+                bundle = await executor.run_io(is_page_bundle, output_path, target_format)
+                if bundle:
+                    output_name = f"{base_name}_{target_format}_pages.zip"
                 
                 await progress_msg.edit_text(
                     f"✅ *Konvertatsiya muvaffaqiyatli yakunlandi!*\n\n"
                     f"📤 {original_ext.upper()} → {target_format.upper()}\n"
-                    f"📊 Hajmi: {human_readable_size(output_size)}\n\n"
-                    f"📤 Yuklab olinmoqda..."
+                    f"📊 Hajmi: {human_readable_size(output_size)}\n"
+                    + (f"🗜️ {error_message}\n" if compress and not cached_path else "")
+                    + "\n📤 Yuklab olinmoqda..."
                 )
                 
                 # Faylni yuborish
-                await self.send_converted_file(
-                    query.message.chat_id,
-                    output_path,
-                    output_name,
-                    target_format,
-                    original_ext
-                )
+                if bundle and settings.get('pdf_output') == 'album':
+                    sent_message = await self.send_page_album(chat_id, output_path, output_name,
+                                                              original_ext, target_format)
+                else:
+                    sent_message = await self.send_converted_file(
+                        chat_id,
+                        output_path,
+                        output_name,
+                        'zip' if bundle else target_format,
+                        original_ext
+                    )
                 
-                # Tozalash
-                try:
-                    os.remove(output_path)
-                except:
-                    pass
+                # Keyingi so'rovlar uchun file_id ni eslab qolish
+                sent_media = extract_sent_media(sent_message)
+                if sent_key and sent_media:
+                    self.sent_files.put(sent_key, sent_media[0], sent_media[1], output_size)
                 
             else:
                 await progress_msg.edit_text(
@@ -783,6 +5256,9 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                 f"```{str(e)[:500]}```\n\n"
                 f"Iltimos, qayta urinib ko'ring."
             )
+        finally:
+            if workspace is not None:
+                await workspace.close()
     
     async def send_converted_file(self, chat_id: int, file_path: str, file_name: str, 
                                  target_format: str, original_format: str):
@@ -790,47 +5266,88 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
         try:
             file_size = os.path.getsize(file_path)
             
-            # Fayl hajmi cheklovi (Telegram uchun)
-            if file_size > 50 * 1024 * 1024:  # 50MB
-                await self.app.bot.send_message(
-                    chat_id,
+            # Fayl hajmi cheklovi (Bot API uchun)
+            upload_limit = get_upload_limit()
+            if file_size > upload_limit:
+                text = (
                     f"❌ Fayl hajmi juda katta ({human_readable_size(file_size)}).\n"
-                    f"Telegram 50MB dan katta fayllarni qabul qilmaydi.\n\n"
-                    f"📥 Yuklab olish uchun link: [Temporary]"
+                    f"Telegram {human_readable_size(upload_limit)} dan katta fayllarni qabul qilmaydi."
                 )
-                return
-            
-            # Faylni yuborish
-            with open(file_path, 'rb') as f:
-                if target_format in ['jpg', 'jpeg', 'png', 'webp', 'bmp', 'gif']:
-                    await self.app.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=f,
-                        caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
-                               f"📊 Hajmi: {human_readable_size(file_size)}"
-                    )
-                elif target_format in ['mp3', 'wav', 'ogg', 'm4a']:
-                    await self.app.bot.send_audio(
-                        chat_id=chat_id,
-                        audio=f,
-                        title=file_name,
-                        caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
-                               f"📊 Hajmi: {human_readable_size(file_size)}"
-                    )
-                elif target_format in ['mp4', 'avi', 'mov', 'mkv']:
-                    await self.app.bot.send_video(
-                        chat_id=chat_id,
-                        video=f,
-                        caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
-                               f"📊 Hajmi: {human_readable_size(file_size)}"
-                    )
-                else:
-                    await self.app.bot.send_document(
-                        chat_id=chat_id,
-                        document=f,
-                        caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
-                               f"📊 Hajmi: {human_readable_size(file_size)}"
+                if Config.HTTP_SERVER_PORT and Config.PUBLIC_BASE_URL:
+                    token = await executor.run_io(self.download_links.create, file_path, file_name)
+                    self.expiry.schedule('download', self.download_links.resolve(token))
+                    text += (
+                        f"\n\n📥 Yuklab olish uchun havola ({Config.CLEANUP_HOURS} soat amal qiladi):\n"
+                        f"{self.download_links.url(token)}"
                     )
+                await self.app.bot.send_message(chat_id, text)
+                return None
+            
+            # send_photo animatsiyani bitta kadrga aylantiradi
+            animated = target_format == 'webp' and await executor.run_io(is_animated_image, file_path)
+            
+            # Mahalliy Bot API server faylni diskdan o'zi o'qiydi (file://), aks holda yuklanadi
+            if Config.BOT_API_LOCAL_MODE:
+                source = contextlib.nullcontext(Path(os.path.abspath(file_path)))
+            else:
+                source = open(file_path, 'rb')
+            
+            # Faylni yuborish (nom file_name dan olinadi: sahifalar ZIP to'plami .jpg yo'lida turadi)
+            started = time.monotonic()
+            sent = None
+            try:
+                with source as f:
+                    if target_format == 'gif':
+                        sent = await self.app.bot.send_animation(
+                            chat_id=chat_id,
+                            animation=f,
+                            filename=file_name,
+                            caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
+                                   f"📊 Hajmi: {human_readable_size(file_size)}",
+                            write_timeout=Config.UPLOAD_TIMEOUT
+                        )
+                    elif target_format in ['jpg', 'jpeg', 'png', 'webp', 'bmp'] and not animated and file_size <= Config.PHOTO_UPLOAD_LIMIT:
+                        sent = await self.app.bot.send_photo(
+                            chat_id=chat_id,
+                            photo=f,
+                            filename=file_name,
+                            caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
+                                   f"📊 Hajmi: {human_readable_size(file_size)}",
+                            write_timeout=Config.UPLOAD_TIMEOUT
+                        )
+                    elif target_format in ['mp3', 'wav', 'ogg', 'm4a']:
+                        sent = await self.app.bot.send_audio(
+                            chat_id=chat_id,
+                            audio=f,
+                            filename=file_name,
+                            title=file_name,
+                            caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
+                                   f"📊 Hajmi: {human_readable_size(file_size)}",
+                            write_timeout=Config.UPLOAD_TIMEOUT
+                        )
+                    elif target_format in ['mp4', 'avi', 'mov', 'mkv']:
+                        sent = await self.app.bot.send_video(
+                            chat_id=chat_id,
+                            video=f,
+                            filename=file_name,
+                            caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
+                                   f"📊 Hajmi: {human_readable_size(file_size)}",
+                            write_timeout=Config.UPLOAD_TIMEOUT
+                        )
+                    else:
+                        sent = await self.app.bot.send_document(
+                            chat_id=chat_id,
+                            document=f,
+                            filename=file_name,
+                            caption=f"✅ {original_format.upper()} → {target_format.upper()}\n"
+                                   f"📊 Hajmi: {human_readable_size(file_size)}",
+                            write_timeout=Config.UPLOAD_TIMEOUT
+                        )
+            finally:
+                metrics.observe_stage('upload', time.monotonic() - started, original_format, target_format,
+                                      get_file_type(original_format), sent is not None)
+            metrics.bytes_total.inc(file_size, direction='out', format=target_format)
+            return sent
                     
         except Exception as e:
             logger.error(f"Fayl yuborish xatosi: {e}")
@@ -838,6 +5355,94 @@ Agar muammo davom etsa, admin bilan bog'laning: @Ibrohimjon_off
                 chat_id,
                 f"❌ Faylni yuborishda xatolik: {str(e)[:200]}"
             )
+            return None
+    
+    async def send_page_album(self, chat_id: int, bundle_path: str, bundle_name: str,
+                              original_format: str, target_format: str):
+        """Sahifalar to'plamini media guruhlar (albom) ko'rinishida yuborish"""
+        with zipfile.ZipFile(bundle_path) as bundle:
+            entries = [(info.filename, info.file_size) for info in bundle.infolist()]
+        
+        if len(entries) > Config.PDF_ALBUM_MAX_PAGES:
+            await self.app.bot.send_message(
+                chat_id,
+                f"ℹ️ {len(entries)} ta sahifa albom uchun juda ko'p, ZIP arxiv yuborilmoqda."
+            )
+            return await self.send_converted_file(chat_id, bundle_path, bundle_name, 'zip', original_format)
+        
+        # Telegram albomda rasm va hujjatni aralashtirishga ruxsat bermaydi
+        as_photos = all(size <= Config.PHOTO_UPLOAD_LIMIT for _, size in entries)
+        media_class = InputMediaPhoto if as_photos else InputMediaDocument
+        
+        def read_group(names: List[str]) -> List[Tuple[str, bytes]]:
+            with zipfile.ZipFile(bundle_path) as bundle:
+                return [(name, bundle.read(name)) for name in names]
+        
+        names = [name for name, _ in entries]
+        started = time.monotonic()
+        for start in range(0, len(names), Config.ALBUM_SIZE):
+            group = await executor.run_io(read_group, names[start:start + Config.ALBUM_SIZE])
+            caption = (
+                f"✅ {original_format.upper()} → {target_format.upper()} "
+                f"({start + 1}-{start + len(group)} / {len(names)})"
+            )
+            media = [media_class(data, filename=name) for name, data in group]
+            media[0] = media_class(group[0][1], filename=group[0][0], caption=caption)
+            while True:
+                try:
+                    if len(media) == 1:
+                        # Media guruh kamida 2 ta elementdan iborat bo'lishi kerak
+                        sender = self.app.bot.send_photo if as_photos else self.app.bot.send_document
+                        await sender(chat_id, media[0].media, caption=caption,
+                                     write_timeout=Config.UPLOAD_TIMEOUT)
+                    else:
+                        await self.app.bot.send_media_group(chat_id, media, write_timeout=Config.UPLOAD_TIMEOUT)
+                    break
+                except RetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+        metrics.observe_stage('upload', time.monotonic() - started, original_format, target_format,
+                              get_file_type(original_format))
+        metrics.bytes_total.inc(sum(size for _, size in entries), direction='out', format=target_format)
+        # Albom file_id lari indeksda saqlanmaydi (bitta xabar emas)
+        return None
+    
+    async def send_cached_file(self, chat_id: int, entry: Dict, target_format: str,
+                               original_format: str) -> bool:
+        """Avval yuborilgan faylni file_id orqali qayta yuborish (yuklashsiz)"""
+        caption = (
+            f"✅ {original_format.upper()} → {target_format.upper()}\n"
+            f"📊 Hajmi: {human_readable_size(entry['size'])}"
+        )
+        senders = {
+            'photo': self.app.bot.send_photo,
+            'video': self.app.bot.send_video,
+            'audio': self.app.bot.send_audio,
+            'animation': self.app.bot.send_animation,
+            'document': self.app.bot.send_document,
+        }
+        sender = senders.get(entry['kind'])
+        if sender is None:
+            return False
+        
+        try:
+            await sender(chat_id, entry['file_id'], caption=caption)
+            logger.info(f"📨 file_id qayta ishlatildi: {original_format} → {target_format}")
+            return True
+        except Exception as e:
+            logger.warning(f"file_id orqali yuborib bo'lmadi: {e}")
+            return False
+    
+    async def split_batch(self, query, batch_id: str):
+        """Albom fayllarining har biri uchun alohida format tanlash xabari"""
+        if batch_id not in self.media_batches:
+            await query.edit_message_text("❌ Albom topilmadi. Iltimos, qayta yuboring.")
+            return
+        
+        file_ids = [file_id for file_id in self.media_batches[batch_id]['file_ids'] if file_id in self.user_files]
+        await query.edit_message_text(f"📎 {len(file_ids)} ta fayl alohida ko'rsatilmoqda...")
+        for file_id in file_ids:
+            text, keyboard = self.file_keyboard_message(file_id)
+            await query.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
     
     async def show_settings(self, query, file_id: str):
         """Sozlamalarni ko'rsatish"""
@@ -857,29 +5462,59 @@ Quyidagi sozlamalarni o'zgartiring:
 • JPG/PNG sifat (30-100%)
 • O'lcham (25-100%)
 
+🎵 *Audio:*
+• Bitreyt (128-320 kbit/s)
+• Diskretlash chastotasi (22-48 kHz)
+
+📄 *PDF → rasm:*
+• Aniqlik (72-300 DPI)
+• Natija: ZIP arxiv yoki albom
+• Sahifalar: /pages buyrug'i (masalan `/pages 1-5,8`)
+
+🗜️ *Siqish:*
+• Maqsadli hajm (1-10 MB, 10 MB - Telegram rasm chegarasi)
+• Metama'lumot (EXIF, GPS) olib tashlash
+
 Sozlamalarni tanlang:
 """
         
+        def option_row(prefix: str, values: List[str], labels: List[str]) -> List[InlineKeyboardButton]:
+            setting = self.SETTING_CALLBACKS[prefix]
+            current = str(settings.get(setting, ResultCache.SETTINGS_DEFAULTS.get(setting)))
+            return [
+                InlineKeyboardButton(
+                    f"{label}{' ✅' if value == current else ''}",
+                    callback_data=f"{prefix}:{file_id}:{value}"
+                )
+                for value, label in zip(values, labels)
+            ]
+        
         # Tugmalarni yaratish
         buttons = []
         
         # Rasm sifatini sozlash
-        quality_buttons = []
-        for q in ["30", "60", "85", "95", "100"]:
-            selected = " ✅" if settings.get('image_quality') == q else ""
-            quality_buttons.append(
-                InlineKeyboardButton(f"{q}%{selected}", callback_data=f"qual:{file_id}:{q}")
-            )
-        buttons.append(quality_buttons)
+        qualities = ["30", "60", "85", "95", "100"]
+        buttons.append(option_row('qual', qualities, [f"{q}%" for q in qualities]))
         
         # O'lchamni o'zgartirish
-        resize_buttons = [
-            InlineKeyboardButton("25%", callback_data=f"resize:{file_id}:25"),
-            InlineKeyboardButton("50%", callback_data=f"resize:{file_id}:50"),
-            InlineKeyboardButton("75%", callback_data=f"resize:{file_id}:75"),
-            InlineKeyboardButton("100%", callback_data=f"resize:{file_id}:100"),
-        ]
-        buttons.append(resize_buttons)
+        percents = ["25", "50", "75", "100"]
+        buttons.append(option_row('resize', percents, [f"↔️ {p}%" for p in percents]))
+        
+        # Audio bitreyti va chastotasi
+        bitrates = ["128k", "192k", "256k", "320k"]
+        buttons.append(option_row('abr', bitrates, [f"🎵 {b}" for b in bitrates]))
+        rates = ["22050", "44100", "48000"]
+        buttons.append(option_row('asr', rates, [f"〰️ {int(r) / 1000:g} kHz" for r in rates]))
+        
+        # PDF → rasm: aniqlik va natija ko'rinishi
+        dpis = ["72", "150", "300"]
+        buttons.append(option_row('dpi', dpis, [f"📄 {d} DPI" for d in dpis]))
+        buttons.append(option_row('pdfout', ["zip", "album"], ["🗜️ ZIP", "🖼️ Albom"]))
+        
+        # Siqish: maqsadli hajm va metama'lumot
+        targets = ["0", "1", "5", "10"]
+        buttons.append(option_row('ctgt', targets, ["🎯 Yo'q"] + [f"🎯 {t} MB" for t in targets[1:]]))
+        buttons.append(option_row('strip', ["1", "0"], ["🧹 EXIF o'chirilsin", "📎 EXIF qolsin"]))
         
         # Orqaga
         buttons.append([
@@ -898,22 +5533,19 @@ Sozlamalarni tanlang:
     async def update_setting(self, query, file_id: str, key: str, value: str):
         """Sozlamani yangilash"""
         if file_id not in self.user_files:
-            await query.answer("Fayl topilmadi!", show_alert=True)
+            await query.edit_message_text("❌ Fayl topilmadi.")
             return
         
         user_id = self.user_files[file_id]['user_id']
         
-        if user_id not in self.user_settings:
-            self.user_settings[user_id] = {}
-        
-        if key == 'qual':
-            self.user_settings[user_id]['image_quality'] = value
-        elif key == 'resize':
-            self.user_settings[user_id]['resize_percent'] = value
+        settings = dict(self.user_settings.get(user_id, {}))
+        if key in self.SETTING_CALLBACKS:
+            settings[self.SETTING_CALLBACKS[key]] = value
         
-        await query.answer(f"Sozlama yangilandi: {value}", show_alert=True)
+        # Omborga yozilishi uchun qayta saqlash
+        self.user_settings[user_id] = settings
         
-        # Sozlamalar sahifasini yangilash
+        # Sozlamalar sahifasini yangilash (tanlangan qiymat ✅ bilan)
         await self.show_settings(query, file_id)
     
     async def back_to_formats(self, query, file_id: str):
@@ -926,7 +5558,8 @@ Sozlamalarni tanlang:
         original_ext = file_data['extension']
         user_id = file_data['user_id']
         
-        keyboard = create_format_keyboard(original_ext, file_id, self.user_settings.get(user_id, {}))
+        keyboard = create_format_keyboard(original_ext, file_id, self.user_settings.get(user_id, {}),
+                                          file_data['size'], file_data['info'].get('animated', False))
         
         if keyboard:
             await query.edit_message_text(
@@ -954,16 +5587,16 @@ Sozlamalarni tanlang:
 📋 *FAYL MA'LUMOTLARI*
 
 🏷️ **Nomi:** `{file_data['original_name']}`
-📊 **Hajmi:** {info.get('size', 'Noma\'lum')}
+📊 **Hajmi:** {info.get('size', "Noma'lum")}
 📎 **Formati:** {file_data['extension'].upper()}
-🗂️ **Turi:** {info.get('type', 'Noma\'lum').title()}
+🗂️ **Turi:** {info.get('type', "Noma'lum").title()}
 🕐 **Yuklangan:** {file_data['upload_time'].strftime('%Y-%m-%d %H:%M:%S')}
 """
         
         if 'dimensions' in info:
             text += f"📐 **O'lchamlari:** {info['dimensions']}\n"
         
-        text += f"\n🔄 **Mumkin konvertatsiyalar:** {len(CONVERSION_MATRIX.get(file_data['extension'], []))} ta"
+        text += f"\n🔄 **Mumkin konvertatsiyalar:** {len(conversion_planner.routes(file_data['extension'], info.get('animated', False)))} ta"
         
         keyboard = InlineKeyboardMarkup([[
             InlineKeyboardButton("🔙 Orqaga", callback_data=f"back:{file_id}")
@@ -1074,46 +5707,55 @@ Quyidagi sozlamalar barcha konvertatsiyalaringizga ta'sir qiladi:
             reply_markup=keyboard
         )
     
-    async def cleanup_old_files_task(self):
-        """Eski fayllarni tozalash vazifasi"""
-        while True:
-            try:
-                now = datetime.now()
-                
-                # Upload fayllari
-                for filename in os.listdir(Config.UPLOAD_FOLDER):
-                    filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-                    if os.path.isfile(filepath):
-                        file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                        if now - file_time > timedelta(hours=Config.CLEANUP_HOURS):
-                            os.remove(filepath)
-                            logger.info(f"Upload fayli o'chirildi: {filename}")
-                
-                # Output fayllari
-                for filename in os.listdir(Config.OUTPUT_FOLDER):
-                    filepath = os.path.join(Config.OUTPUT_FOLDER, filename)
-                    if os.path.isfile(filepath):
-                        file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                        if now - file_time > timedelta(hours=Config.CLEANUP_HOURS):
-                            os.remove(filepath)
-                            logger.info(f"Output fayli o'chirildi: {filename}")
-                
-                # Eski foydalanuvchi ma'lumotlari
-                expired_files = []
-                for file_id, data in list(self.user_files.items()):
-                    if now - data['upload_time'] > timedelta(hours=Config.CLEANUP_HOURS):
-                        expired_files.append(file_id)
-                
-                for file_id in expired_files:
-                    del self.user_files[file_id]
-                
-                if expired_files:
-                    logger.info(f"{len(expired_files)} ta eski fayl ma'lumotlari tozalandi")
-                
-            except Exception as e:
-                logger.error(f"Tozalash xatosi: {e}")
-            
-            await asyncio.sleep(3600)  # Har soatda
+    async def expire_file(self, file_id: str):
+        """Fayl yozuvi muddati tugadi: yozuv va (boshqa yozuvlar ishlatmasa) yuklangan faylni o'chirish"""
+        data = self.user_files.pop(file_id, None)
+        if data is None:
+            return
+        self.upload_store.release(data['input_path'])
+        await executor.run_io(self.upload_store.remove_unused, data['input_path'])
+    
+    async def expire_batch(self, batch_id: str):
+        self.media_batches.pop(batch_id, None)
+    
+    async def expire_download(self, path: str):
+        await executor.run_io(remove_path, path)
+        self.download_links.forget(path)
+    
+    async def expire_path(self, path: str):
+        """Hech bir yozuvga tegishli bo'lmagan (oldingi ishga tushirishdan qolgan) fayl yoki papka"""
+        if self.upload_store.is_referenced(path):
+            return
+        await executor.run_io(remove_path, path)
+    
+    async def relieve_disk_pressure(self, nbytes: int):
+        """Disk to'lganda birinchi navbatda natijalar keshini kamaytirish"""
+        await executor.run_io(self.result_cache.trim, nbytes)
+    
+    def seed_expiry_index(self):
+        """Ishga tushganda mavjud yozuvlar va diskdagi fayllarni muddatlar indeksiga qo'shish (bir marta)"""
+        for file_id, data in self.user_files.items():
+            self.expiry.schedule('file', file_id, data['upload_time'].timestamp())
+        for batch_id, data in self.media_batches.items():
+            self.expiry.schedule('batch', batch_id, data['created'].timestamp())
+        
+        # Vaqtinchalik papkalarda faqat oldingi ishga tushirishdan qolganlari (joriy jarayonnikini o'zi tozalaydi)
+        scratch = [Config.TEMP_FOLDER, tmpfs_workspace_root()]
+        folders = [Config.UPLOAD_FOLDER, Config.OUTPUT_FOLDER, *scratch]
+        if Config.HTTP_SERVER_PORT:
+            folders.append(Config.DOWNLOAD_FOLDER)
+        for folder in folders:
+            if not folder or not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if self.upload_store.is_referenced(entry.path):
+                    continue
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+                if folder in scratch and mtime >= self.started_at:
+                    continue
+                kind = 'download' if folder == Config.DOWNLOAD_FOLDER else 'path'
+                self.expiry.schedule(kind, entry.path, mtime)
+        logger.info(f"🧹 Muddatlar indeksi: {len(self.expiry)} ta yozuv")
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Xatolarni qayta ishlash"""
@@ -1124,20 +5766,93 @@ Quyidagi sozlamalar barcha konvertatsiyalaringizga ta'sir qiladi:
                 "❌ Kutilmagan xatolik yuz berdi. Iltimos, qayta urinib ko'ring."
             )
     
+    async def post_init(self, application: Application):
+        """Bot ishga tushganda resurslarni tayyorlash"""
+        self.state_store.open()
+        self.upload_store.rebuild(self.user_files.values())
+        await self.backend.start()
+        await executor.run_io(self.result_cache.load)
+        await executor.run_io(self.sent_files.load)
+        
+        self.http_client = httpx.AsyncClient(timeout=httpx.Timeout(60, read=300), follow_redirects=True)
+        if Config.HTTP_SERVER_PORT:
+            await executor.run_io(self.download_links.load)
+            self.http_server.route('/d/', self.download_links.handle)
+            if Config.METRICS_ENABLED:
+                self.http_server.route('/metrics', metrics.handle)
+            await self.http_server.start()
+        elif Config.METRICS_ENABLED and Config.METRICS_PORT:
+            # Yuklab olish serveri o'chirilgan - metrikalar uchun alohida, faqat lokal server
+            self.metrics_server = HttpServer('127.0.0.1', Config.METRICS_PORT)
+            self.metrics_server.route('/metrics', metrics.handle)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.warning(f"Metrikalar serverini ishga tushirib bo'lmadi: {e}")
+                self.metrics_server = None
+        if Config.METRICS_ENABLED:
+            self.lag_task = asyncio.create_task(metrics.monitor_loop_lag())
+        
+        self.seed_expiry_index()
+        self.cleanup_task = asyncio.create_task(self.expiry.run())
+    
+    async def post_stop(self, application: Application):
+        """Yangi yangilanishlar to'xtagach, bajarilayotgan vazifalarni yakunlash"""
+        pending = self.scheduler.active + self.scheduler.queued
+        if pending:
+            logger.info(f"⏳ {pending} ta vazifa tugashi kutilmoqda...")
+        if not await self.scheduler.drain(Config.SHUTDOWN_DRAIN_TIMEOUT):
+            logger.warning("⚠️ Ba'zi vazifalar vaqt tugagani sababli bekor qilindi")
+    
+    async def post_shutdown(self, application: Application):
+        """Bot to'xtaganda resurslarni bo'shatish"""
+        for task in (self.cleanup_task, self.lag_task):
+            if task is not None:
+                task.cancel()
+        await self.backend.stop()
+        await self.http_server.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.sent_files.save()
+        self.state_store.close()
+        await office_pool.stop()
+        executor.shutdown(wait=False)
+        logger.info("⚙️ Konvertatsiya pullari to'xtatildi")
+    
     def run(self):
         """Botni ishga tushirish"""
         # Muhitni sozlash
         setup_environment()
         
         # Bot ilovasini yaratish
-        self.app = Application.builder().token(Config.BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(Config.BOT_TOKEN)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+            .concurrent_updates(True)
+        )
+        
+        # O'z Bot API serveringiz (katta fayllar uchun)
+        if Config.BOT_API_BASE_URL:
+            builder = builder.base_url(Config.BOT_API_BASE_URL)
+            if Config.BOT_API_BASE_FILE_URL:
+                builder = builder.base_file_url(Config.BOT_API_BASE_FILE_URL)
+            builder = builder.local_mode(Config.BOT_API_LOCAL_MODE)
+        
+        self.app = builder.build()
         self.start_time = datetime.now()
+        metrics.start_time = self.start_time.timestamp()
         
         # Handlerlarni qo'shish
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
         self.app.add_handler(CommandHandler("formats", self.show_all_formats))
         self.app.add_handler(CommandHandler("settings", self.show_global_settings))
+        self.app.add_handler(CommandHandler("pages", self.pages_command))
         
         # Fayl handlerlari
         self.app.add_handler(MessageHandler(
@@ -1151,10 +5866,6 @@ Quyidagi sozlamalar barcha konvertatsiyalaringizga ta'sir qiladi:
         # Xatolik handler
         self.app.add_error_handler(self.error_handler)
         
-        # Vazifalarni ishga tushirish
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.cleanup_old_files_task())
-        
         # Botni ishga tushirish
         print("=" * 50)
         print("🤖 FILE CONVERTER BOT ISHGA TUSHDI!")
@@ -1162,20 +5873,51 @@ Quyidagi sozlamalar barcha konvertatsiyalaringizga ta'sir qiladi:
         print(f"📁 Upload papkasi: {os.path.abspath(Config.UPLOAD_FOLDER)}")
         print(f"📁 Output papkasi: {os.path.abspath(Config.OUTPUT_FOLDER)}")
         print(f"📁 Temp papkasi: {os.path.abspath(Config.TEMP_FOLDER)}")
+        if Config.METRICS_ENABLED and Config.HTTP_SERVER_PORT:
+            print(f"📊 Metrikalar: http://{Config.HTTP_SERVER_LISTEN}:{Config.HTTP_SERVER_PORT}/metrics")
+        elif Config.METRICS_ENABLED and Config.METRICS_PORT:
+            print(f"📊 Metrikalar: http://127.0.0.1:{Config.METRICS_PORT}/metrics")
         print("=" * 50)
         print("Mavjud kutubxonalar:")
         print(f"• PIL/Pillow: {'✅' if Config.HAS_PIL else '❌'}")
         print(f"• ReportLab: {'✅' if Config.HAS_REPORTLAB else '❌'}")
+        print(f"• FFmpeg: {'✅' if Config.HAS_FFMPEG else '❌'}")
         print("=" * 50)
+        if Config.WEBHOOK_URL:
+            print(f"🌐 Webhook rejimi: {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}/{Config.WEBHOOK_PATH}")
+        else:
+            print("🔁 Polling rejimi")
         print("Bot ishlayapti... CTRL+C tugmasini bosing (to'xtatish uchun)")
         
-        self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        if Config.WEBHOOK_URL:
+            self.run_webhook()
+        else:
+            self.app.run_polling(allowed_updates=self.ALLOWED_UPDATES)
+    
+    def run_webhook(self):
+        """Webhook rejimida ishga tushirish (run_polling o'rniga)"""
+        # Sir token berilmagan bo'lsa har ishga tushishda yangisi yaratiladi
+        secret_token = Config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        url_path = Config.WEBHOOK_PATH.strip('/')
+        
+        self.app.run_webhook(
+            listen=Config.WEBHOOK_LISTEN,
+            port=Config.WEBHOOK_PORT,
+            url_path=url_path,
+            webhook_url=f"{Config.WEBHOOK_URL.rstrip('/')}/{url_path}",
+            secret_token=secret_token,
+            allowed_updates=self.ALLOWED_UPDATES,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+        )
 
 # ==================== ASOSIY FUNKSIYA ====================
 if __name__ == '__main__':
     try:
-        bot = FileConvertBot()
-        bot.run()
+        if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+            run_worker()
+        else:
+            bot = FileConvertBot()
+            bot.run()
     except KeyboardInterrupt:
         print("\n\nBot to'xtatildi!")
     except Exception as e:
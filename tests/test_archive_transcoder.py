@@ -0,0 +1,60 @@
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def temp_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, 'TEMP_FOLDER', str(tmp_path))
+    monkeypatch.setattr(main.Config, 'ARCHIVE_COMPRESS_THREADS', 3)
+
+
+def make_zip(path, entries):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+
+
+def test_entries_keep_order_and_content(tmp_path):
+    entries = [('docs/', b'')] + [(f"docs/file{index}.txt", f"line {index}\n".encode() * 5000) for index in range(10)]
+    entries.append(('empty.txt', b''))
+    source, output = tmp_path / "in.zip", tmp_path / "out.zip"
+    make_zip(source, entries)
+
+    ok, _ = main.transcode_archive(str(source), str(output), 'zip')
+
+    assert ok
+    with zipfile.ZipFile(output) as archive:
+        assert archive.testzip() is None
+        assert [info.filename for info in archive.infolist()] == [name for name, _ in entries]
+        assert all(info.compress_type == zipfile.ZIP_DEFLATED for info in archive.infolist() if not info.is_dir())
+        for name, data in entries:
+            assert archive.read(name) == data
+
+
+def test_unsafe_names_are_cleaned(tmp_path):
+    source, output = tmp_path / "in.zip", tmp_path / "out.zip"
+    make_zip(source, [('../evil.txt', b'x'), ('/abs/path.txt', b'y')])
+
+    ok, _ = main.transcode_archive(str(source), str(output), 'zip')
+
+    assert ok
+    with zipfile.ZipFile(output) as archive:
+        assert archive.namelist() == ['evil.txt', 'abs/path.txt']
+
+
+def test_entry_limit_removes_partial_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, 'ARCHIVE_MAX_ENTRIES', 2)
+    source, output = tmp_path / "in.zip", tmp_path / "out.zip"
+    make_zip(source, [(f"f{index}.txt", b'data') for index in range(5)])
+
+    ok, message = main.transcode_archive(str(source), str(output), 'zip')
+
+    assert not ok and 'chegara' in message
+    assert not output.exists()
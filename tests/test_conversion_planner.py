@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def planner(matrix, max_hops=2, costs=None):
+    result = main.ConversionPlanner(matrix, max_hops=max_hops)
+    for (source, target), seconds in (costs or {}).items():
+        result.observe(source, target, MB, seconds)
+    return result
+
+
+def test_cheaper_two_hop_route_beats_slow_direct_edge():
+    matrix = {'docx': ['pdf', 'png'], 'pdf': ['png']}
+    costs = {('docx', 'png'): 10.0, ('docx', 'pdf'): 1.0, ('pdf', 'png'): 1.0}
+    assert planner(matrix, costs=costs).plan('docx', 'png') == ['docx', 'pdf', 'png']
+
+
+def test_hop_limit_keeps_direct_edge():
+    matrix = {'docx': ['pdf', 'png'], 'pdf': ['png']}
+    costs = {('docx', 'png'): 10.0, ('docx', 'pdf'): 1.0, ('pdf', 'png'): 1.0}
+    assert planner(matrix, max_hops=1, costs=costs).plan('docx', 'png') == ['docx', 'png']
+
+
+def test_new_measurement_changes_the_route():
+    matrix = {'docx': ['pdf', 'png'], 'pdf': ['png']}
+    route_planner = planner(matrix, costs={('docx', 'png'): 1.0, ('docx', 'pdf'): 1.0, ('pdf', 'png'): 1.0})
+    assert route_planner.plan('docx', 'png') == ['docx', 'png']
+    for _ in range(20):
+        route_planner.observe('docx', 'png', MB, 50.0)
+    assert route_planner.plan('docx', 'png') == ['docx', 'pdf', 'png']
+
+
+def test_multi_page_edges_are_only_the_last_step():
+    assert planner({'pdf': ['jpg'], 'jpg': ['png']}).plan('pdf', 'png') is None
+
+
+def test_lossless_intermediate_wins_a_tie():
+    matrix = {'bmp': ['jpg', 'png'], 'jpg': ['webp'], 'png': ['webp']}
+    assert planner(matrix).plan('bmp', 'webp') == ['bmp', 'png', 'webp']
+
+
+def test_jpeg_and_jpg_are_one_format():
+    route_planner = planner({'jpg': ['png'], 'png': ['jpeg']})
+    assert route_planner.plan('jpeg', 'png') == ['jpg', 'png']
+    assert route_planner.plan('png', 'jpeg') == ['png', 'jpg']
+    assert 'jpg' not in route_planner.routes('jpeg')
+
+
+def test_webp_to_mp4_needs_an_animated_source():
+    route_planner = planner({'webp': ['mp4'], 'png': ['webp']})
+    assert route_planner.plan('webp', 'mp4') is None
+    assert route_planner.plan('webp', 'mp4', animated=True) == ['webp', 'mp4']
+    assert route_planner.plan('png', 'mp4', animated=True) is None
+
+
+@pytest.mark.parametrize("has_rar, expected", [(False, None), (True, ['zip', 'rar'])])
+def test_rar_target_needs_the_rar_tool(monkeypatch, has_rar, expected):
+    monkeypatch.setattr(main.Config, 'HAS_RAR', has_rar)
+    assert planner({'zip': ['rar']}).plan('zip', 'rar') == expected
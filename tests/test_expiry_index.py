@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, 'UPLOAD_FOLDER', str(tmp_path))
+
+
+def recorder(removed):
+    async def remove(key):
+        removed.append(key)
+    return remove
+
+
+def test_expired_entries_are_removed_oldest_first():
+    async def scenario():
+        removed = []
+        index = main.ExpiryIndex({'file': recorder(removed)}, ttl=10)
+        now = time.time()
+        index.schedule('file', 'young', now - 11)
+        index.schedule('file', 'oldest', now - 30)
+        index.schedule('file', 'old', now - 20)
+        index.schedule('file', 'fresh', now)
+        runner = asyncio.create_task(index.run())
+        await asyncio.sleep(0.05)
+        runner.cancel()
+        return removed, len(index)
+
+    removed, remaining = asyncio.run(scenario())
+    assert removed == ['oldest', 'old', 'young']
+    assert remaining == 1
+
+
+def test_rescheduled_and_discarded_entries_are_skipped():
+    async def scenario():
+        removed = []
+        index = main.ExpiryIndex({'file': recorder(removed)}, ttl=10)
+        now = time.time()
+        index.schedule('file', 'renewed', now - 30)
+        index.schedule('file', 'renewed', now)
+        index.schedule('file', 'dropped', now - 30)
+        index.discard('file', 'dropped')
+        index.schedule('file', 'expired', now - 30)
+        runner = asyncio.create_task(index.run())
+        await asyncio.sleep(0.05)
+        runner.cancel()
+        return removed
+
+    assert asyncio.run(scenario()) == ['expired']
+
+
+def test_new_earlier_deadline_wakes_the_loop():
+    async def scenario():
+        removed = []
+        index = main.ExpiryIndex({'file': recorder(removed)}, ttl=0.05)
+        index.schedule('file', 'later', time.time() + 60)
+        runner = asyncio.create_task(index.run())
+        await asyncio.sleep(0.01)
+        index.schedule('file', 'soon')
+        await asyncio.sleep(0.2)
+        runner.cancel()
+        return removed
+
+    assert asyncio.run(scenario()) == ['soon']
+
+
+class FakeDisk:
+    def __init__(self, used, total=100):
+        self.used = used
+        self.total = total
+
+    def usage(self, _path):
+        return SimpleNamespace(used=self.used, total=self.total)
+
+
+def run_disk_check(monkeypatch, used):
+    monkeypatch.setattr(main.Config, 'DISK_HIGH_WATERMARK', 0.9)
+    monkeypatch.setattr(main.Config, 'DISK_LOW_WATERMARK', 0.7)
+    disk = FakeDisk(used)
+    monkeypatch.setattr(main.shutil, 'disk_usage', disk.usage)
+    removed, pressure = [], []
+
+    async def remove(key):
+        removed.append(key)
+        disk.used -= 10
+
+    async def relieve(nbytes):
+        pressure.append(nbytes)
+
+    async def scenario():
+        index = main.ExpiryIndex({'file': remove}, on_disk_pressure=relieve, ttl=3600)
+        now = time.time()
+        for age, key in [(1, 'newest'), (4, 'oldest'), (2, 'newer'), (3, 'older')]:
+            index.schedule('file', key, now - age)
+        await index.enforce_disk_limit()
+        return len(index)
+
+    remaining = asyncio.run(scenario())
+    return removed, pressure, remaining
+
+
+def test_high_watermark_evicts_oldest_until_low_watermark(monkeypatch):
+    removed, pressure, remaining = run_disk_check(monkeypatch, used=95)
+    assert pressure == [25]
+    assert removed == ['oldest', 'older', 'newer']
+    assert remaining == 1
+
+
+def test_below_high_watermark_nothing_is_evicted(monkeypatch):
+    removed, pressure, remaining = run_disk_check(monkeypatch, used=85)
+    assert removed == [] and pressure == []
+    assert remaining == 4
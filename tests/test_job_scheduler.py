@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def make_job(name, user_id, order, gate, positions=None):
+    async def run():
+        order.append(name)
+        await gate.wait()
+
+    async def on_position(pos):
+        positions.setdefault(name, []).append(pos)
+    return main.ConversionJob(name, user_id, run, on_position if positions is not None else None)
+
+
+async def release_all(gate, scheduler):
+    gate.set()
+    assert await scheduler.drain(5)
+
+
+def test_users_take_turns():
+    async def scenario():
+        scheduler = main.JobScheduler(max_concurrent=1, per_user_limit=1, max_queued_per_user=10)
+        order, gate = [], asyncio.Event()
+        submitted = {}
+        for name, user_id in [('a1', 1), ('a2', 1), ('a3', 1), ('b1', 2), ('b2', 2)]:
+            submitted[name] = scheduler.submit(make_job(name, user_id, order, gate))
+        await release_all(gate, scheduler)
+        return submitted, order
+
+    submitted, order = asyncio.run(scenario())
+    assert submitted == {'a1': 0, 'a2': 1, 'a3': 2, 'b1': 2, 'b2': 4}
+    assert order == ['a1', 'a2', 'b1', 'a3', 'b2']
+
+
+def test_positions_follow_round_robin_order():
+    async def scenario():
+        scheduler = main.JobScheduler(max_concurrent=1, per_user_limit=1, max_queued_per_user=10)
+        order, gate = [], asyncio.Event()
+        for name, user_id in [('a1', 1), ('a2', 1), ('a3', 1), ('b1', 2)]:
+            scheduler.submit(make_job(name, user_id, order, gate))
+        positions = {job.job_id: pos for job, pos in scheduler.positions().items()}
+        await release_all(gate, scheduler)
+        return positions
+
+    assert asyncio.run(scenario()) == {'a2': 1, 'b1': 2, 'a3': 3}
+
+
+def test_per_user_limit_lets_other_users_run():
+    async def scenario():
+        scheduler = main.JobScheduler(max_concurrent=2, per_user_limit=1, max_queued_per_user=10)
+        order, gate = [], asyncio.Event()
+        results = [scheduler.submit(make_job(name, user_id, order, gate))
+                   for name, user_id in [('a1', 1), ('a2', 1), ('b1', 2)]]
+        await asyncio.sleep(0)
+        running = list(order)
+        await release_all(gate, scheduler)
+        return results, running
+
+    results, running = asyncio.run(scenario())
+    assert results == [0, 1, 0]
+    assert running == ['a1', 'b1']
+
+
+def test_queue_limit_per_user():
+    async def scenario():
+        scheduler = main.JobScheduler(max_concurrent=1, per_user_limit=1, max_queued_per_user=1)
+        order, gate = [], asyncio.Event()
+        scheduler.submit(make_job('a1', 1, order, gate))
+        scheduler.submit(make_job('a2', 1, order, gate))
+        try:
+            scheduler.submit(make_job('a3', 1, order, gate))
+        except OverflowError:
+            rejected = True
+        else:
+            rejected = False
+        await release_all(gate, scheduler)
+        return rejected
+
+    assert asyncio.run(scenario())
+
+
+def test_position_updates_follow_the_queue_and_stop_once_job_starts():
+    async def scenario():
+        scheduler = main.JobScheduler(max_concurrent=1, per_user_limit=1, max_queued_per_user=10)
+        order, positions = [], {}
+        gates = {name: asyncio.Event() for name in ('a1', 'b1', 'c1')}
+        jobs = {name: make_job(name, user_id, order, gates[name], positions)
+                for name, user_id in [('a1', 1), ('b1', 2), ('c1', 3)]}
+        for job in jobs.values():
+            scheduler.submit(job)
+        await asyncio.sleep(0.01)
+        gates['a1'].set()
+        await asyncio.sleep(0.01)
+        # b1 allaqachon ishlayapti - kechikkan navbat xabari yuborilmaydi
+        scheduler._post_position(jobs['b1'], 5)
+        await asyncio.sleep(0.01)
+        for gate in gates.values():
+            gate.set()
+        assert await scheduler.drain(5)
+        return positions, order
+
+    positions, order = asyncio.run(scenario())
+    assert order == ['a1', 'b1', 'c1']
+    assert positions == {'b1': [1], 'c1': [2, 1]}
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.mark.parametrize("spec", ['', 'all', ' ALL ', None])
+def test_empty_or_all_selects_every_page(spec):
+    assert main.parse_page_range(spec, 4) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ('1-3,7,10-', [0, 1, 2, 6, 9, 10, 11]),
+    ('-2', [0, 1]),
+    ('11-', [10, 11]),
+    (' 2 - 3 , 5 ', [1, 2, 4]),
+    ('3,1-3', [2, 0, 1]),
+    ('5-100', [4, 5, 6, 7, 8, 9, 10, 11]),
+    ('1,,2,', [0, 1]),
+])
+def test_ranges_keep_order_and_skip_duplicates(spec, expected):
+    assert main.parse_page_range(spec, 12) == expected
+
+
+@pytest.mark.parametrize("spec", ['0', '3-1', '-', 'a', '1-b', '1-2-3', '2,x'])
+def test_invalid_ranges_are_rejected(spec):
+    with pytest.raises(ValueError):
+        main.parse_page_range(spec, 12)
+
+
+def test_range_outside_document_is_rejected():
+    with pytest.raises(ValueError, match="jami 5 sahifa"):
+        main.parse_page_range('8-9', 5)
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text):
+        self.edits.append((time.monotonic(), text))
+
+
+def test_burst_of_updates_becomes_one_edit_with_latest_value():
+    async def scenario():
+        message = FakeMessage()
+        reporter = main.ProgressReporter(message, "header", interval=0.2)
+        for done in range(1, 101):
+            reporter.update(done, 100, 'pages')
+        await asyncio.sleep(0.05)
+        await reporter.close()
+        return message.edits
+
+    edits = asyncio.run(scenario())
+    assert len(edits) == 1
+    assert "100% (100/100 sahifa)" in edits[0][1]
+
+
+def test_edits_are_spaced_by_interval():
+    async def scenario():
+        message = FakeMessage()
+        reporter = main.ProgressReporter(message, "header", interval=0.2)
+        reporter.update(1, 10, 'pages')
+        await asyncio.sleep(0.01)
+        reporter.update(2, 10, 'pages')
+        reporter.update(3, 10, 'pages')
+        await asyncio.sleep(0.3)
+        await reporter.close()
+        return message.edits
+
+    edits = asyncio.run(scenario())
+    assert [text.splitlines()[-2] for _, text in edits] == ["⏳ Jarayon: 10% (1/10 sahifa)",
+                                                            "⏳ Jarayon: 30% (3/10 sahifa)"]
+    assert edits[1][0] - edits[0][0] >= 0.19
+
+
+def test_unchanged_text_is_not_resent():
+    async def scenario():
+        message = FakeMessage()
+        reporter = main.ProgressReporter(message, "header", interval=0)
+        reporter.update(5, 10, 'pages')
+        await asyncio.sleep(0.01)
+        reporter.update(5, 10, 'pages')
+        await asyncio.sleep(0.01)
+        await reporter.close()
+        return message.edits
+
+    assert len(asyncio.run(scenario())) == 1
+
+
+def test_close_drops_pending_edit_and_ignores_later_updates():
+    async def scenario():
+        message = FakeMessage()
+        reporter = main.ProgressReporter(message, "header", interval=0.2)
+        reporter.update(1, 10, 'pages')
+        await asyncio.sleep(0.01)
+        reporter.update(2, 10, 'pages')
+        await reporter.close()
+        reporter.update(3, 10, 'pages')
+        await asyncio.sleep(0.3)
+        return message.edits
+
+    assert len(asyncio.run(scenario())) == 1
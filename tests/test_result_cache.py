@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def make_file(folder, name, size):
+    path = folder / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    cache = main.ResultCache(str(tmp_path / "cache"), max_bytes=25)
+    cache.load()
+
+    path_a = cache.put('a', make_file(source, 'a.png', 10))
+    path_b = cache.put('b', make_file(source, 'b.png', 10))
+    assert cache.get('a') == path_a
+    cache.put('c', make_file(source, 'c.png', 10))
+
+    assert cache.get('b') is None
+    assert not os.path.exists(path_b)
+    assert cache.get('a') == path_a
+    assert cache.get('c') is not None
+
+
+def test_file_larger_than_cache_is_not_stored(tmp_path):
+    cache = main.ResultCache(str(tmp_path / "cache"), max_bytes=5)
+    cache.load()
+
+    assert cache.put('big', make_file(tmp_path, 'big.png', 10)) is None
+    assert cache.get('big') is None
+
+
+def test_reload_keeps_recency_order(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    folder = str(tmp_path / "cache")
+    cache = main.ResultCache(folder, max_bytes=100)
+    cache.load()
+    path_old = cache.put('old', make_file(source, 'old.png', 10))
+    path_new = cache.put('new', make_file(source, 'new.png', 10))
+    os.utime(path_old, (1000, 1000))
+    os.utime(path_new, (2000, 2000))
+
+    reloaded = main.ResultCache(folder, max_bytes=15)
+    reloaded.load()
+
+    assert reloaded.get('old') is None
+    assert reloaded.get('new') == path_new
+
+
+def test_key_ignores_unrelated_settings_and_explicit_defaults():
+    base = main.ResultCache.make_key('hash', 'PNG', {})
+    assert base == main.ResultCache.make_key('hash', 'png', {'image_quality': '85', 'language': 'uz'})
+    assert base != main.ResultCache.make_key('hash', 'png', {'image_quality': '70'})
+    assert base != main.ResultCache.make_key('hash', 'jpg', {})
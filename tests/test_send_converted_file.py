@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self.kwargs = []
+
+    def __getattr__(self, name):
+        if not name.startswith('send_'):
+            raise AttributeError(name)
+
+        async def send(*args, **kwargs):
+            self.calls.append(name)
+            self.kwargs.append(kwargs)
+            return None
+        return send
+
+
+@pytest.fixture(autouse=True)
+def pillow_enabled(monkeypatch):
+    monkeypatch.setattr(main.Config, 'HAS_PIL', True)
+
+
+def make_bot():
+    bot = object.__new__(main.FileConvertBot)
+    bot.app = SimpleNamespace(bot=FakeBot())
+    return bot
+
+
+def send(path, target_format, original_format):
+    bot = make_bot()
+    asyncio.run(bot.send_converted_file(1, str(path), os.path.basename(path), target_format, original_format))
+    return bot.app.bot.calls
+
+
+def save_frames(path, fmt, count):
+    frames = [Image.new('RGB', (16, 16), (index * 60, 0, 0)) for index in range(count)]
+    frames[0].save(path, fmt, save_all=count > 1, append_images=frames[1:], duration=100, loop=0)
+
+
+def test_animated_webp_is_not_sent_as_photo(tmp_path):
+    path = tmp_path / "anim.webp"
+    save_frames(path, 'WEBP', 3)
+    assert send(path, 'webp', 'gif') == ['send_document']
+
+
+def test_still_webp_is_sent_as_photo(tmp_path):
+    path = tmp_path / "still.webp"
+    save_frames(path, 'WEBP', 1)
+    assert send(path, 'webp', 'png') == ['send_photo']
+
+
+def test_gif_is_sent_as_animation(tmp_path):
+    path = tmp_path / "clip.gif"
+    save_frames(path, 'GIF', 3)
+    assert send(path, 'gif', 'mp4') == ['send_animation']
+
+
+def write_bundle(path, count):
+    pages = []
+    for index in range(count):
+        page = path.parent / f"page_{index + 1:04d}.png"
+        Image.new('RGB', (8, 8)).save(page, 'PNG')
+        pages.append(str(page))
+    main.write_page_bundle(pages, str(path))
+
+
+def test_page_bundle_is_delivered_with_zip_name(tmp_path):
+    path = tmp_path / "doc_converted.png"
+    write_bundle(path, 3)
+    bot = make_bot()
+    asyncio.run(bot.send_converted_file(1, str(path), "doc_png_pages.zip", 'zip', 'pdf'))
+    assert bot.app.bot.calls == ['send_document']
+    assert bot.app.bot.kwargs[0]['filename'] == "doc_png_pages.zip"
+
+
+def test_album_fallback_keeps_zip_name(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, 'PDF_ALBUM_MAX_PAGES', 2)
+    path = tmp_path / "doc_converted.jpg"
+    write_bundle(path, 3)
+    assert zipfile.is_zipfile(path)
+    bot = make_bot()
+    asyncio.run(bot.send_page_album(1, str(path), "doc_jpg_pages.zip", 'pdf', 'jpg'))
+    assert bot.app.bot.calls == ['send_message', 'send_document']
+    assert bot.app.bot.kwargs[1]['filename'] == "doc_jpg_pages.zip"
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, 'STATE_FLUSH_INTERVAL', 30)
+    store = main.StateStore(str(tmp_path / "state.db"))
+    store.open()
+    yield store
+    store.close()
+
+
+def test_iteration_sees_unflushed_changes_without_waiting(tmp_path, store):
+    files = main.StoredMapping(store, 'files', created_field='upload_time')
+    files['a'] = {'user_id': 1, 'upload_time': datetime.now()}
+    store.close()
+    store.open()
+
+    files = main.StoredMapping(store, 'files', created_field='upload_time')
+    files['b'] = {'user_id': 2, 'upload_time': datetime.now()}
+    del files['a']
+    started = time.monotonic()
+
+    assert list(files) == ['b']
+    assert len(files) == 1
+    assert time.monotonic() - started < 1
+
+
+def test_changes_survive_reopen(tmp_path, store):
+    settings = main.StoredMapping(store, 'settings', key_type=int)
+    settings[42] = {'image_quality': 70}
+    store.close()
+    store.open()
+
+    settings = main.StoredMapping(store, 'settings', key_type=int)
+    assert dict(settings) == {42: {'image_quality': 70}}